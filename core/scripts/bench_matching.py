@@ -0,0 +1,109 @@
+"""
+Benchmark candidate scoring: streamer_api.matching vs the old difflib path.
+
+Builds a synthetic workload shaped like enrichment (each track scored on
+title/artist/album against N provider candidates, with repeated artist and
+album strings across an album) and times both implementations.
+
+    python scripts/bench_matching.py --tracks 2000 --candidates 15
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamer_api.matching import _features_for, batch_similarity, cache_info, similarity, text_key  # noqa: E402
+
+WORDS = (
+    "love night heart blue dream fire road home light rain summer river dance "
+    "gold shadow city sky wild moon time girl world star black song"
+).split()
+
+
+def _phrase(rng, lo=1, hi=4):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(lo, hi)))
+
+
+def _typo(rng, s):
+    if len(s) < 4:
+        return s
+    i = rng.randrange(len(s) - 1)
+    return s[:i] + s[i + 1:]
+
+
+def _workload(tracks, candidates, seed):
+    rng = random.Random(seed)
+    albums = [(_phrase(rng, 1, 3), _phrase(rng, 1, 3)) for _ in range(max(1, tracks // 12))]
+    out = []
+    for _ in range(tracks):
+        artist, album = rng.choice(albums)
+        title = _phrase(rng)
+        cands = []
+        for _ in range(candidates):
+            cands.append((
+                _typo(rng, title) if rng.random() < 0.3 else _phrase(rng),
+                artist if rng.random() < 0.5 else _phrase(rng, 1, 2),
+                album if rng.random() < 0.4 else f"{album} (Deluxe)",
+            ))
+        out.append(((title, artist, album), cands))
+    return out
+
+
+def _seqmatch(a, b):
+    x, y = text_key(a), text_key(b)
+    if not x and not y:
+        return 1.0
+    if not x or not y:
+        return 0.0
+    return SequenceMatcher(None, x, y).ratio()
+
+
+def _run_pairwise(work, fn):
+    total = 0.0
+    for (title, artist, album), cands in work:
+        for c_title, c_artist, c_album in cands:
+            total += 0.55 * fn(title, c_title) + 0.35 * fn(artist, c_artist) + 0.10 * fn(album, c_album)
+    return total
+
+
+def _run_batch(work):
+    total = 0.0
+    for (title, artist, album), cands in work:
+        titles = batch_similarity(title, [c[0] for c in cands])
+        artists = batch_similarity(artist, [c[1] for c in cands])
+        albums = batch_similarity(album, [c[2] for c in cands])
+        total += sum(0.55 * t + 0.35 * a + 0.10 * al for t, a, al in zip(titles, artists, albums))
+    return total
+
+
+def _timed(label, fn, comparisons):
+    started = time.perf_counter()
+    fn()
+    spent = time.perf_counter() - started
+    print(f"{label:32} {spent * 1000:9.1f} ms  {comparisons / spent / 1000:9.1f} k comparisons/s")
+    return spent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark metadata fuzzy matching.")
+    parser.add_argument("--tracks", type=int, default=2000)
+    parser.add_argument("--candidates", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    work = _workload(args.tracks, args.candidates, args.seed)
+    comparisons = args.tracks * args.candidates * 3
+    print(f"{args.tracks} tracks x {args.candidates} candidates x 3 fields = {comparisons} comparisons")
+
+    base = _timed("difflib.SequenceMatcher", lambda: _run_pairwise(work, _seqmatch), comparisons)
+    text_key.cache_clear()
+    _features_for.cache_clear()
+    cold = _timed("matching.similarity (cold)", lambda: _run_pairwise(work, similarity), comparisons)
+    warm = _timed("matching.similarity (warm)", lambda: _run_pairwise(work, similarity), comparisons)
+    batch = _timed("matching.batch_similarity", lambda: _run_batch(work), comparisons)
+    print(f"speedup vs SequenceMatcher: cold {base / cold:.1f}x, warm {base / warm:.1f}x, batch {base / batch:.1f}x")
+    print(f"feature cache: {cache_info()}")
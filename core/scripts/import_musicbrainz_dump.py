@@ -0,0 +1,64 @@
+"""
+Build the offline MusicBrainz index used by the "local" metadata provider.
+
+Input is the `release` entity file from the MusicBrainz JSON data dumps
+(https://data.metabrainz.org/pub/musicbrainz/data/json-dumps/), one release
+per line with media/tracks/recordings inline; .xz and .gz are read directly.
+
+    python scripts/import_musicbrainz_dump.py --releases release.xz --from-library test-user-001
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamer_api.local_index import LOCAL_INDEX_PATH, import_releases, iter_dump  # noqa: E402
+from streamer_api.storage import load_lib  # noqa: E402
+from streamer_api.utils import normalize_text_key  # noqa: E402
+
+
+def _library_artists(user_ids):
+    keys = set()
+    for user_id in user_ids:
+        for t in (load_lib(user_id).get("tracks") or {}).values():
+            for field in ("album_artist", "artist"):
+                k = normalize_text_key(t.get(field))
+                if k:
+                    keys.add(k)
+    return keys
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a MusicBrainz release dump into the local metadata index.")
+    parser.add_argument("--releases", required=True, nargs="+", help="Release dump file(s): JSON lines, optionally .xz/.gz")
+    parser.add_argument("--index", default=str(LOCAL_INDEX_PATH), help="Index path (default: RT_LOCAL_MB_INDEX_PATH)")
+    parser.add_argument("--artists-file", help="Only import releases credited to artists listed in this file (one per line)")
+    parser.add_argument("--from-library", nargs="*", default=[], help="Only import releases by artists in these users' libraries")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many imported releases")
+
+    args = parser.parse_args()
+
+    artist_filter = None
+    if args.artists_file or args.from_library:
+        artist_filter = _library_artists(args.from_library)
+        if args.artists_file:
+            with open(args.artists_file, "r", encoding="utf-8") as fh:
+                artist_filter |= {normalize_text_key(line) for line in fh if line.strip()}
+        print(f"Artist filter: {len(artist_filter)} artists")
+
+    totals = {"releases": 0, "tracks": 0, "skipped": 0}
+    for path in args.releases:
+        print(f"Importing {path} -> {args.index}")
+        counts = import_releases(
+            iter_dump(path),
+            index_path=Path(args.index),
+            artist_filter=artist_filter,
+            limit=(args.limit - totals["releases"]) if args.limit else None,
+        )
+        for k, v in counts.items():
+            totals[k] += v
+        if args.limit and totals["releases"] >= args.limit:
+            break
+    print(f"Done: releases={totals['releases']} tracks={totals['tracks']} skipped={totals['skipped']}")
@@ -0,0 +1,81 @@
+"""
+Golden-match regression check for streamer_api.matching.
+
+Each pair is a real-world tag/provider spelling with the expected verdict at
+the thresholds enrichment uses (_candidate_passes_sanity: artist 0.58,
+album 0.45, title 0.52). Run after touching the similarity code:
+
+    python scripts/matching_golden.py          # exit 1 on any regression
+    python scripts/matching_golden.py --show   # print every score next to SequenceMatcher
+"""
+import argparse
+import os
+import sys
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamer_api.matching import similarity, text_key  # noqa: E402
+
+THRESHOLDS = {"artist": 0.58, "album": 0.45, "title": 0.52}
+
+# (field, local value, provider value, should match)
+GOLDEN = [
+    ("artist", "The Beatles", "Beatles, The", True),
+    ("artist", "Beyoncé", "Beyonce", True),
+    ("artist", "AC/DC", "ACDC", True),
+    ("artist", "Guns N' Roses", "Guns N Roses", True),
+    ("artist", "Simon & Garfunkel", "Simon and Garfunkel", True),
+    ("artist", "Radiohead", "Radiohed", True),
+    ("artist", "Sigur Rós", "Sigur Ros", True),
+    ("artist", "Bob Marley & The Wailers", "Bob Marley", True),
+    ("artist", "The Doors", "Doors", True),
+    ("artist", "Radiohead", "Coldplay", False),
+    ("artist", "Metallica", "Megadeth", False),
+    ("artist", "Madonna", "Madness", False),
+    ("artist", "Queen", "Queens of the Stone Age", False),
+    ("artist", "Blur", "Oasis", False),
+    ("album", "Abbey Road", "Abbey Road (Super Deluxe Edition)", True),
+    ("album", "OK Computer", "OK Computer OKNOTOK 1997 2017", True),
+    ("album", "The Dark Side of the Moon", "Dark Side of the Moon", True),
+    ("album", "Kid A", "Amnesiac", False),
+    ("album", "Nevermind", "In Utero", False),
+    ("title", "Paranoid Android", "Paranoid Androd", True),
+    ("title", "Bohemian Rhapsody", "Bohemian Rapsody", True),
+    ("title", "Stairway to Heaven", "Stairway To Heaven (Remaster)", True),
+    ("title", "Wish You Were Here", "Wish You Were Here - 2011 Remaster", True),
+    ("title", "Love", "Love Me Do", True),
+    ("title", "Yesterday", "Let It Be", False),
+    ("title", "Hey Jude", "Hey You", False),
+    ("title", "One", "Two", False),
+    ("title", "Airbag", "Karma Police", False),
+]
+
+
+def _sequence_matcher(a, b):
+    x, y = text_key(str(a or "")), text_key(str(b or ""))
+    if not x and not y:
+        return 1.0
+    if not x or not y:
+        return 0.0
+    return SequenceMatcher(None, x, y).ratio()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check fuzzy matching against golden pairs.")
+    parser.add_argument("--show", action="store_true", help="Print every pair with both scores")
+    args = parser.parse_args()
+
+    failures = 0
+    for field, local, provider, expected in GOLDEN:
+        score = similarity(local, provider)
+        ok = (score >= THRESHOLDS[field]) == expected
+        failures += 0 if ok else 1
+        if args.show or not ok:
+            print(
+                f"{'ok  ' if ok else 'FAIL'} {field:6} {local!r} vs {provider!r}: "
+                f"new={score:.2f} seqmatch={_sequence_matcher(local, provider):.2f} "
+                f"threshold={THRESHOLDS[field]} expect={'match' if expected else 'reject'}"
+            )
+    print(f"{len(GOLDEN) - failures}/{len(GOLDEN)} golden pairs pass")
+    sys.exit(1 if failures else 0)
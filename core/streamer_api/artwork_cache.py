@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+import hashlib
+import os
+import threading
+import requests
+
+from .provider_cache import MISS, cache_get, cache_set
+from .storage import ROOT, db_get_media_cache, db_upsert_media_cache
+
+try:
+    from PIL import Image  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    Image = None
+
+# Server-side artwork cache: originals are fetched once and stored by content
+# hash; resized variants are derived on demand next to them. Without Pillow
+# every variant is the original image.
+ARTWORK_CACHE_DIR = Path(os.getenv("RT_ARTWORK_CACHE_DIR") or (ROOT / "data" / "cache" / "artwork"))
+ARTWORK_PROXY_ENABLED = str(os.getenv("RT_ARTWORK_PROXY_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+ARTWORK_MAX_BYTES = max(256 * 1024, int(os.getenv("RT_ARTWORK_MAX_BYTES", str(15 * 1024 * 1024)) or "15728640"))
+ARTWORK_CACHE_MAX_MB = max(64, int(os.getenv("RT_ARTWORK_CACHE_MAX_MB", "2048") or "2048"))
+ARTWORK_QUALITY = max(40, min(95, int(os.getenv("RT_ARTWORK_QUALITY", "82") or "82")))
+# Longest edge in pixels per variant; "full" only caps absurdly large originals.
+VARIANT_SIZES = {
+    "thumb": max(32, int(os.getenv("RT_ARTWORK_THUMB_PX", "200") or "200")),
+    "medium": max(64, int(os.getenv("RT_ARTWORK_MEDIUM_PX", "600") or "600")),
+    "full": max(256, int(os.getenv("RT_ARTWORK_FULL_PX", "1600") or "1600")),
+}
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+# Only artwork hosts the metadata providers hand out are proxied (no open proxy).
+DEFAULT_HOSTS = "coverartarchive.org,archive.org,discogs.com,wikimedia.org,wikipedia.org"
+ALLOWED_HOSTS = {
+    h.strip().lower()
+    for h in str(os.getenv("RT_ARTWORK_PROXY_HOSTS", DEFAULT_HOSTS)).split(",")
+    if h.strip()
+}
+USER_AGENT = "RadioTiker-vnext/artwork-cache (admin@radio.tiker.es)"
+
+_LOCK_STRIPES = 64
+_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+_writes_since_prune = 0
+_PRUNE_EVERY_WRITES = 200
+
+
+class ArtworkError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _lock_for(key: str) -> threading.Lock:
+    # Striped so the lock table stays a fixed size however many keys a long-running server sees.
+    return _locks[int(hashlib.sha1(key.encode("utf-8", "ignore")).hexdigest()[:8], 16) % _LOCK_STRIPES]
+
+
+def host_allowed(url: str) -> bool:
+    try:
+        parsed = urlparse(url)
+    except Exception:
+        return False
+    host = (parsed.hostname or "").lower()
+    if parsed.scheme not in {"http", "https"} or not host:
+        return False
+    return any(host == h or host.endswith(f".{h}") for h in ALLOWED_HOSTS)
+
+
+def _original_path(sha: str) -> Path:
+    return ARTWORK_CACHE_DIR / "orig" / sha[:2] / sha
+
+
+def _variant_path(sha: str, variant: str, fmt: str) -> Path:
+    return ARTWORK_CACHE_DIR / "var" / sha[:2] / f"{sha}-{variant}.{fmt}"
+
+
+def _write_atomic(path: Path, data: bytes):
+    global _writes_since_prune
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    _writes_since_prune += 1
+    if _writes_since_prune >= _PRUNE_EVERY_WRITES:
+        _writes_since_prune = 0
+        prune_cache()
+
+
+def _download(url: str) -> Tuple[bytes, str]:
+    """GET an image, re-checking the host on every redirect hop and capping the size."""
+    current = url
+    for _ in range(6):
+        if not host_allowed(current):
+            raise ArtworkError(403, "artwork host not allowed")
+        try:
+            r = requests.get(
+                current,
+                stream=True,
+                allow_redirects=False,
+                timeout=(5, 20),
+                headers={"User-Agent": USER_AGENT, "Accept": "image/*"},
+            )
+        except requests.RequestException as e:
+            raise ArtworkError(502, f"artwork fetch failed: {e}")
+        try:
+            if r.is_redirect:
+                current = urljoin(current, r.headers.get("Location") or "")
+                continue
+            if r.status_code >= 400:
+                raise ArtworkError(404 if r.status_code == 404 else 502, f"artwork upstream status {r.status_code}")
+            mime = str(r.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+            if not mime.startswith("image/"):
+                raise ArtworkError(415, f"not an image: {mime or 'unknown'}")
+            buf = bytearray()
+            for chunk in r.iter_content(64 * 1024):
+                buf.extend(chunk)
+                if len(buf) > ARTWORK_MAX_BYTES:
+                    raise ArtworkError(413, "artwork too large")
+            return bytes(buf), mime
+        finally:
+            r.close()
+    raise ArtworkError(502, "too many redirects")
+
+
+def resolve_original(url: str) -> Dict[str, Any]:
+    """
+    Map a remote artwork URL to its cached original ({sha256, mime_type,
+    size_bytes}), fetching it on first use. The URL index lives in the
+    provider cache with media_cache (MySQL) as the durable copy.
+    """
+    if not host_allowed(url):
+        raise ArtworkError(403, "artwork host not allowed")
+    key = hashlib.sha256(url.encode("utf-8", "ignore")).hexdigest()
+    cached = cache_get("artwork", key)
+    if cached is not MISS:
+        if not cached:
+            raise ArtworkError(404, "artwork unavailable")
+        if _original_path(cached["sha256"]).exists():
+            return cached
+    with _lock_for(key):
+        row = db_get_media_cache(key)
+        if row and row.get("sha256") and row.get("storage_kind") == "local" and _original_path(row["sha256"]).exists():
+            entry = {"sha256": row["sha256"], "mime_type": row.get("mime_type"), "size_bytes": row.get("size_bytes")}
+            cache_set("artwork", key, entry)
+            return entry
+        try:
+            data, mime = _download(url)
+        except ArtworkError as e:
+            if e.status_code in {403, 404, 413, 415}:
+                cache_set("artwork", key, None, negative=True)
+            else:
+                cache_set("artwork", key, None, error=True)
+            raise
+        sha = hashlib.sha256(data).hexdigest()
+        path = _original_path(sha)
+        if not path.exists():
+            _write_atomic(path, data)
+        entry = {"sha256": sha, "mime_type": mime, "size_bytes": len(data)}
+        cache_set("artwork", key, entry)
+        db_upsert_media_cache({
+            "cache_key": key,
+            "source_url": url,
+            "mime_type": mime,
+            "size_bytes": len(data),
+            "sha256": sha,
+            "storage_kind": "local",
+            "storage_url": str(path.relative_to(ARTWORK_CACHE_DIR)),
+        })
+        return entry
+
+
+def pick_format(fmt: Optional[str], accept: Optional[str]) -> str:
+    fmt = str(fmt or "auto").strip().lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt in FORMATS:
+        return fmt
+    return "webp" if "image/webp" in str(accept or "").lower() else "jpeg"
+
+
+def load_variant(sha: str, variant: str, fmt: str) -> Tuple[bytes, str, bool]:
+    """
+    Bytes, MIME type and cacheability of a variant of original `sha`, rendering
+    it on first request. A resize failure serves the original but reports it as
+    not cacheable, so a transient Pillow error is not pinned in clients.
+    """
+    if variant not in VARIANT_SIZES:
+        raise ArtworkError(400, f"unknown artwork size: {variant}")
+    if len(sha) != 64 or any(c not in "0123456789abcdef" for c in sha):
+        raise ArtworkError(400, "bad artwork id")
+    original = _original_path(sha)
+    if not original.exists():
+        raise ArtworkError(404, "artwork not cached")
+    if Image is None:
+        data = original.read_bytes()
+        return data, _sniff_mime(data), True
+    fmt = fmt if fmt in FORMATS else "jpeg"
+    path = _variant_path(sha, variant, fmt)
+    if path.exists():
+        return path.read_bytes(), FORMATS[fmt], True
+    with _lock_for(f"{sha}-{variant}-{fmt}"):
+        if not path.exists():
+            try:
+                img = Image.open(BytesIO(original.read_bytes()))
+                img.load()
+                img.thumbnail((VARIANT_SIZES[variant], VARIANT_SIZES[variant]))
+                if fmt == "jpeg" or img.mode not in {"RGB", "RGBA"}:
+                    img = img.convert("RGB" if fmt == "jpeg" else "RGBA")
+                out = BytesIO()
+                img.save(out, format=fmt.upper(), quality=ARTWORK_QUALITY)
+            except Exception as e:
+                print(f"[artwork] resize failed sha={sha} variant={variant}: {e}")
+                data = original.read_bytes()
+                return data, _sniff_mime(data), False
+            _write_atomic(path, out.getvalue())
+    return path.read_bytes(), FORMATS[fmt], True
+
+
+def _sniff_mime(data: bytes) -> str:
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in {b"GIF87a", b"GIF89a"}:
+        return "image/gif"
+    return "application/octet-stream"
+
+
+def prune_cache():
+    """Drop least recently written files until the cache is under RT_ARTWORK_CACHE_MAX_MB (variants first)."""
+    limit = ARTWORK_CACHE_MAX_MB * 1024 * 1024
+    try:
+        files = []
+        total = 0
+        for kind in ("var", "orig"):
+            for p in (ARTWORK_CACHE_DIR / kind).glob("*/*"):
+                if p.name.endswith(".tmp"):
+                    continue
+                st = p.stat()
+                total += st.st_size
+                files.append((0 if kind == "var" else 1, st.st_mtime, st.st_size, p))
+        if total <= limit:
+            return
+        target = int(limit * 0.9)
+        for _, _, size, p in sorted(files):
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except FileNotFoundError:
+                pass
+    except Exception as e:
+        print(f"[artwork] prune failed: {e}")
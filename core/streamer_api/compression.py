@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from typing import Optional
+import json
+import os
+import zlib
+
+from fastapi import HTTPException
+
+try:
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Compressed request bodies (Content-Encoding: gzip / deflate / zstd) from the
+# thin agent. Bodies are inflated incrementally as the endpoint reads them, so
+# streaming ingest stays streaming, and the inflated size is capped to stop
+# decompression bombs.
+REQUEST_DECOMPRESS_ENABLED = str(os.getenv("RT_REQUEST_DECOMPRESS_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+MAX_DECOMPRESSED_BYTES = max(1, int(os.getenv("RT_REQUEST_MAX_DECOMPRESSED_MB", "64") or "64")) * 1024 * 1024
+# Endpoints that enforce their own (larger) body limits while streaming.
+STREAMING_PATH_SUFFIXES = ("/submit-scan-stream",)
+_OUT_CHUNK = 256 * 1024
+# zstd output is not boundable per call, so feed it small slices to keep one call's output sane.
+_ZSTD_IN_SLICE = 1024
+
+
+def supported_encodings() -> list[str]:
+    return ["gzip", "deflate"] + (["zstd"] if zstandard is not None else [])
+
+
+class _Inflater:
+    def __init__(self, encoding: str, limit: Optional[int]):
+        self.encoding = encoding
+        self.limit = limit
+        self.total = 0
+        if encoding in {"gzip", "x-gzip"}:
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._zlib = zlib.decompressobj()
+        else:
+            self._zlib = None
+            self._zstd = zstandard.ZstdDecompressor().decompressobj()
+
+    def _count(self, out: bytes) -> bytes:
+        self.total += len(out)
+        if self.limit is not None and self.total > self.limit:
+            raise HTTPException(status_code=413, detail=f"Decompressed body exceeds {self.limit} bytes")
+        return out
+
+    def feed(self, data: bytes, final: bool) -> bytes:
+        parts = []
+        try:
+            if self._zlib is not None:
+                while data:
+                    parts.append(self._count(self._zlib.decompress(data, _OUT_CHUNK)))
+                    data = self._zlib.unconsumed_tail
+                if final:
+                    parts.append(self._count(self._zlib.flush()))
+            else:
+                for i in range(0, len(data), _ZSTD_IN_SLICE):
+                    parts.append(self._count(self._zstd.decompress(data[i:i + _ZSTD_IN_SLICE])))
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Bad {self.encoding} request body: {e}")
+        return b"".join(parts)
+
+
+class DecompressRequestMiddleware:
+    """ASGI middleware: inflate Content-Encoded request bodies before the app sees them."""
+
+    def __init__(self, app, max_bytes: int = MAX_DECOMPRESSED_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REQUEST_DECOMPRESS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = ""
+        for name, value in scope.get("headers") or []:
+            if name == b"content-encoding":
+                encoding = value.decode("latin-1").strip().lower()
+                break
+        if encoding in {"", "identity"}:
+            await self.app(scope, receive, send)
+            return
+        if encoding not in {"gzip", "x-gzip", "deflate", "zstd"} or (encoding == "zstd" and zstandard is None):
+            await _send_json(send, 415, {
+                "detail": f"Unsupported Content-Encoding: {encoding}",
+                "supported": supported_encodings(),
+            })
+            return
+        path = str(scope.get("path") or "")
+        limit = None if path.endswith(STREAMING_PATH_SUFFIXES) else self.max_bytes
+        inflater = _Inflater(encoding, limit)
+        scope = dict(scope)
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in {b"content-encoding", b"content-length"}
+        ]
+
+        async def inflating_receive():
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            more = bool(message.get("more_body", False))
+            return {
+                "type": "http.request",
+                "body": inflater.feed(message.get("body", b""), final=not more),
+                "more_body": more,
+            }
+
+        await self.app(scope, inflating_receive, send)
+
+
+async def _send_json(send, status: int, payload: dict):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from .jobs import file_lock
+from .storage import DATA_DIR
+
+# Persistent, incrementally maintained queue of tracks that still need
+# enrichment. Scans, playbacks and edits upsert rows; the scheduler thread
+# drains the highest-priority due rows within provider rate budgets.
+QUEUE_PATH = Path(os.getenv("RT_ENRICH_QUEUE_PATH") or (DATA_DIR / "enrich-queue.sqlite3"))
+SCHEDULER_ENABLED = str(os.getenv("RT_ENRICH_SCHEDULER_ENABLED", "0")).strip().lower() not in {"0", "false", "off", "no"}
+SCHEDULER_BATCH = max(1, int(os.getenv("RT_ENRICH_SCHEDULER_BATCH", "20") or "20"))
+SCHEDULER_IDLE_SEC = max(1, int(os.getenv("RT_ENRICH_SCHEDULER_IDLE_SEC", "30") or "30"))
+# Unmatched tracks back off exponentially: base * 2^(attempts-1), capped.
+BACKOFF_BASE_SEC = max(60, int(os.getenv("RT_ENRICH_QUEUE_BACKOFF_SEC", str(6 * 3600)) or "21600"))
+BACKOFF_MAX_SEC = max(BACKOFF_BASE_SEC, int(os.getenv("RT_ENRICH_QUEUE_BACKOFF_MAX_SEC", str(30 * 86400)) or "2592000"))
+# Rows skipped because a provider was out of rate budget come back this soon.
+DEFERRED_RETRY_SEC = max(5, int(os.getenv("RT_ENRICH_QUEUE_DEFERRED_RETRY_SEC", "120") or "120"))
+PLAY_WEIGHT = max(0.0, float(os.getenv("RT_ENRICH_QUEUE_PLAY_WEIGHT", "0.5") or "0.5"))
+
+# Outcomes reported by the batch processor; anything else (e.g. "unmatched") backs off.
+DONE_OUTCOMES = {"applied", "matched", "skipped", "missing"}
+DEFERRED_OUTCOME = "deferred"
+# Recorded for every track of a batch whose processor raised; backs off like "unmatched".
+ERROR_OUTCOME = "error"
+
+_local = threading.local()
+_disabled_reason: Optional[str] = None
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS enrich_queue (
+      user_id TEXT NOT NULL,
+      track_id TEXT NOT NULL,
+      deficit REAL NOT NULL,
+      plays INTEGER NOT NULL DEFAULT 0,
+      attempts INTEGER NOT NULL DEFAULT 0,
+      priority REAL NOT NULL,
+      next_attempt_at REAL NOT NULL,
+      last_attempt_at REAL,
+      last_outcome TEXT,
+      reason TEXT,
+      updated_at REAL NOT NULL,
+      PRIMARY KEY (user_id, track_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_enrich_queue_due ON enrich_queue (next_attempt_at, priority)",
+    "CREATE INDEX IF NOT EXISTS idx_enrich_queue_user ON enrich_queue (user_id, priority)",
+]
+
+
+def _priority(deficit: float, plays: int) -> float:
+    return round(deficit * (1.0 + PLAY_WEIGHT * math.log2(1 + max(0, plays))), 3)
+
+
+def _conn() -> Optional[sqlite3.Connection]:
+    global _disabled_reason
+    if _disabled_reason:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    try:
+        QUEUE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(QUEUE_PATH), timeout=10.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.create_function("rt_priority", 2, _priority)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+    except Exception as e:
+        _disabled_reason = str(e)
+        print(f"[enrich-queue] disabled: {e}")
+        return None
+    _local.conn = conn
+    return conn
+
+
+def quality_deficit(track: Dict[str, Any]) -> float:
+    """
+    How much enrichment could still improve `track`: missing quality points
+    plus gaps in artwork/bios. 0 means nothing left to do. Manual edits and
+    tracks with auto-enrich disabled or hidden are never queued.
+    """
+    source = str(track.get("metadata_source") or "").strip().lower()
+    if source.startswith("manual:") or track.get("auto_enrich_disabled") or track.get("is_hidden"):
+        return 0.0
+    try:
+        quality = int(track.get("metadata_quality") or 0)
+    except Exception:
+        quality = 0
+    deficit = float(max(0, 100 - quality))
+    if not str(track.get("artwork_url") or "").strip():
+        deficit += 30.0
+    if not (track.get("artist_image_urls") or []):
+        deficit += 5.0
+    if not str(track.get("artist_bio") or "").strip() and not str(track.get("album_bio") or "").strip():
+        deficit += 10.0
+    if source and not source.startswith("seed:") and deficit <= 15.0:
+        # Already provider-enriched and only cosmetic gaps remain.
+        return 0.0
+    return deficit
+
+
+def enqueue_tracks(user_id: str, tracks: Iterable[Dict[str, Any]], reason: str = "scan", reset_backoff: bool = False) -> Dict[str, int]:
+    """
+    Upsert queue rows for `tracks`. Tracks with no deficit are removed. Existing
+    rows keep their play count and backoff unless `reset_backoff`.
+    """
+    conn = _conn()
+    counts = {"queued": 0, "removed": 0}
+    if conn is None:
+        return counts
+    now = time.time()
+    upserts, removals = [], []
+    for t in tracks:
+        tid = str(t.get("track_id") or "")
+        if not tid:
+            continue
+        deficit = quality_deficit(t)
+        if deficit <= 0:
+            removals.append((user_id, tid))
+        else:
+            upserts.append((user_id, tid, deficit, _priority(deficit, 0), now, reason, now))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if upserts:
+            conn.executemany(
+                f"""
+                INSERT INTO enrich_queue (user_id, track_id, deficit, priority, next_attempt_at, reason, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, track_id) DO UPDATE SET
+                  deficit=excluded.deficit,
+                  priority=rt_priority(excluded.deficit, enrich_queue.plays),
+                  reason=excluded.reason,
+                  updated_at=excluded.updated_at
+                  {", attempts=0, next_attempt_at=excluded.next_attempt_at" if reset_backoff else ""}
+                """,
+                upserts,
+            )
+        if removals:
+            conn.executemany("DELETE FROM enrich_queue WHERE user_id = ? AND track_id = ?", removals)
+        conn.execute("COMMIT")
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except Exception:
+            pass
+        print(f"[enrich-queue] enqueue failed user={user_id}: {e}")
+        return counts
+    counts["queued"] = len(upserts)
+    counts["removed"] = len(removals)
+    if upserts and SCHEDULER_ENABLED:
+        _WAKE.set()
+    return counts
+
+
+def forget_tracks(user_id: str, track_ids: Iterable[str]):
+    conn = _conn()
+    ids = [str(tid) for tid in track_ids if str(tid or "")]
+    if conn is None or not ids:
+        return
+    try:
+        conn.executemany("DELETE FROM enrich_queue WHERE user_id = ? AND track_id = ?", [(user_id, tid) for tid in ids])
+    except Exception as e:
+        print(f"[enrich-queue] forget failed user={user_id}: {e}")
+
+
+def record_play(user_id: str, track_id: str):
+    """Bump a queued track's play count (tracks not queued need no enrichment)."""
+    conn = _conn()
+    if conn is None:
+        return
+    try:
+        conn.execute(
+            """
+            UPDATE enrich_queue SET plays = plays + 1, priority = rt_priority(deficit, plays + 1), updated_at = ?
+            WHERE user_id = ? AND track_id = ?
+            """,
+            (time.time(), user_id, str(track_id)),
+        )
+    except Exception as e:
+        print(f"[enrich-queue] record play failed user={user_id}: {e}")
+
+
+def record_outcomes(user_id: str, outcomes: Dict[str, str]):
+    """Drop finished rows, back off unmatched ones, briefly delay deferred ones."""
+    conn = _conn()
+    if conn is None or not outcomes:
+        return
+    now = time.time()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for tid, outcome in outcomes.items():
+            if outcome in DONE_OUTCOMES:
+                conn.execute("DELETE FROM enrich_queue WHERE user_id = ? AND track_id = ?", (user_id, tid))
+            elif outcome == DEFERRED_OUTCOME:
+                conn.execute(
+                    "UPDATE enrich_queue SET next_attempt_at = ?, last_outcome = ?, updated_at = ? WHERE user_id = ? AND track_id = ?",
+                    (now + DEFERRED_RETRY_SEC, outcome, now, user_id, tid),
+                )
+            else:
+                row = conn.execute(
+                    "SELECT attempts FROM enrich_queue WHERE user_id = ? AND track_id = ?", (user_id, tid)
+                ).fetchone()
+                if not row:
+                    continue
+                attempts = int(row["attempts"] or 0) + 1
+                delay = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** min(attempts - 1, 16)))
+                conn.execute(
+                    """
+                    UPDATE enrich_queue SET attempts = ?, next_attempt_at = ?, last_attempt_at = ?,
+                      last_outcome = ?, updated_at = ?
+                    WHERE user_id = ? AND track_id = ?
+                    """,
+                    (attempts, now + delay, now, outcome, now, user_id, tid),
+                )
+        conn.execute("COMMIT")
+    except Exception as e:
+        try:
+            conn.execute("ROLLBACK")
+        except Exception:
+            pass
+        print(f"[enrich-queue] record outcomes failed user={user_id}: {e}")
+
+
+def due_batch(limit: int = SCHEDULER_BATCH) -> Optional[Dict[str, Any]]:
+    """Highest-priority due row's user and up to `limit` of that user's due track ids."""
+    conn = _conn()
+    if conn is None:
+        return None
+    now = time.time()
+    try:
+        top = conn.execute(
+            "SELECT user_id FROM enrich_queue WHERE next_attempt_at <= ? ORDER BY priority DESC LIMIT 1",
+            (now,),
+        ).fetchone()
+        if not top:
+            return None
+        rows = conn.execute(
+            """
+            SELECT track_id FROM enrich_queue
+            WHERE user_id = ? AND next_attempt_at <= ?
+            ORDER BY priority DESC LIMIT ?
+            """,
+            (top["user_id"], now, limit),
+        ).fetchall()
+        return {"user_id": top["user_id"], "track_ids": [r["track_id"] for r in rows]}
+    except Exception as e:
+        print(f"[enrich-queue] due lookup failed: {e}")
+        return None
+
+
+def queue_stats(user_id: Optional[str] = None, top: int = 20) -> Dict[str, Any]:
+    conn = _conn()
+    out: Dict[str, Any] = {
+        "enabled": SCHEDULER_ENABLED,
+        "available": conn is not None,
+        "disabled_reason": _disabled_reason,
+        "path": str(QUEUE_PATH),
+    }
+    if conn is None:
+        return out
+    where, args = ("WHERE user_id = ?", [user_id]) if user_id else ("", [])
+    now = time.time()
+    try:
+        row = conn.execute(
+            f"""
+            SELECT COUNT(*) AS total,
+                   SUM(CASE WHEN next_attempt_at <= ? THEN 1 ELSE 0 END) AS due,
+                   SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END) AS retried
+            FROM enrich_queue {where}
+            """,
+            [now, *args],
+        ).fetchone()
+        out.update({"total": int(row["total"] or 0), "due": int(row["due"] or 0), "retried": int(row["retried"] or 0)})
+        out["top"] = [
+            dict(r)
+            for r in conn.execute(
+                f"""
+                SELECT user_id, track_id, priority, deficit, plays, attempts, next_attempt_at, last_outcome, reason
+                FROM enrich_queue {where} ORDER BY priority DESC LIMIT ?
+                """,
+                [*args, max(0, top)],
+            )
+        ]
+    except Exception as e:
+        print(f"[enrich-queue] stats failed: {e}")
+    return out
+
+
+# -------- scheduler --------
+_WAKE = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+_START_LOCK = threading.Lock()
+_PROCESSOR: Optional[Callable[[str, List[str]], Dict[str, str]]] = None
+
+
+def set_processor(fn: Callable[[str, List[str]], Dict[str, str]]):
+    """Register the batch processor: (user_id, track_ids) -> {track_id: outcome}."""
+    global _PROCESSOR
+    _PROCESSOR = fn
+
+
+def _loop():
+    run_path = QUEUE_PATH.with_suffix(".run")
+    while True:
+        did_work = False
+        deferred = False
+        try:
+            # One process drains at a time; the others only feed the queue.
+            with file_lock(run_path, blocking=False) as locked:
+                if locked and _PROCESSOR is not None:
+                    batch = due_batch()
+                    if batch and batch["track_ids"]:
+                        try:
+                            outcomes = _PROCESSOR(batch["user_id"], batch["track_ids"]) or {}
+                        except Exception as e:
+                            # Back the batch off like unmatched rows; retrying it at once would
+                            # block every lower-priority row behind it.
+                            print(f"[enrich-queue] batch failed user={batch['user_id']}: {e}")
+                            outcomes = {tid: ERROR_OUTCOME for tid in batch["track_ids"]}
+                        record_outcomes(batch["user_id"], outcomes)
+                        did_work = True
+                        deferred = bool(outcomes) and all(o == DEFERRED_OUTCOME for o in outcomes.values())
+        except Exception as e:
+            print(f"[enrich-queue] scheduler error: {e}")
+        if not did_work or deferred:
+            # Nothing due, or every provider is out of budget: let the buckets refill.
+            _WAKE.wait(SCHEDULER_IDLE_SEC)
+            _WAKE.clear()
+
+
+def start_enrich_scheduler():
+    """Start the drain thread when RT_ENRICH_SCHEDULER_ENABLED is set."""
+    global _THREAD
+    if not SCHEDULER_ENABLED or _PROCESSOR is None:
+        return
+    with _START_LOCK:
+        if _THREAD and _THREAD.is_alive():
+            return
+        _THREAD = threading.Thread(target=_loop, name="rt-enrich-scheduler", daemon=True)
+        _THREAD.start()
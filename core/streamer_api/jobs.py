@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import fcntl
+import json
+import threading
+import time
+import uuid
+
+from .storage import DATA_DIR, jobs_path, job_items_path, _json_default
+
+# Background job runners keyed by job kind ("health", ...).
+RUNNERS: Dict[str, "JobRunner"] = {}
+
+JOB_RUNNABLE_STATUSES = {"queued", "running"}
+JOB_FINAL_STATUSES = {"completed", "cancelled"}
+JOB_ACTIONS = {"pause", "resume", "cancel"}
+# Progress is written back every N items or T seconds (and when a job stops), not per item.
+CHECKPOINT_ITEMS = 25
+CHECKPOINT_SEC = 5.0
+
+
+@contextmanager
+def file_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """
+    Cross-process advisory lock next to `path`. Yields False when a non-blocking
+    attempt loses; the OS releases the lock if the holder dies.
+    """
+    fh = open(f"{path}.lock", "a+")
+    locked = False
+    try:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            locked = True
+        except OSError:
+            locked = False
+        yield locked
+    finally:
+        if locked:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            except OSError:
+                pass
+        fh.close()
+
+
+def _merge_counts(dst: Dict[str, Any], src: Dict[str, Any]):
+    for k, v in (src or {}).items():
+        if isinstance(v, dict):
+            _merge_counts(dst.setdefault(k, {}), v)
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            dst[k] = dst.get(k, 0) + v
+
+
+def job_progress(job: Dict[str, Any]) -> Dict[str, Any]:
+    total = int(job.get("total") or 0)
+    done = int(job.get("done") or 0)
+    active_sec = float(job.get("active_sec") or 0.0)
+    remaining = max(0, total - done)
+    rate = (done / active_sec) if active_sec > 0 and done > 0 else None
+    eta_sec = None
+    if job.get("status") in JOB_RUNNABLE_STATUSES and rate:
+        eta_sec = int(round(remaining / rate))
+    return {
+        "total": total,
+        "done": done,
+        "remaining": remaining,
+        "percent": round(100.0 * done / total, 1) if total else 100.0,
+        "items_per_min": round(rate * 60.0, 2) if rate else None,
+        "eta_sec": eta_sec,
+    }
+
+
+class JobRunner:
+    """
+    Persistent per-user job queue for one job kind.
+
+    Job records live in `<user>.<kind>-jobs.json` and their item lists in a
+    sibling items file, so progress survives restarts. One daemon thread per
+    process drains runnable jobs; a per-user run lock keeps uvicorn workers
+    from processing the same user's jobs twice. The worker keeps a job's items
+    in memory and checkpoints its cursor and counters every CHECKPOINT_ITEMS
+    items, so a restart redoes at most that many.
+
+    With `prefetch`, the worker calls prefetch(user_id, job, items) once per
+    window of up to CHECKPOINT_ITEMS items and passes its result to
+    process_item as a fourth argument (None if prefetch failed), so lookups
+    can be batched instead of made per item.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        process_item: Callable[..., Dict[str, Any]],
+        poll_interval_sec: float = 5.0,
+        keep_finished: int = 20,
+        prefetch: Optional[Callable[[str, Dict[str, Any], List[Any]], Any]] = None,
+    ):
+        self.kind = kind
+        self.process_item = process_item
+        self.prefetch = prefetch
+        self.poll_interval_sec = poll_interval_sec
+        self.keep_finished = keep_finished
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._items_cache: Dict[tuple, tuple] = {}
+        RUNNERS[kind] = self
+
+    # -------- store --------
+    def _load(self, user_id: str) -> Dict[str, Any]:
+        p = jobs_path(user_id, self.kind)
+        if p.exists():
+            try:
+                obj = json.loads(p.read_text())
+                if isinstance(obj, dict) and "jobs" in obj:
+                    return obj
+            except Exception:
+                pass
+        return {"user_id": user_id, "jobs": [], "version": int(time.time())}
+
+    def _save(self, user_id: str, store: Dict[str, Any]):
+        store["user_id"] = user_id
+        store["version"] = int(time.time())
+        p = jobs_path(user_id, self.kind)
+        tmp = p.with_name(p.name + ".tmp")
+        tmp.write_text(json.dumps(store, indent=2, default=_json_default))
+        tmp.replace(p)
+
+    def _update(self, user_id: str, fn: Callable[[Dict[str, Any]], Any]) -> Any:
+        with file_lock(jobs_path(user_id, self.kind)):
+            store = self._load(user_id)
+            out = fn(store)
+            self._save(user_id, store)
+            return out
+
+    def _load_items(self, user_id: str, job_id: str) -> List[Any]:
+        p = job_items_path(user_id, self.kind, job_id)
+        try:
+            obj = json.loads(p.read_text())
+            return obj if isinstance(obj, list) else []
+        except Exception:
+            return []
+
+    def _cached_items(self, user_id: str, job_id: str) -> List[Any]:
+        """Items for the worker, re-read only when the file changed (e.g. a merge appended some)."""
+        p = job_items_path(user_id, self.kind, job_id)
+        try:
+            st = p.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        key = (user_id, job_id)
+        hit = self._items_cache.get(key)
+        if hit and hit[0] == stamp:
+            return hit[1]
+        items = self._load_items(user_id, job_id)
+        self._items_cache[key] = (stamp, items)
+        return items
+
+    def _save_items(self, user_id: str, job_id: str, items: List[Any]):
+        # Same tmp + replace as _save: a torn items file would read as [] and complete the job.
+        p = job_items_path(user_id, self.kind, job_id)
+        tmp = p.with_name(p.name + ".tmp")
+        tmp.write_text(json.dumps(items, default=_json_default))
+        tmp.replace(p)
+
+    def _prune(self, user_id: str, store: Dict[str, Any]):
+        finished = [j for j in store["jobs"] if j.get("status") in JOB_FINAL_STATUSES]
+        if len(finished) <= self.keep_finished:
+            return
+        drop = {j["job_id"] for j in finished[: len(finished) - self.keep_finished]}
+        store["jobs"] = [j for j in store["jobs"] if j.get("job_id") not in drop]
+        for job_id in drop:
+            try:
+                job_items_path(user_id, self.kind, job_id).unlink()
+            except FileNotFoundError:
+                pass
+
+    # -------- public API --------
+    def create(
+        self,
+        user_id: str,
+        items: List[Any],
+        options: Optional[Dict[str, Any]] = None,
+        merge_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queue a job over `items`. With `merge_key`, new items are appended to an
+        existing unfinished job with the same key instead of starting another one.
+        """
+        now = int(time.time())
+
+        def _apply(store: Dict[str, Any]) -> Dict[str, Any]:
+            if merge_key:
+                for job in store["jobs"]:
+                    if job.get("merge_key") != merge_key or job.get("status") in JOB_FINAL_STATUSES:
+                        continue
+                    existing = self._load_items(user_id, job["job_id"])
+                    pending = set(json.dumps(i, sort_keys=True) for i in existing[int(job.get("done") or 0):])
+                    added = []
+                    for item in items:
+                        key = json.dumps(item, sort_keys=True)
+                        if key not in pending:
+                            pending.add(key)
+                            added.append(item)
+                    if added:
+                        self._save_items(user_id, job["job_id"], existing + added)
+                        job["total"] = int(job.get("total") or 0) + len(added)
+                        job["updated_at"] = now
+                    return dict(job)
+            job = {
+                "job_id": str(uuid.uuid4()),
+                "kind": self.kind,
+                "user_id": user_id,
+                "status": "queued",
+                "merge_key": merge_key,
+                "options": options or {},
+                "total": len(items),
+                "done": 0,
+                "counters": {},
+                "active_sec": 0.0,
+                "last_error": None,
+                "created_at": now,
+                "started_at": None,
+                "updated_at": now,
+                "finished_at": None,
+            }
+            self._save_items(user_id, job["job_id"], list(items))
+            store["jobs"].append(job)
+            self._prune(user_id, store)
+            return dict(job)
+
+        job = self._update(user_id, _apply)
+        self.start()
+        self._wake.set()
+        return job
+
+    def list(self, user_id: str) -> List[Dict[str, Any]]:
+        store = self._load(user_id)
+        return [{**job, "progress": job_progress(job)} for job in reversed(store["jobs"])]
+
+    def get(self, user_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+        for job in self._load(user_id)["jobs"]:
+            if job.get("job_id") == job_id:
+                return {**job, "progress": job_progress(job)}
+        return None
+
+    def control(self, user_id: str, job_id: str, action: str) -> Optional[Dict[str, Any]]:
+        """Apply pause/resume/cancel. Returns the updated job, or None if unknown."""
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"unsupported job action: {action}")
+        now = int(time.time())
+
+        def _apply(store: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            for job in store["jobs"]:
+                if job.get("job_id") != job_id:
+                    continue
+                status = job.get("status")
+                if status in JOB_FINAL_STATUSES:
+                    return dict(job)
+                if action == "pause":
+                    job["status"] = "paused"
+                elif action == "resume":
+                    job["status"] = "queued"
+                else:
+                    job["status"] = "cancelled"
+                    job["finished_at"] = now
+                job["updated_at"] = now
+                return dict(job)
+            return None
+
+        job = self._update(user_id, _apply)
+        if job and action == "resume":
+            self.start()
+            self._wake.set()
+        return {**job, "progress": job_progress(job)} if job else None
+
+    # -------- worker --------
+    def start(self):
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name=f"rt-jobs-{self.kind}", daemon=True)
+            self._thread.start()
+
+    def _users_with_runnable_jobs(self) -> List[str]:
+        users = []
+        for p in sorted(DATA_DIR.glob(f"*.{self.kind}-jobs.json")):
+            try:
+                obj = json.loads(p.read_text())
+            except Exception:
+                continue
+            if any(j.get("status") in JOB_RUNNABLE_STATUSES for j in (obj.get("jobs") or [])):
+                uid = str(obj.get("user_id") or "")
+                if uid:
+                    users.append(uid)
+        return users
+
+    def _loop(self):
+        while True:
+            did_work = False
+            try:
+                for user_id in self._users_with_runnable_jobs():
+                    did_work = self._drain_user(user_id) or did_work
+            except Exception as e:
+                print(f"[jobs] {self.kind} worker error: {e}")
+            if not did_work:
+                self._wake.wait(self.poll_interval_sec)
+                self._wake.clear()
+
+    def _next_job(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Mark the first runnable job with items left as running; completes exhausted ones on the way."""
+        now = int(time.time())
+        live = set()
+
+        def _apply(store: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            for job in store["jobs"]:
+                if job.get("status") not in JOB_RUNNABLE_STATUSES:
+                    continue
+                live.add(job["job_id"])
+                items = self._cached_items(user_id, job["job_id"])
+                if int(job.get("done") or 0) >= len(items):
+                    job["status"] = "completed"
+                    job["finished_at"] = now
+                    job["updated_at"] = now
+                    continue
+                if job.get("status") != "running":
+                    job["status"] = "running"
+                    job["started_at"] = job.get("started_at") or now
+                    job["updated_at"] = now
+                return dict(job)
+            return None
+
+        job = self._update(user_id, _apply)
+        for key in [k for k in self._items_cache if k[0] == user_id and k[1] not in live]:
+            self._items_cache.pop(key, None)
+        return job
+
+    def _checkpoint(self, user_id: str, job_id: str, start: int, progress: Dict[str, Any]) -> bool:
+        """
+        Write the progress made since `start` (the job's done count when the
+        batch began). False when the job was paused/cancelled meanwhile, or
+        progressed elsewhere, so the worker should stop on it.
+        """
+        now = int(time.time())
+
+        def _apply(store: Dict[str, Any]) -> bool:
+            for job in store["jobs"]:
+                if job.get("job_id") != job_id:
+                    continue
+                if int(job.get("done") or 0) != start:
+                    return False
+                job["done"] = progress["done"]
+                job["active_sec"] = round(float(job.get("active_sec") or 0.0) + progress["spent"], 3)
+                _merge_counts(job.setdefault("counters", {}), progress["counters"])
+                if progress["failed"]:
+                    job["counters"]["failed"] = int(job["counters"].get("failed") or 0) + progress["failed"]
+                    job["last_error"] = progress["last_error"]
+                job["updated_at"] = now
+                if job["done"] >= int(job.get("total") or 0) and job.get("status") in JOB_RUNNABLE_STATUSES:
+                    job["status"] = "completed"
+                    job["finished_at"] = now
+                return job.get("status") == "running"
+            return False
+
+        return self._update(user_id, _apply)
+
+    def _drain_user(self, user_id: str) -> bool:
+        did_work = False
+        run_path = jobs_path(user_id, self.kind).with_suffix(".run")
+        with file_lock(run_path, blocking=False) as locked:
+            if not locked:
+                return False
+            while True:
+                job = self._next_job(user_id)
+                if not job:
+                    break
+                items = self._cached_items(user_id, job["job_id"])
+                start = int(job.get("done") or 0)
+                progress = {"done": start, "spent": 0.0, "counters": {}, "failed": 0, "last_error": None}
+                last_cp = time.time()
+                keep_going = True
+                window_end = start
+                window = None
+                while keep_going and progress["done"] < len(items):
+                    if self.prefetch and progress["done"] >= window_end:
+                        window_end = min(len(items), progress["done"] + CHECKPOINT_ITEMS)
+                        try:
+                            window = self.prefetch(user_id, job, items[progress["done"]:window_end])
+                        except Exception as e:
+                            window = None
+                            print(f"[jobs] {self.kind} prefetch failed user={user_id} job={job['job_id']} err={e}")
+                    started = time.time()
+                    try:
+                        item = items[progress["done"]]
+                        if self.prefetch:
+                            result = self.process_item(user_id, job, item, window) or {}
+                        else:
+                            result = self.process_item(user_id, job, item) or {}
+                        _merge_counts(progress["counters"], result)
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                        progress["failed"] += 1
+                        progress["last_error"] = error[:500]
+                        print(f"[jobs] {self.kind} item failed user={user_id} job={job['job_id']} err={error}")
+                    progress["done"] += 1
+                    progress["spent"] += time.time() - started
+                    did_work = True
+                    if (
+                        progress["done"] - start >= CHECKPOINT_ITEMS
+                        or time.time() - last_cp >= CHECKPOINT_SEC
+                        or progress["done"] >= len(items)
+                    ):
+                        keep_going = self._checkpoint(user_id, job["job_id"], start, progress)
+                        start = progress["done"]
+                        progress = {"done": start, "spent": 0.0, "counters": {}, "failed": 0, "last_error": None}
+                        last_cp = time.time()
+        return did_work
+
+
+def start_job_runners():
+    """Start every registered runner so jobs left unfinished by a restart resume."""
+    for runner in RUNNERS.values():
+        runner.start()
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+import gzip
+import json
+import lzma
+import os
+import sqlite3
+import threading
+
+from .storage import ROOT
+from .utils import normalize_text_key
+
+# Offline MusicBrainz subset built by core/scripts/import_musicbrainz_dump.py.
+# The "local" provider is only offered when this file exists.
+LOCAL_INDEX_PATH = Path(os.getenv("RT_LOCAL_MB_INDEX_PATH") or (ROOT / "data" / "cache" / "musicbrainz-local.sqlite3"))
+LOCAL_INDEX_ENABLED = str(os.getenv("RT_LOCAL_MB_INDEX_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+GRAM_SIZE = 3
+# Fuzzy lookups only consider rows sharing at least this fraction of the query's n-grams.
+GRAM_MIN_OVERLAP = 0.4
+
+_local = threading.local()
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS releases (
+      id TEXT PRIMARY KEY,
+      title TEXT NOT NULL,
+      title_key TEXT NOT NULL,
+      artist_credit TEXT,
+      artist_key TEXT,
+      release_group_id TEXT,
+      date TEXT,
+      track_count INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS recordings (
+      id TEXT PRIMARY KEY,
+      title TEXT NOT NULL,
+      title_key TEXT NOT NULL,
+      artist_credit TEXT,
+      artist_key TEXT,
+      length_ms INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tracks (
+      release_id TEXT NOT NULL,
+      disc_no INTEGER,
+      position INTEGER,
+      title TEXT,
+      recording_id TEXT,
+      artist_credit TEXT,
+      length_ms INTEGER,
+      PRIMARY KEY (release_id, disc_no, position)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS grams (
+      gram TEXT NOT NULL,
+      kind TEXT NOT NULL,
+      ref_id TEXT NOT NULL,
+      PRIMARY KEY (gram, kind, ref_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_releases_title_key ON releases (title_key)",
+    "CREATE INDEX IF NOT EXISTS idx_recordings_title_key ON recordings (title_key, artist_key)",
+    "CREATE INDEX IF NOT EXISTS idx_tracks_recording ON tracks (recording_id)",
+]
+
+
+def _grams(key: str) -> Set[str]:
+    padded = f" {key} "
+    if len(padded) <= GRAM_SIZE:
+        return {padded}
+    return {padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+
+def _credit_text(credit: Optional[List[Dict[str, Any]]]) -> str:
+    return "".join(
+        f"{(c.get('artist') or {}).get('name') or c.get('name') or ''}{c.get('joinphrase') or ''}"
+        for c in (credit or [])
+    ).strip()
+
+
+def local_index_available() -> bool:
+    return LOCAL_INDEX_ENABLED and LOCAL_INDEX_PATH.exists()
+
+
+def _conn() -> Optional[sqlite3.Connection]:
+    if not local_index_available():
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        try:
+            conn = sqlite3.connect(f"file:{LOCAL_INDEX_PATH}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+        except Exception as e:
+            print(f"[local-index] open failed: {e}")
+            return None
+        _local.conn = conn
+    return conn
+
+
+def _fuzzy_ids(conn: sqlite3.Connection, kind: str, key: str, limit: int) -> List[str]:
+    grams = sorted(_grams(key))
+    if not grams:
+        return []
+    need = max(1, int(len(grams) * GRAM_MIN_OVERLAP))
+    marks = ",".join("?" for _ in grams)
+    rows = conn.execute(
+        f"""
+        SELECT ref_id, COUNT(*) AS hits FROM grams
+        WHERE kind = ? AND gram IN ({marks})
+        GROUP BY ref_id HAVING hits >= ?
+        ORDER BY hits DESC LIMIT ?
+        """,
+        [kind, *grams, need, limit],
+    ).fetchall()
+    return [r["ref_id"] for r in rows]
+
+
+def search_recordings(title: str, artist: str = "", limit: int = 25) -> List[Dict[str, Any]]:
+    """
+    Recordings matching `title` (exact normalized key first, then n-gram
+    overlap), each with the releases it appears on.
+    """
+    conn = _conn()
+    title_key = normalize_text_key(title)
+    if conn is None or not title_key:
+        return []
+    artist_key = normalize_text_key(artist)
+    try:
+        if artist_key:
+            rows = conn.execute(
+                "SELECT * FROM recordings WHERE title_key = ? AND artist_key = ? LIMIT ?",
+                (title_key, artist_key, limit),
+            ).fetchall()
+        else:
+            rows = []
+        if not rows:
+            rows = conn.execute("SELECT * FROM recordings WHERE title_key = ? LIMIT ?", (title_key, limit)).fetchall()
+        if not rows:
+            ids = _fuzzy_ids(conn, "rec", title_key, limit)
+            if ids:
+                marks = ",".join("?" for _ in ids)
+                rows = conn.execute(f"SELECT * FROM recordings WHERE id IN ({marks})", ids).fetchall()
+        out = []
+        for rec in rows:
+            releases = conn.execute(
+                """
+                SELECT r.id, r.title, r.artist_credit, r.release_group_id, r.date, t.disc_no, t.position
+                FROM tracks t JOIN releases r ON r.id = t.release_id
+                WHERE t.recording_id = ? ORDER BY r.date IS NULL, r.date LIMIT 10
+                """,
+                (rec["id"],),
+            ).fetchall()
+            out.append({**dict(rec), "releases": [dict(r) for r in releases]})
+        return out
+    except Exception as e:
+        print(f"[local-index] recording lookup failed: {e}")
+        return []
+
+
+def search_releases(album: str, album_artist: str = "", limit: int = 10) -> List[Dict[str, Any]]:
+    """Releases matching `album` (exact key, then n-grams) with full tracklists."""
+    conn = _conn()
+    album_key = normalize_text_key(album)
+    if conn is None or not album_key:
+        return []
+    artist_key = normalize_text_key(album_artist)
+    try:
+        rows = conn.execute("SELECT * FROM releases WHERE title_key = ? LIMIT ?", (album_key, limit * 4)).fetchall()
+        if not rows:
+            ids = _fuzzy_ids(conn, "rel", album_key, limit * 4)
+            if ids:
+                marks = ",".join("?" for _ in ids)
+                rows = conn.execute(f"SELECT * FROM releases WHERE id IN ({marks})", ids).fetchall()
+        if artist_key:
+            rows = sorted(rows, key=lambda r: r["artist_key"] != artist_key)
+        out = []
+        for rel in rows[:limit]:
+            tracks = conn.execute(
+                "SELECT * FROM tracks WHERE release_id = ? ORDER BY disc_no, position",
+                (rel["id"],),
+            ).fetchall()
+            out.append({**dict(rel), "tracks": [dict(t) for t in tracks]})
+        return out
+    except Exception as e:
+        print(f"[local-index] release lookup failed: {e}")
+        return []
+
+
+# -------- import --------
+def _open_dump(path: str):
+    if path.endswith(".xz"):
+        return lzma.open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_dump(path: str) -> Iterator[Dict[str, Any]]:
+    """One JSON entity per line, as in the MusicBrainz JSON data dumps."""
+    with _open_dump(path) as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def import_releases(
+    releases: Iterable[Dict[str, Any]],
+    index_path: Path = LOCAL_INDEX_PATH,
+    artist_filter: Optional[Set[str]] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 2000,
+) -> Dict[str, int]:
+    """
+    Load release entities (with media/tracks/recordings inline) into the index.
+    `artist_filter` keeps only releases whose normalized credit is listed,
+    which is how a library-sized subset is cut from the full dump.
+    """
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(index_path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+    counts = {"releases": 0, "tracks": 0, "skipped": 0}
+    rel_rows, rec_rows, track_rows, gram_rows = [], [], [], []
+
+    def _flush():
+        conn.executemany("INSERT OR REPLACE INTO releases VALUES (?,?,?,?,?,?,?,?)", rel_rows)
+        conn.executemany("INSERT OR REPLACE INTO recordings VALUES (?,?,?,?,?,?)", rec_rows)
+        conn.executemany("INSERT OR REPLACE INTO tracks VALUES (?,?,?,?,?,?,?)", track_rows)
+        conn.executemany("INSERT OR IGNORE INTO grams VALUES (?,?,?)", gram_rows)
+        conn.commit()
+        for rows in (rel_rows, rec_rows, track_rows, gram_rows):
+            rows.clear()
+
+    for rel in releases:
+        if limit and counts["releases"] >= limit:
+            break
+        rel_id, title = rel.get("id"), str(rel.get("title") or "")
+        credit = _credit_text(rel.get("artist-credit"))
+        artist_key = normalize_text_key(credit)
+        if not rel_id or not title or (artist_filter is not None and artist_key not in artist_filter):
+            counts["skipped"] += 1
+            continue
+        title_key = normalize_text_key(title)
+        media = rel.get("media") or []
+        track_count = sum(len(m.get("tracks") or []) for m in media)
+        rel_rows.append((
+            rel_id, title, title_key, credit, artist_key,
+            (rel.get("release-group") or {}).get("id"), rel.get("date"), track_count,
+        ))
+        gram_rows.extend((g, "rel", rel_id) for g in _grams(title_key))
+        for disc_idx, medium in enumerate(media, start=1):
+            disc_no = int(medium.get("position") or disc_idx)
+            for pos_idx, tr in enumerate(medium.get("tracks") or [], start=1):
+                rec = tr.get("recording") or {}
+                rec_id = rec.get("id")
+                tr_title = str(tr.get("title") or rec.get("title") or "")
+                tr_credit = _credit_text(tr.get("artist-credit") or rec.get("artist-credit")) or credit
+                length = tr.get("length") or rec.get("length")
+                track_rows.append((rel_id, disc_no, int(tr.get("position") or pos_idx), tr_title, rec_id, tr_credit, length))
+                counts["tracks"] += 1
+                if rec_id:
+                    rec_title = str(rec.get("title") or tr_title)
+                    rec_key = normalize_text_key(rec_title)
+                    rec_rows.append((rec_id, rec_title, rec_key, tr_credit, normalize_text_key(tr_credit), length))
+                    gram_rows.extend((g, "rec", rec_id) for g in _grams(rec_key))
+        counts["releases"] += 1
+        if len(rel_rows) >= batch_size:
+            _flush()
+            print(f"[local-index] imported releases={counts['releases']} tracks={counts['tracks']}")
+    _flush()
+    conn.execute("ANALYZE")
+    conn.close()
+    return counts
@@ -4,8 +4,24 @@ from fastapi import FastAPI
 from streamer_api.routes.core import router as core_router
 from streamer_api.routes.agent import router as agent_router
 from streamer_api.routes.ui import router as ui_router
+from streamer_api.jobs import start_job_runners
+from streamer_api.enrich_queue import start_enrich_scheduler
+from streamer_api.scan_queue import start_scan_queue_worker
+from streamer_api.compression import DecompressRequestMiddleware
 
 app = FastAPI(title="RadioTiker Streamer API")
+# Agents upload gzip/zstd-compressed scan and enrichment bodies.
+app.add_middleware(DecompressRequestMiddleware)
 app.include_router(core_router)
 app.include_router(agent_router)
 app.include_router(ui_router)
+
+
+@app.on_event("startup")
+def _resume_background_jobs():
+    # Pick up jobs that were queued/running when the service last stopped.
+    start_job_runners()
+    # Opt-in (RT_ENRICH_SCHEDULER_ENABLED): drains the persistent enrichment queue.
+    start_enrich_scheduler()
+    # Applies batches accepted by POST /api/scan-batches, in order.
+    start_scan_queue_worker()
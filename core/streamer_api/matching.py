@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Iterable, List, NamedTuple
+import re
+import unicodedata
+
+# Fuzzy text similarity for metadata matching.
+#
+# Each distinct string is normalized once into a key, a token set and a
+# character-bigram set (LRU-cached), so comparing a track against dozens of
+# provider candidates is a handful of set intersections instead of one
+# SequenceMatcher alignment per field pair.
+
+GRAM_SIZE = 2
+_FEATURE_CACHE_SIZE = 65536
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+class TextFeatures(NamedTuple):
+    key: str
+    compact: str
+    tokens: frozenset
+    grams: frozenset
+
+
+@lru_cache(maxsize=_FEATURE_CACHE_SIZE)
+def text_key(value: str) -> str:
+    """Case/accent/punctuation-insensitive key (same rules as utils.normalize_text_key)."""
+    txt = unicodedata.normalize("NFKC", value).lower()
+    txt = "".join(ch for ch in unicodedata.normalize("NFKD", txt) if not unicodedata.combining(ch))
+    return _NON_ALNUM_RE.sub(" ", txt).strip()
+
+
+@lru_cache(maxsize=_FEATURE_CACHE_SIZE)
+def _features_for(value: str) -> TextFeatures:
+    key = text_key(value)
+    if not key:
+        return TextFeatures("", "", frozenset(), frozenset())
+    tokens = frozenset(key.split())
+    # Grams over the space-joined sorted tokens, so word order does not matter.
+    padded = f" {' '.join(sorted(tokens))} "
+    if len(padded) <= GRAM_SIZE:
+        grams = frozenset({padded})
+    else:
+        grams = frozenset(padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1))
+    return TextFeatures(key, key.replace(" ", ""), tokens, grams)
+
+
+def features(value: Any) -> TextFeatures:
+    return _features_for(str(value or ""))
+
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def similarity_features(x: TextFeatures, y: TextFeatures) -> float:
+    if not x.key and not y.key:
+        return 1.0
+    if not x.key or not y.key:
+        return 0.0
+    if x.compact == y.compact:
+        # Same letters, different spacing/punctuation: "AC/DC" vs "ACDC".
+        return 1.0
+    return max(_dice(x.tokens, y.tokens), _dice(x.grams, y.grams))
+
+
+def similarity(a: Any, b: Any) -> float:
+    """
+    0..1 similarity of two metadata strings: the better of token-set Dice and
+    character-bigram Dice. Both empty is 1.0, one empty is 0.0.
+    """
+    return similarity_features(features(a), features(b))
+
+
+def batch_similarity(query: Any, candidates: Iterable[Any]) -> List[float]:
+    """Score many candidate strings against one query, normalizing the query once."""
+    q = features(query)
+    return [similarity_features(q, features(c)) for c in candidates]
+
+
+def cache_info() -> dict:
+    info = _features_for.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
@@ -1,31 +1,85 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from contextvars import copy_context
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+import hashlib
 import os
 import re
+import threading
 import time
-from difflib import SequenceMatcher
 import requests
 
+from .matching import batch_similarity, similarity
+from .local_index import local_index_available, search_recordings as local_search_recordings, search_releases as local_search_releases
+from .provider_cache import MISS, cache_get, cache_set
+from .rate_limit import DEFERRED, RateLimited, acquire, raise_for_throttle, rate_limit_mode
+from .utils import normalize_text_key
+
 
 RT_USER_AGENT = "RadioTiker-vnext/metadata-enricher (admin@radio.tiker.es)"
-_URL_STATUS_CACHE: Dict[str, bool] = {}
-_DISCOGS_JSON_CACHE: Dict[str, Dict[str, Any]] = {}
-_MB_JSON_CACHE: Dict[str, Dict[str, Any]] = {}
-_ACOUSTID_LAST_REQUEST_TS: float = 0.0
+PROVIDER_ORDER = ["local", "musicbrainz", "discogs", "acoustid"]
+# When the offline index exists, query it whenever MusicBrainz is requested.
+LOCAL_INDEX_WITH_MUSICBRAINZ = str(os.getenv("RT_LOCAL_MB_INDEX_AUTO", "1")).strip().lower() not in {"0", "false", "off", "no"}
+# Whole search_candidates call returns by this deadline, with whatever providers finished.
+PROVIDER_SEARCH_DEADLINE_SEC = max(1.0, float(os.getenv("RT_PROVIDER_SEARCH_DEADLINE_SEC", "25") or "25"))
+# Per-provider budgets (RT_PROVIDER_TIMEOUT_SEC_<PROVIDER>), capped by the global deadline.
+PROVIDER_TIMEOUTS_SEC = {"local": 5.0, "musicbrainz": 20.0, "discogs": 20.0, "acoustid": 15.0}
+PROVIDER_IO_WORKERS = max(1, int(os.getenv("RT_PROVIDER_IO_WORKERS", "6") or "6"))
+# Long-lived pool so a provider that overruns its budget can be abandoned without blocking
+# the caller; its late results still land in the provider cache.
+_PROVIDER_POOL = ThreadPoolExecutor(
+    max_workers=max(3, int(os.getenv("RT_PROVIDER_POOL_WORKERS", "12") or "12")),
+    thread_name_prefix="rt-provider",
+)
+# Per-provider fan-out (_parallel_map, _first_alive) shares this one bounded pool;
+# work already running on it runs nested fan-outs inline instead of waiting on it.
+_IO_POOL = ThreadPoolExecutor(max_workers=PROVIDER_IO_WORKERS, thread_name_prefix="rt-provider-io")
+# Background artwork liveness checks (parallel HEADs feeding the url_status cache).
+_ARTWORK_POOL = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv("RT_ARTWORK_CHECK_WORKERS", "4") or "4")),
+    thread_name_prefix="rt-artwork",
+)
+# MusicBrainz query planning stops at the first result set whose best text score reaches this.
+MB_PLAN_ACCEPT_SCORE = max(0.0, min(1.0, float(os.getenv("RT_MB_PLAN_ACCEPT_SCORE", "0.78") or "0.78")))
+# Scored candidate lists shared across users, keyed by normalized tag identity
+# (the *_norm fields of enrich_track_metadata), plus album-mode release lookups.
+# Bump the version when scoring or patch shape changes so stale entries are ignored.
+CANDIDATE_CACHE_ENABLED = str(os.getenv("RT_CANDIDATE_CACHE_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+CANDIDATE_CACHE_VERSION = 4
+# The offline index is cheap to query and changes on re-import; never shared-cache it.
+_CANDIDATE_CACHE_SKIP = {"local"}
 
 
-def _norm(v: Any) -> str:
-    return re.sub(r"\s+", " ", str(v or "").strip().lower())
+def _sim(a: Any, b: Any) -> float:
+    return similarity(a, b)
 
 
-def _sim(a: Any, b: Any) -> float:
-    x, y = _norm(a), _norm(b)
-    if not x and not y:
-        return 1.0
-    if not x or not y:
-        return 0.0
-    return SequenceMatcher(None, x, y).ratio()
+def _provider_timeout(provider: str) -> float:
+    raw = os.getenv(f"RT_PROVIDER_TIMEOUT_SEC_{provider.upper()}")
+    if raw:
+        try:
+            return max(0.5, float(raw))
+        except ValueError:
+            pass
+    return PROVIDER_TIMEOUTS_SEC.get(provider, PROVIDER_SEARCH_DEADLINE_SEC)
+
+
+def _on_io_pool() -> bool:
+    return threading.current_thread().name.startswith("rt-provider-io")
+
+
+def _parallel_map(fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+    """
+    Run blocking provider I/O concurrently on _IO_POOL, preserving input order.
+    Called from a task already on the pool it runs inline, so nested fan-outs
+    can never starve each other of workers.
+    """
+    if len(items) <= 1 or _on_io_pool():
+        return [fn(i) for i in items]
+    # Each item runs in a copy of the caller's context so the rate-limit wait mode carries over.
+    futures = [_IO_POOL.submit(copy_context().run, fn, item) for item in items]
+    return [f.result() for f in futures]
 
 
 def _year_from_date(v: Any) -> Optional[int]:
@@ -97,60 +151,130 @@ def _clean_bio_text(value: Any, max_len: int = 2400) -> Optional[str]:
 
 
 def _url_alive(url: str) -> bool:
-    if url in _URL_STATUS_CACHE:
-        return _URL_STATUS_CACHE[url]
-    ok = False
+    cached = cache_get("url_status", url)
+    if cached is not MISS:
+        return bool(cached)
     try:
         r = requests.head(url, allow_redirects=True, timeout=(3, 6), headers={"User-Agent": RT_USER_AGENT})
-        ok = r.status_code < 400
     except Exception:
-        ok = False
-    _URL_STATUS_CACHE[url] = ok
+        cache_set("url_status", url, False, error=True)
+        return False
+    ok = r.status_code < 400
+    cache_set("url_status", url, ok, negative=not ok)
     return ok
 
 
 def _first_alive(urls: List[str]) -> Optional[str]:
+    """Highest-priority live URL; HEADs run in parallel, lower-priority ones are abandoned."""
+    urls = [u for u in urls if u]
+    if len(urls) <= 1 or _on_io_pool():
+        return next((u for u in urls if _url_alive(u)), None)
+    futures = [_IO_POOL.submit(_url_alive, u) for u in urls]
+    try:
+        for u, fut in zip(urls, futures):
+            try:
+                if fut.result():
+                    return u
+            except Exception:
+                continue
+        return None
+    finally:
+        for fut in futures:
+            fut.cancel()
+
+
+def _alive_from_cache(urls: List[str]) -> Tuple[Optional[str], bool]:
+    """
+    Liveness from the URL-health cache only (no requests): the highest-priority
+    URL known to be live, and whether every URL ahead of it has a known status
+    (i.e. a HEAD round could not pick anything better).
+    """
+    settled = True
     for u in urls:
-        if _url_alive(u):
-            return u
-    return None
+        if not u:
+            continue
+        status = cache_get("url_status", u)
+        if status is MISS:
+            settled = False
+            continue
+        if status:
+            return u, settled
+    return None, settled
 
 
-def _discogs_get_json(url: str, headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    key = f"{url}|{headers.get('Authorization','')}"
-    if key in _DISCOGS_JSON_CACHE:
-        return _DISCOGS_JSON_CACHE[key]
+def _cached_alive(urls: List[str]) -> Optional[str]:
+    return _alive_from_cache(urls)[0]
+
+
+def _validate_artwork_later(urls: List[str]):
+    """Start the liveness stage for `urls` in the background; results land in the URL-health cache."""
+    try:
+        _ARTWORK_POOL.submit(_first_alive, list(urls))
+    except RuntimeError:
+        pass
+
+
+def finalize_artwork(candidate: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Artwork liveness stage for a chosen candidate: resolve patch.artwork_url
+    with parallel HEADs (usually already answered by the background check
+    search_candidates started). Call before applying the patch.
+    """
+    if not candidate or not candidate.pop("artwork_pending", False):
+        return candidate
+    patch = candidate.get("patch") or {}
+    live = _first_alive(list(patch.get("artwork_urls") or []))
+    if live:
+        patch["artwork_url"] = live
+    return candidate
+
+
+def _cached_get_json(
+    namespace: str,
+    key: str,
+    url: str,
+    params: Optional[Dict[str, Any]],
+    headers: Dict[str, str],
+    timeout: Tuple[int, int],
+) -> Optional[Dict[str, Any]]:
+    """
+    GET a provider JSON document through the shared cache. 404s and non-dict
+    bodies are cached as negative results, transport/5xx failures as errors.
+    """
+    cached = cache_get(namespace, key)
+    if cached is not MISS:
+        return cached if isinstance(cached, dict) else None
+    acquire(namespace)
+    try:
+        r = requests.get(url, params=params, headers=headers, timeout=timeout)
+    except Exception:
+        cache_set(namespace, key, None, error=True)
+        return None
+    raise_for_throttle(namespace, r)
     try:
-        r = requests.get(url, headers=headers, timeout=(4, 12))
+        if r.status_code == 404:
+            cache_set(namespace, key, None, negative=True)
+            return None
         r.raise_for_status()
         j = r.json()
-        if isinstance(j, dict):
-            _DISCOGS_JSON_CACHE[key] = j
-            return j
-        return None
     except Exception:
+        cache_set(namespace, key, None, error=True)
         return None
+    if not isinstance(j, dict):
+        cache_set(namespace, key, None, negative=True)
+        return None
+    cache_set(namespace, key, j)
+    return j
+
+
+def _discogs_get_json(url: str, headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    # Keyed by URL only: Discogs documents do not depend on which token fetched them.
+    return _cached_get_json("discogs", url, url, None, headers, (4, 12))
 
 
 def _mb_get_json(url: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     key = f"{url}|{repr(sorted(params.items()))}"
-    if key in _MB_JSON_CACHE:
-        return _MB_JSON_CACHE[key]
-    try:
-        r = requests.get(
-            url,
-            params=params,
-            timeout=(5, 15),
-            headers={"User-Agent": RT_USER_AGENT},
-        )
-        r.raise_for_status()
-        j = r.json()
-        if isinstance(j, dict):
-            _MB_JSON_CACHE[key] = j
-            return j
-    except Exception:
-        return None
-    return None
+    return _cached_get_json("musicbrainz", key, url, params, {"User-Agent": RT_USER_AGENT}, (5, 15))
 
 
 def _mb_release_group_bio(release_group_id: Optional[str]) -> Optional[str]:
@@ -177,6 +301,7 @@ def _discogs_release_artist_meta(item: Dict[str, Any], headers: Dict[str, str])
     artist_bio: Optional[str] = None
     album_bio: Optional[str] = _clean_bio_text(rel.get("notes"))
 
+    # One artist at a time: most releases are done after the first, and each lookup costs a rate-limit token.
     for art in (rel.get("artists") or []):
         aurl = art.get("resource_url")
         if not aurl:
@@ -196,19 +321,30 @@ def _discogs_release_artist_meta(item: Dict[str, Any], headers: Dict[str, str])
     return _dedupe_urls(urls), artist_bio, album_bio
 
 
-def _mb_request(query: str, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+def _mb_request(query: str, limit: int, entity: str = "recording") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    key = f"{query}|{limit}" if entity == "recording" else f"{entity}|{query}|{limit}"
+    cached = cache_get("musicbrainz_search", key)
+    if cached is not MISS:
+        return (cached or []), (None if cached is not None else "request-failed")
+    acquire("musicbrainz")
     try:
         r = requests.get(
-            "https://musicbrainz.org/ws/2/recording",
+            f"https://musicbrainz.org/ws/2/{entity}",
             params={"query": query, "fmt": "json", "limit": limit},
             headers={"User-Agent": RT_USER_AGENT},
             timeout=(5, 20),
         )
+        raise_for_throttle("musicbrainz", r)
         r.raise_for_status()
         data = r.json()
-        return data.get("recordings", []), None
+    except RateLimited:
+        raise
     except Exception:
+        cache_set("musicbrainz_search", key, None, error=True)
         return [], "request-failed"
+    rows = data.get(f"{entity}s", []) or []
+    cache_set("musicbrainz_search", key, rows, negative=not rows)
+    return rows, None
 
 
 def _search_musicbrainz(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
@@ -218,33 +354,17 @@ def _search_musicbrainz(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dic
     if not title:
         return [], "missing-title"
 
-    query_candidates: List[str] = []
+    query_candidates: List[Tuple[str, str]] = []
     base = [f'recording:"{title}"']
     if artist:
         q = base + [f'artist:"{artist}"']
         if album:
-            query_candidates.append(" AND ".join(q + [f'release:"{album}"']))
-        query_candidates.append(" AND ".join(q))
-    query_candidates.append(" AND ".join(base))
-    query_candidates.append(title)
-
-    recordings: List[Dict[str, Any]] = []
-    last_err: Optional[str] = None
-    for q in query_candidates:
-        rows, err = _mb_request(q, limit=limit)
-        if err:
-            last_err = err
-            continue
-        if rows:
-            recordings = rows
-            last_err = None
-            break
-    if not recordings:
-        return [], last_err
+            query_candidates.append(("title+artist+album", " AND ".join(q + [f'release:"{album}"'])))
+        query_candidates.append(("title+artist", " AND ".join(q)))
+    query_candidates.append(("title", " AND ".join(base)))
+    query_candidates.append(("free-text", title))
 
-    out: List[Dict[str, Any]] = []
-    for rec in recordings:
-        rec_title = rec.get("title")
+    def _parse(rec: Dict[str, Any]) -> Dict[str, Any]:
         rec_artist = ""
         ac = rec.get("artist-credit") or []
         if ac:
@@ -255,12 +375,62 @@ def _search_musicbrainz(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dic
             else:
                 rec_artist = str(first)
         releases = rec.get("releases") or []
-        rec_album = releases[0].get("title") if releases else ""
-        rec_year = _year_from_date(releases[0].get("date")) if releases else None
-        rel_id = releases[0].get("id") if releases else None
         rg_id = None
         if releases and isinstance(releases[0].get("release-group"), dict):
             rg_id = releases[0].get("release-group", {}).get("id")
+        return {
+            "rec": rec,
+            "title": rec.get("title"),
+            "artist": rec_artist,
+            "album": releases[0].get("title") if releases else "",
+            "year": _year_from_date(releases[0].get("date")) if releases else None,
+            "release_id": releases[0].get("id") if releases else None,
+            "release_group_id": rg_id,
+            "release_date": releases[0].get("date") if releases else None,
+        }
+
+    # Plan: run queries strict -> loose, score each result set on text alone and
+    # stop as soon as one clears the acceptance threshold. Looser queries only
+    # run when the stricter ones came back empty or weak.
+    scored: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+    last_err: Optional[str] = None
+    plan_log: List[str] = []
+    for label, q in query_candidates:
+        rows, err = _mb_request(q, limit=limit)
+        if err:
+            last_err = err
+            plan_log.append(f"{label}:err={err}")
+            continue
+        if not rows:
+            plan_log.append(f"{label}:empty")
+            continue
+        last_err = None
+        parsed = [_parse(rec) for rec in rows]
+        titles = batch_similarity(title, [p["title"] for p in parsed])
+        artists = batch_similarity(artist, [p["artist"] for p in parsed])
+        albums = batch_similarity(album, [p["album"] for p in parsed])
+        top = 0.0
+        for p, ts, ars, als in zip(parsed, titles, artists, albums):
+            score = 0.55 * ts + 0.35 * ars + 0.10 * als
+            top = max(top, score)
+            rid = str(p["rec"].get("id") or id(p["rec"]))
+            if rid not in scored or scored[rid][0] < score:
+                scored[rid] = (score, p)
+        plan_log.append(f"{label}:n={len(rows)} top={top:.2f}")
+        if top >= MB_PLAN_ACCEPT_SCORE:
+            break
+    best_score = max((sc for sc, _ in scored.values()), default=0.0)
+    print(
+        f"[metadata] plan musicbrainz title={title!r} queries={len(plan_log)}/{len(query_candidates)} "
+        f"best={best_score:.2f} accept={MB_PLAN_ACCEPT_SCORE:.2f} steps={' '.join(plan_log)}"
+    )
+    if not scored:
+        return [], last_err
+
+    ranked = sorted(scored.values(), key=lambda x: x[0], reverse=True)
+    out: List[Dict[str, Any]] = []
+    for rank, (score, p) in enumerate(ranked):
+        rel_id, rg_id = p["release_id"], p["release_group_id"]
         artwork_candidates = _dedupe_urls([
             f"https://coverartarchive.org/release/{rel_id}/front-500" if rel_id else "",
             f"https://coverartarchive.org/release/{rel_id}/front-250" if rel_id else "",
@@ -269,33 +439,116 @@ def _search_musicbrainz(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dic
             f"https://coverartarchive.org/release-group/{rg_id}/front-250" if rg_id else "",
             f"https://coverartarchive.org/release-group/{rg_id}/front" if rg_id else "",
         ])
-        artwork_url = _first_alive(artwork_candidates)
-
-        score = (
-            0.55 * _sim(title, rec_title)
-            + 0.35 * _sim(artist, rec_artist)
-            + 0.10 * _sim(album, rec_album)
-        )
+        # The release-group bio is only worth fetching for the candidate that can
+        # win. Artwork uses cached liveness here; the merge step validates it.
+        winner = rank == 0
         patch = {
-            "title": rec_title or None,
-            "artist": rec_artist or None,
-            "album": rec_album or None,
-            "year": rec_year,
-            "artwork_url": artwork_url,
+            "title": p["title"] or None,
+            "artist": p["artist"] or None,
+            "album": p["album"] or None,
+            "year": p["year"],
+            "artwork_url": _cached_alive(artwork_candidates),
             "artwork_urls": artwork_candidates,
             "artist_image_urls": [],
             "artist_bio": None,
-            "album_bio": _mb_release_group_bio(rg_id),
+            "album_bio": _mb_release_group_bio(rg_id) if winner else None,
         }
         ref = {
-            "recording_id": rec.get("id"),
+            "recording_id": p["rec"].get("id"),
             "release_id": rel_id,
             "release_group_id": rg_id,
-            "release_date": releases[0].get("date") if releases else None,
+            "release_date": p["release_date"],
         }
         out.append(_candidate("musicbrainz", score, patch, ref))
+    return out[:limit], None
+
+
+def _caa_urls(release_id: Optional[str], release_group_id: Optional[str]) -> List[str]:
+    return _dedupe_urls([
+        f"https://coverartarchive.org/release/{release_id}/front-500" if release_id else "",
+        f"https://coverartarchive.org/release/{release_id}/front" if release_id else "",
+        f"https://coverartarchive.org/release-group/{release_group_id}/front-500" if release_group_id else "",
+        f"https://coverartarchive.org/release-group/{release_group_id}/front" if release_group_id else "",
+    ])
+
+
+def _search_local(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Offline MusicBrainz subset (see local_index). Same scoring as the remote
+    MusicBrainz provider; no network calls, so artwork liveness and bios are
+    left to the merge step / other providers.
+    """
+    if not local_index_available():
+        return [], "missing-index"
+    title = str(track.get("title") or "").strip()
+    artist = str(track.get("artist") or "").strip()
+    album = str(track.get("album") or "").strip()
+    if not title:
+        return [], "missing-title"
+
+    out: List[Dict[str, Any]] = []
+    for rec in local_search_recordings(title, artist, limit=25):
+        releases = rec.get("releases") or [{}]
+        rel = max(releases, key=lambda r: _sim(album, r.get("title"))) if album else releases[0]
+        score = (
+            0.55 * _sim(title, rec.get("title"))
+            + 0.35 * _sim(artist, rec.get("artist_credit"))
+            + 0.10 * _sim(album, rel.get("title"))
+        )
+        patch = {
+            "title": rec.get("title") or None,
+            "artist": rec.get("artist_credit") or None,
+            "album": rel.get("title") or None,
+            "year": _year_from_date(rel.get("date")),
+            "artwork_urls": _caa_urls(rel.get("id"), rel.get("release_group_id")),
+            "artist_image_urls": [],
+        }
+        ref = {
+            "recording_id": rec.get("id"),
+            "release_id": rel.get("id"),
+            "release_group_id": rel.get("release_group_id"),
+            "release_date": rel.get("date"),
+        }
+        out.append(_candidate("local", score, patch, ref))
     out.sort(key=lambda x: x["score"], reverse=True)
-    return out, None
+    return out[:limit], None
+
+
+def _expand_providers(providers: Optional[List[str]]) -> List[str]:
+    if providers is None:
+        chosen = [p for p in PROVIDER_ORDER if p != "local"]
+    else:
+        chosen = [p.lower() for p in providers]
+    if LOCAL_INDEX_WITH_MUSICBRAINZ and "musicbrainz" in chosen and "local" not in chosen and local_index_available():
+        chosen.append("local")
+    return chosen
+
+
+def _discogs_search(params: Dict[str, Any], headers: Dict[str, str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    params = {k: v for k, v in params.items() if v}
+    key = repr(sorted(params.items()))
+    cached = cache_get("discogs_search", key)
+    if cached is not MISS:
+        return (cached or []), (None if cached is not None else "request-failed")
+    acquire("discogs")
+    try:
+        r = requests.get(
+            "https://api.discogs.com/database/search",
+            params=params,
+            headers=headers,
+            timeout=(5, 20),
+        )
+        raise_for_throttle("discogs", r)
+        r.raise_for_status()
+        data = r.json()
+    except RateLimited:
+        raise
+    except Exception:
+        cache_set("discogs_search", key, None, error=True)
+        return [], "request-failed"
+    rows = data.get("results", []) or []
+    cache_set("discogs_search", key, rows, negative=not rows)
+    return rows, None
 
 
 def _search_discogs(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
@@ -326,28 +579,18 @@ def _search_discogs(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[st
     results = []
     last_err: Optional[str] = None
     for params in query_variants:
-        params = {k: v for k, v in params.items() if v}
-        try:
-            r = requests.get(
-                "https://api.discogs.com/database/search",
-                params=params,
-                headers=headers,
-                timeout=(5, 20),
-            )
-            r.raise_for_status()
-            data = r.json()
-            rows = data.get("results", [])
-            if rows:
-                results = rows
-                last_err = None
-                break
-        except Exception:
-            last_err = "request-failed"
+        rows, err = _discogs_search(params, headers)
+        if err:
+            last_err = err
+            continue
+        if rows:
+            results = rows
+            last_err = None
+            break
     if not results:
         return [], last_err
 
-    out: List[Dict[str, Any]] = []
-    for item in results:
+    def _build(item: Dict[str, Any]) -> Dict[str, Any]:
         title_field = str(item.get("title") or "")
         # Common format: "Artist - Title"
         if " - " in title_field:
@@ -377,7 +620,7 @@ def _search_discogs(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[st
             "album": disc_album or None,
             "year": disc_year,
             "genre": ", ".join(item.get("genre") or []) or None,
-            "artwork_url": _first_alive(cover_urls) or (cover_urls[0] if cover_urls else None),
+            "artwork_url": _cached_alive(cover_urls) or (cover_urls[0] if cover_urls else None),
             "artwork_urls": cover_urls,
             "artist_image_urls": artist_urls,
             "artist_bio": artist_bio,
@@ -387,7 +630,10 @@ def _search_discogs(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[st
             "discogs_id": item.get("id"),
             "resource_url": item.get("resource_url"),
         }
-        out.append(_candidate("discogs", score, patch, ref))
+        return _candidate("discogs", score, patch, ref)
+
+    # Release/artist lookups and cover HEADs per result run concurrently.
+    out = _parallel_map(_build, results)
     out.sort(key=lambda x: x["score"], reverse=True)
     return out, None
 
@@ -407,25 +653,29 @@ def _search_acoustid(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[s
     if dur <= 0:
         return [], "missing-duration"
 
-    global _ACOUSTID_LAST_REQUEST_TS
-    # Respect public rate limit guidance (max 3 req/s).
-    wait = 0.34 - (time.time() - _ACOUSTID_LAST_REQUEST_TS)
-    if wait > 0:
-        time.sleep(wait)
-
-    params = {
-        "client": key,
-        "meta": "recordings+releasegroups+compress",
-        "format": "json",
-        "duration": int(round(dur)),
-        "fingerprint": fp,
-    }
-    try:
-        r = requests.get("https://api.acoustid.org/v2/lookup", params=params, timeout=(5, 20))
-        _ACOUSTID_LAST_REQUEST_TS = time.time()
-        r.raise_for_status()
-        payload = r.json()
-    except Exception:
+    cache_key = f"{hashlib.sha1(fp.encode('utf-8', 'ignore')).hexdigest()}|{int(round(dur))}"
+    payload = cache_get("acoustid", cache_key)
+    if payload is MISS:
+        acquire("acoustid")
+        params = {
+            "client": key,
+            "meta": "recordings+releasegroups+compress",
+            "format": "json",
+            "duration": int(round(dur)),
+            "fingerprint": fp,
+        }
+        try:
+            r = requests.get("https://api.acoustid.org/v2/lookup", params=params, timeout=(5, 20))
+            raise_for_throttle("acoustid", r)
+            r.raise_for_status()
+            payload = r.json()
+        except RateLimited:
+            raise
+        except Exception:
+            cache_set("acoustid", cache_key, None, error=True)
+            return [], "request-failed"
+        cache_set("acoustid", cache_key, payload, negative=not (payload or {}).get("results"))
+    if not isinstance(payload, dict):
         return [], "request-failed"
 
     rows = payload.get("results") or []
@@ -436,78 +686,526 @@ def _search_acoustid(track: Dict[str, Any], limit: int = 5) -> Tuple[List[Dict[s
     artist = str(track.get("artist") or "").strip()
     album = str(track.get("album") or "").strip()
 
-    out: List[Dict[str, Any]] = []
+    pairs: List[Tuple[float, Dict[str, Any]]] = []
     for row in rows[: max(1, limit * 2)]:
         base_score = float(row.get("score") or 0.0)
-        recs = row.get("recordings") or []
-        if not recs:
+        for rec in (row.get("recordings") or [])[:2]:
+            pairs.append((base_score, rec))
+
+    def _build(pair: Tuple[float, Dict[str, Any]]) -> Dict[str, Any]:
+        base_score, rec = pair
+        rec_title = str(rec.get("title") or "").strip()
+        rec_id = rec.get("id")
+        rec_artist = ""
+        artists = rec.get("artists") or []
+        if artists:
+            rec_artist = str((artists[0] or {}).get("name") or "").strip()
+        releasegroups = rec.get("releasegroups") or []
+        rg_id = None
+        rg_title = ""
+        if releasegroups:
+            rg = releasegroups[0] or {}
+            rg_id = rg.get("id")
+            rg_title = str(rg.get("title") or "").strip()
+
+        artwork_candidates = _dedupe_urls([
+            f"https://coverartarchive.org/release-group/{rg_id}/front-500" if rg_id else "",
+            f"https://coverartarchive.org/release-group/{rg_id}/front-250" if rg_id else "",
+            f"https://coverartarchive.org/release-group/{rg_id}/front" if rg_id else "",
+        ])
+        artwork_url = _cached_alive(artwork_candidates)
+        score = (
+            0.50 * base_score
+            + 0.30 * _sim(title, rec_title)
+            + 0.15 * _sim(artist, rec_artist)
+            + 0.05 * _sim(album, rg_title)
+        )
+        patch = {
+            "title": rec_title or None,
+            "artist": rec_artist or None,
+            "album": rg_title or None,
+            "artwork_url": artwork_url,
+            "artwork_urls": artwork_candidates,
+            "artist_image_urls": [],
+            "artist_bio": None,
+            "album_bio": _mb_release_group_bio(rg_id),
+        }
+        ref = {
+            "acoustid_score": base_score,
+            "recording_id": rec_id,
+            "release_group_id": rg_id,
+        }
+        return _candidate("acoustid", score, patch, ref)
+
+    out = _parallel_map(_build, pairs)
+    out.sort(key=lambda x: x["score"], reverse=True)
+    return out[:limit], None
+
+
+# -------- album-level lookups --------
+ALBUM_TRACK_MATCH_MIN = max(0.0, min(1.0, float(os.getenv("RT_ALBUM_TRACK_MATCH_MIN", "0.72") or "0.72")))
+ALBUM_RELEASE_CANDIDATES = max(1, int(os.getenv("RT_ALBUM_RELEASE_CANDIDATES", "3") or "3"))
+
+
+# Edition noise that differs between local tags and tracklists: "(Remastered 2009)", "[Live]", " - Mono".
+_TITLE_NOISE_RE = re.compile(r"\s*(\([^)]*\)|\[[^\]]*\]|\s-\s.*(remaster|version|mix|edit|mono|stereo|live).*)$", re.I)
+
+
+def _strip_title_noise(v: Any) -> str:
+    return _TITLE_NOISE_RE.sub("", str(v or "")) or str(v or "")
+
+
+def _title_sims(title: Any, candidates: List[Any]) -> List[float]:
+    """Best of raw and edition-stripped similarity for one title against many."""
+    raw = batch_similarity(title, candidates)
+    stripped = batch_similarity(_strip_title_noise(title), [_strip_title_noise(c) for c in candidates])
+    return [max(x, y) for x, y in zip(raw, stripped)]
+
+
+def _int_or_none(v: Any) -> Optional[int]:
+    try:
+        m = re.match(r"\s*(\d+)", str(v))
+        return int(m.group(1)) if m else None
+    except Exception:
+        return None
+
+
+def _mb_album_releases(album_artist: str, album: str, track_count: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Resolve an album to MusicBrainz releases with full tracklists. Scores the
+    search hits on title/artist/track count and fetches only the best few.
+    """
+    queries = []
+    if album_artist:
+        queries.append(f'release:"{album}" AND artist:"{album_artist}"')
+    queries.append(f'release:"{album}"')
+    rows: List[Dict[str, Any]] = []
+    last_err: Optional[str] = None
+    for q in queries:
+        rows, err = _mb_request(q, limit=10, entity="release")
+        if err:
+            last_err = err
             continue
-        for rec in recs[:2]:
-            rec_title = str(rec.get("title") or "").strip()
-            rec_id = rec.get("id")
-            rec_artist = ""
-            artists = rec.get("artists") or []
-            if artists:
-                rec_artist = str((artists[0] or {}).get("name") or "").strip()
-            releasegroups = rec.get("releasegroups") or []
-            rg_id = None
-            rg_title = ""
-            if releasegroups:
-                rg = releasegroups[0] or {}
-                rg_id = rg.get("id")
-                rg_title = str(rg.get("title") or "").strip()
-
-            artwork_candidates = _dedupe_urls([
+        if rows:
+            last_err = None
+            break
+    if not rows:
+        return [], last_err
+
+    def _hit_score(rel: Dict[str, Any]) -> float:
+        credit = " ".join(str(a.get("name") or "") for a in (rel.get("artist-credit") or []))
+        count = int(rel.get("track-count") or 0)
+        count_fit = 1.0 - min(1.0, abs(count - track_count) / max(track_count, 1)) if count and track_count else 0.5
+        return (
+            0.25 * (float(rel.get("score") or 0.0) / 100.0)
+            + 0.35 * _sim(album, rel.get("title"))
+            + 0.25 * (_sim(album_artist, credit) if album_artist else 0.5)
+            + 0.15 * count_fit
+        )
+
+    hits = sorted(rows, key=_hit_score, reverse=True)[:ALBUM_RELEASE_CANDIDATES]
+
+    def _fetch(rel: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        j = _mb_get_json(
+            f"https://musicbrainz.org/ws/2/release/{rel.get('id')}",
+            {"fmt": "json", "inc": "recordings+artist-credits+release-groups"},
+        )
+        if not j:
+            return None
+        rg = j.get("release-group") or {}
+        album_credit = "".join(
+            f"{a.get('name') or ''}{a.get('joinphrase') or ''}" for a in (j.get("artist-credit") or [])
+        ).strip()
+        tracklist = []
+        for medium in (j.get("media") or []):
+            disc_no = _int_or_none(medium.get("position")) or 1
+            for tr in (medium.get("tracks") or []):
+                credit = "".join(
+                    f"{a.get('name') or ''}{a.get('joinphrase') or ''}" for a in (tr.get("artist-credit") or [])
+                ).strip()
+                length_ms = tr.get("length") or (tr.get("recording") or {}).get("length")
+                tracklist.append({
+                    "title": tr.get("title") or (tr.get("recording") or {}).get("title"),
+                    "artist": credit or album_credit,
+                    "disc_no": disc_no,
+                    "track_no": _int_or_none(tr.get("number")) or _int_or_none(tr.get("position")),
+                    "duration_sec": (float(length_ms) / 1000.0) if length_ms else None,
+                    "recording_id": (tr.get("recording") or {}).get("id"),
+                })
+        rg_id = rg.get("id")
+        return {
+            "provider": "musicbrainz",
+            "hit_score": _hit_score(rel),
+            "title": j.get("title"),
+            "album_artist": album_credit,
+            "year": _year_from_date(j.get("date") or rg.get("first-release-date")),
+            "tracklist": tracklist,
+            "artwork_urls": _dedupe_urls([
                 f"https://coverartarchive.org/release-group/{rg_id}/front-500" if rg_id else "",
-                f"https://coverartarchive.org/release-group/{rg_id}/front-250" if rg_id else "",
+                f"https://coverartarchive.org/release/{j.get('id')}/front-500",
                 f"https://coverartarchive.org/release-group/{rg_id}/front" if rg_id else "",
-            ])
-            artwork_url = _first_alive(artwork_candidates)
-            score = (
-                0.50 * base_score
-                + 0.30 * _sim(title, rec_title)
-                + 0.15 * _sim(artist, rec_artist)
-                + 0.05 * _sim(album, rg_title)
-            )
+            ]),
+            "release_group_id": rg_id,
+            "ref": {"release_id": j.get("id"), "release_group_id": rg_id, "release_date": j.get("date")},
+        }
+
+    return [r for r in _parallel_map(_fetch, hits) if r], None
+
+
+def _local_album_releases(album_artist: str, album: str, track_count: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    if not local_index_available():
+        return [], "missing-index"
+    out = []
+    for rel in local_search_releases(album, album_artist, limit=ALBUM_RELEASE_CANDIDATES):
+        count = int(rel.get("track_count") or 0)
+        count_fit = 1.0 - min(1.0, abs(count - track_count) / max(track_count, 1)) if count and track_count else 0.5
+        hit_score = (
+            0.60 * _sim(album, rel.get("title"))
+            + 0.25 * (_sim(album_artist, rel.get("artist_credit")) if album_artist else 0.5)
+            + 0.15 * count_fit
+        )
+        out.append({
+            "provider": "local",
+            "hit_score": hit_score,
+            "title": rel.get("title"),
+            "album_artist": rel.get("artist_credit"),
+            "year": _year_from_date(rel.get("date")),
+            "tracklist": [
+                {
+                    "title": tr.get("title"),
+                    "artist": tr.get("artist_credit") or rel.get("artist_credit"),
+                    "disc_no": tr.get("disc_no"),
+                    "track_no": tr.get("position"),
+                    "duration_sec": (float(tr["length_ms"]) / 1000.0) if tr.get("length_ms") else None,
+                    "recording_id": tr.get("recording_id"),
+                }
+                for tr in (rel.get("tracks") or [])
+            ],
+            "artwork_urls": _caa_urls(rel.get("id"), rel.get("release_group_id")),
+            "release_group_id": rel.get("release_group_id"),
+            "ref": {"release_id": rel.get("id"), "release_group_id": rel.get("release_group_id"), "release_date": rel.get("date")},
+        })
+    return out, None
+
+
+def _discogs_album_releases(album_artist: str, album: str, track_count: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    token = os.getenv("DISCOGS_TOKEN", "").strip()
+    if not token:
+        return [], "missing-token"
+    headers = {"User-Agent": RT_USER_AGENT, "Authorization": f"Discogs token={token}"}
+    rows, err = _discogs_search(
+        {"type": "release", "artist": album_artist, "release_title": album, "per_page": 10, "page": 1},
+        headers,
+    )
+    if err or not rows:
+        return [], err
+
+    def _hit_score(item: Dict[str, Any]) -> float:
+        title_field = str(item.get("title") or "")
+        disc_artist, disc_album = title_field.split(" - ", 1) if " - " in title_field else ("", title_field)
+        return 0.6 * _sim(album, disc_album) + 0.4 * (_sim(album_artist, disc_artist) if album_artist else 0.5)
+
+    hits = sorted(rows, key=_hit_score, reverse=True)[:ALBUM_RELEASE_CANDIDATES]
+
+    def _fetch(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not item.get("resource_url"):
+            return None
+        rel = _discogs_get_json(str(item["resource_url"]), headers=headers)
+        if not rel:
+            return None
+        rel_artist = ", ".join(re.sub(r"\s+\(\d+\)$", "", str(a.get("name") or "")) for a in (rel.get("artists") or []))
+        tracklist = []
+        for idx, tr in enumerate(t for t in (rel.get("tracklist") or []) if (t.get("type_") or "track") == "track"):
+            parts = re.findall(r"\d+", str(tr.get("position") or ""))
+            disc_no, track_no = (int(parts[0]), int(parts[1])) if len(parts) >= 2 else (1, int(parts[0]) if parts else idx + 1)
+            dur = None
+            m = re.match(r"^(\d+):(\d{2})$", str(tr.get("duration") or ""))
+            if m:
+                dur = float(int(m.group(1)) * 60 + int(m.group(2)))
+            track_artist = ", ".join(re.sub(r"\s+\(\d+\)$", "", str(a.get("name") or "")) for a in (tr.get("artists") or []))
+            tracklist.append({
+                "title": tr.get("title"),
+                "artist": track_artist or rel_artist,
+                "disc_no": disc_no,
+                "track_no": track_no,
+                "duration_sec": dur,
+            })
+        artist_urls, artist_bio, album_bio = _discogs_release_artist_meta(item, headers=headers)
+        return {
+            "provider": "discogs",
+            "hit_score": _hit_score(item),
+            "title": rel.get("title"),
+            "album_artist": rel_artist,
+            "year": _int_or_none(rel.get("year")) or None,
+            "genre": ", ".join(rel.get("genres") or []) or None,
+            "tracklist": tracklist,
+            "artwork_urls": _dedupe_urls([str(img.get("uri") or "") for img in (rel.get("images") or [])] + [
+                str(item.get("cover_image") or ""),
+            ]),
+            "artist_image_urls": artist_urls,
+            "artist_bio": artist_bio,
+            "album_bio": album_bio,
+            "ref": {"discogs_id": rel.get("id"), "resource_url": item.get("resource_url")},
+        }
+
+    return [r for r in _parallel_map(_fetch, hits) if r], None
+
+
+def _match_tracklist(tracks: List[Dict[str, Any]], tracklist: List[Dict[str, Any]]) -> Dict[str, Tuple[float, Dict[str, Any]]]:
+    """Greedy one-to-one assignment of local tracks to release tracklist entries."""
+    pairs = []
+    entry_titles = [entry.get("title") for entry in tracklist]
+    for t in tracks:
+        title_sims = _title_sims(t.get("title"), entry_titles)
+        t_disc = _int_or_none(t.get("disc_no")) or 1
+        t_no = _int_or_none(t.get("track_no"))
+        try:
+            t_dur = float(t.get("duration_sec") or 0.0)
+        except Exception:
+            t_dur = 0.0
+        for i, entry in enumerate(tracklist):
+            title_sim = title_sims[i]
+            position = 1.0 if t_no and t_no == entry.get("track_no") and t_disc == entry.get("disc_no") else 0.0
+            dur_fit = 0.5
+            if t_dur > 0 and entry.get("duration_sec"):
+                dur_fit = max(0.0, 1.0 - abs(t_dur - float(entry["duration_sec"])) / 10.0)
+            score = 0.60 * title_sim + 0.25 * position + 0.15 * dur_fit
+            pairs.append((score, str(t.get("track_id")), i))
+    pairs.sort(reverse=True)
+    out: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+    used = set()
+    for score, tid, i in pairs:
+        if tid in out or i in used or score < ALBUM_TRACK_MATCH_MIN:
+            continue
+        out[tid] = (score, tracklist[i])
+        used.add(i)
+    return out
+
+
+def search_album(
+    album_artist: str,
+    album: str,
+    tracks: List[Dict[str, Any]],
+    providers: Optional[List[str]] = None,
+    wait: bool = True,
+    track_count: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Resolve one album for a group of tracks that share album_artist/album.
+
+    The release (search, tracklist, artwork, bios) is looked up once per
+    provider; each local track then gets a candidate built from its matched
+    tracklist entry, in the same shape as search_candidates results. Tracks
+    that match no entry are returned in `unmatched` for per-track lookup.
+    """
+    chosen = [p for p in _expand_providers(providers) if p in {"local", "musicbrainz", "discogs"}]
+    count = int(track_count or len(tracks))
+    searches = {"local": _local_album_releases, "musicbrainz": _mb_album_releases, "discogs": _discogs_album_releases}
+    errors: List[Dict[str, str]] = []
+    releases: List[Dict[str, Any]] = []
+
+    def _run(name: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # Releases depend only on the album tags and track count, so they share
+        # the candidate cache; matching them to this group's tracks stays per call.
+        key = _album_cache_key(name, album_artist, album, count)
+        if key:
+            cached = cache_get("candidates", key)
+            if cached is not MISS:
+                return list(cached or []), None
+        with rate_limit_mode(wait):
+            try:
+                rels, err = searches[name](album_artist, album, count)
+            except RateLimited as e:
+                print(f"[metadata] album provider={name} deferred: {e}")
+                return [], DEFERRED
+        if key and not err:
+            cache_set("candidates", key, rels, negative=not rels)
+        return rels, err
+
+    started = time.time()
+    futures = {name: _PROVIDER_POOL.submit(_run, name) for name in chosen}
+    for name, fut in futures.items():
+        budget = min(_provider_timeout(name), PROVIDER_SEARCH_DEADLINE_SEC)
+        try:
+            rels, err = fut.result(timeout=max(0.0, budget - (time.time() - started)))
+        except FuturesTimeout:
+            rels, err = [], "timeout"
+        except Exception as e:
+            print(f"[metadata] album provider={name} failed: {e}")
+            rels, err = [], "request-failed"
+        releases.extend(rels)
+        if err:
+            errors.append({"provider": name, "error": err})
+
+    best_release = None
+    best_matches: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+    best_rank = -1.0
+    for rel in releases:
+        matches = _match_tracklist(tracks, rel.get("tracklist") or [])
+        coverage = len(matches) / max(len(tracks), 1)
+        rank = 0.5 * rel["hit_score"] + 0.5 * coverage
+        if rank > best_rank:
+            best_rank, best_release, best_matches = rank, rel, matches
+
+    out: Dict[str, Dict[str, Any]] = {}
+    if best_release and best_matches:
+        artwork_urls = best_release.get("artwork_urls") or []
+        artwork_url, artwork_settled = _alive_from_cache(artwork_urls)
+        artwork_url = artwork_url or (artwork_urls[0] if artwork_urls else None)
+        if not artwork_settled:
+            _validate_artwork_later(artwork_urls)
+        album_bio = best_release.get("album_bio")
+        if best_release["provider"] == "musicbrainz":
+            album_bio = _mb_release_group_bio(best_release.get("release_group_id"))
+        # Borrow artist imagery/bios from the other provider when it resolved the same album.
+        alt_artist_urls: List[str] = []
+        alt_artist_bio = None
+        for rel in releases:
+            if rel is not best_release and _sim(rel.get("title"), best_release.get("title")) >= 0.8:
+                alt_artist_urls = alt_artist_urls or list(rel.get("artist_image_urls") or [])
+                alt_artist_bio = alt_artist_bio or rel.get("artist_bio")
+        for t in tracks:
+            tid = str(t.get("track_id"))
+            if tid not in best_matches:
+                continue
+            match_score, entry = best_matches[tid]
             patch = {
-                "title": rec_title or None,
-                "artist": rec_artist or None,
-                "album": rg_title or None,
+                "title": entry.get("title") or None,
+                "artist": entry.get("artist") or best_release.get("album_artist") or None,
+                "album": best_release.get("title") or None,
+                "album_artist": best_release.get("album_artist") or None,
+                "year": best_release.get("year"),
+                "track_no": entry.get("track_no"),
+                "disc_no": entry.get("disc_no"),
                 "artwork_url": artwork_url,
-                "artwork_urls": artwork_candidates,
-                "artist_image_urls": [],
-                "artist_bio": None,
-                "album_bio": _mb_release_group_bio(rg_id),
-            }
-            ref = {
-                "acoustid_score": base_score,
-                "recording_id": rec_id,
-                "release_group_id": rg_id,
+                "artwork_urls": artwork_urls,
+                "artist_image_urls": list(best_release.get("artist_image_urls") or alt_artist_urls),
+                "artist_bio": best_release.get("artist_bio") or alt_artist_bio,
+                "album_bio": album_bio,
             }
-            out.append(_candidate("acoustid", score, patch, ref))
-    out.sort(key=lambda x: x["score"], reverse=True)
-    return out[:limit], None
+            if best_release.get("genre"):
+                patch["genre"] = best_release["genre"]
+            ref = dict(best_release.get("ref") or {})
+            ref.update({"album_mode": True, "recording_id": entry.get("recording_id"), "track_match_score": round(match_score, 4)})
+            score = 0.5 * best_release["hit_score"] + 0.5 * match_score
+            out[tid] = _candidate(best_release["provider"], score, patch, ref)
+            if not artwork_settled:
+                out[tid]["artwork_pending"] = True
+
+    return {
+        "release": {k: v for k, v in best_release.items() if k != "tracklist"} if best_release else None,
+        "candidates": out,
+        "unmatched": [str(t.get("track_id")) for t in tracks if str(t.get("track_id")) not in out],
+        "errors": errors,
+    }
+
+
+_PROVIDER_SEARCHES: Dict[str, Callable[[Dict[str, Any]], Tuple[List[Dict[str, Any]], Optional[str]]]] = {
+    "local": _search_local,
+    "musicbrainz": _search_musicbrainz,
+    "discogs": _search_discogs,
+    "acoustid": _search_acoustid,
+}
+
+
+def track_identity(track: Dict[str, Any]) -> Optional[str]:
+    """title_norm|artist_norm|album_norm for `track`, or None without a title."""
+    title = normalize_text_key(track.get("title"))
+    if not title:
+        return None
+    return f"{title}|{normalize_text_key(track.get('artist'))}|{normalize_text_key(track.get('album'))}"
+
+
+def _candidate_cache_key(name: str, track: Dict[str, Any]) -> Optional[str]:
+    if not CANDIDATE_CACHE_ENABLED or name in _CANDIDATE_CACHE_SKIP:
+        return None
+    if name == "acoustid":
+        # The lookup keys on the audio, but scores include tag similarity, so the
+        # tags are part of the key too (the raw response is cached per fingerprint).
+        fp = str(track.get("acoustid_fingerprint") or "").strip()
+        if not fp:
+            return None
+        try:
+            dur = int(round(float(track.get("acoustid_duration") or track.get("duration_sec") or 0.0)))
+        except Exception:
+            dur = 0
+        tags = "|".join(normalize_text_key(track.get(k)) for k in ("title", "artist", "album"))
+        ident = f"fp:{hashlib.sha1(fp.encode('utf-8', 'ignore')).hexdigest()}|{dur}|{tags}"
+    else:
+        ident = track_identity(track)
+        if not ident:
+            return None
+    return f"v{CANDIDATE_CACHE_VERSION}|{name}|{ident}"
+
+
+def _album_cache_key(name: str, album_artist: str, album: str, track_count: int) -> Optional[str]:
+    if not CANDIDATE_CACHE_ENABLED or name in _CANDIDATE_CACHE_SKIP:
+        return None
+    album_norm = normalize_text_key(album)
+    if not album_norm:
+        return None
+    return f"v{CANDIDATE_CACHE_VERSION}|album:{name}|{normalize_text_key(album_artist)}|{album_norm}|{int(track_count)}"
+
+
+def _run_provider(name: str, track: Dict[str, Any], wait: bool) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    # Candidates depend only on the tags (and fingerprint), never on who owns the
+    # track, so any user's earlier lookup answers this one without a network call.
+    # User edits are not stored here; they are applied afterwards by the caller's
+    # overwrite policy.
+    key = _candidate_cache_key(name, track)
+    if key:
+        cached = cache_get("candidates", key)
+        if cached is not MISS:
+            return list(cached or []), None
+    with rate_limit_mode(wait):
+        try:
+            cands, err = _PROVIDER_SEARCHES[name](track)
+        except RateLimited as e:
+            # Out of request budget (or server asked us to back off): report, don't fail.
+            print(f"[metadata] provider={name} deferred: {e}")
+            return [], DEFERRED
+    if key and not err:
+        cache_set("candidates", key, cands, negative=not cands)
+    return cands, err
 
 
-def search_candidates(track: Dict[str, Any], providers: Optional[List[str]] = None, include_errors: bool = False) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
-    chosen = [p.lower() for p in (providers or ["musicbrainz", "discogs", "acoustid"])]
+def search_candidates(
+    track: Dict[str, Any],
+    providers: Optional[List[str]] = None,
+    include_errors: bool = False,
+    wait: bool = True,
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Query providers for `track`. With `wait=False` a provider that cannot get a
+    token for its first request reports error "deferred" instead of sleeping;
+    once started, a provider's lookup waits briefly for the rest of its requests.
+    """
+    chosen = _expand_providers(providers)
     out: List[Dict[str, Any]] = []
     errors: List[Dict[str, str]] = []
-    if "musicbrainz" in chosen:
-        cands, err = _search_musicbrainz(track)
-        out.extend(cands)
-        if err:
-            errors.append({"provider": "musicbrainz", "error": err})
-    if "discogs" in chosen:
-        cands, err = _search_discogs(track)
-        out.extend(cands)
-        if err:
-            errors.append({"provider": "discogs", "error": err})
-    if "acoustid" in chosen:
-        cands, err = _search_acoustid(track)
+
+    # Fan out to every provider at once; total latency is the slowest provider
+    # (bounded by its timeout) instead of the sum of all three.
+    started = time.time()
+    futures = {
+        name: _PROVIDER_POOL.submit(_run_provider, name, track, wait)
+        for name in PROVIDER_ORDER
+        if name in chosen
+    }
+    for name, fut in futures.items():
+        budget = min(_provider_timeout(name), PROVIDER_SEARCH_DEADLINE_SEC)
+        remaining = max(0.0, budget - (time.time() - started))
+        try:
+            cands, err = fut.result(timeout=remaining)
+        except FuturesTimeout:
+            print(f"[metadata] provider={name} timed out after {budget:.1f}s")
+            cands, err = [], "timeout"
+        except Exception as e:
+            print(f"[metadata] provider={name} failed: {e}")
+            cands, err = [], "request-failed"
         out.extend(cands)
         if err:
-            errors.append({"provider": "acoustid", "error": err})
+            errors.append({"provider": name, "error": err})
     out.sort(key=lambda x: x["score"], reverse=True)
 
     # Keep strongest metadata match, but enrich image fields from alternate providers.
@@ -524,8 +1222,14 @@ def search_candidates(track: Dict[str, Any], providers: Optional[List[str]] = No
             best_artist_urls = _dedupe_urls(best_artist_urls + list(alt_patch.get("artist_image_urls") or []))
 
         if best_artwork_urls:
+            # Scoring never waits on HEAD requests: take what the URL-health cache
+            # knows and validate the rest in the background (see finalize_artwork).
             best_patch["artwork_urls"] = best_artwork_urls
-            best_patch["artwork_url"] = _first_alive(best_artwork_urls) or best_artwork_urls[0]
+            known, settled = _alive_from_cache(best_artwork_urls)
+            best_patch["artwork_url"] = known or best_artwork_urls[0]
+            if not settled:
+                best["artwork_pending"] = True
+                _validate_artwork_later(best_artwork_urls)
         if best_artist_urls:
             best_patch["artist_image_urls"] = best_artist_urls
         if not best_patch.get("artist_bio"):
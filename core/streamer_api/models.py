@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 
 class Track(BaseModel):
@@ -52,6 +52,33 @@ class ScanPayload(BaseModel):
     library_version: Optional[int] = None
     replace: Optional[bool] = False
 
+class ScanDeltaPayload(BaseModel):
+    user_id: str
+    dirs: Dict[str, str] = {}                  # dir rel_path ("" = root) -> agent digest
+    files: Dict[str, List[List[Any]]] = {}     # expanded dir -> [[name, size, mtime], ...]
+    dry_run: Optional[bool] = False            # report stale tracks without removing them
+
+class ScanCompletePayload(BaseModel):
+    user_id: str
+    library_version: int                       # the replace scan's library_version
+    dry_run: Optional[bool] = False            # report unseen tracks without removing them
+
+class ScanRemovePayload(BaseModel):
+    user_id: str
+    paths: List[str] = []                      # file rel_paths that changed or disappeared
+    dirs: List[str] = []                       # dir rel_paths that disappeared (everything below goes)
+    keep: List[str] = []                       # track_ids just uploaded for those paths
+    dry_run: Optional[bool] = False            # report matching tracks without removing them
+
+class TrackFingerprint(BaseModel):
+    track_id: str
+    acoustid_fingerprint: str
+    acoustid_duration: Optional[float] = None
+
+class ScanFingerprintsPayload(BaseModel):
+    user_id: str
+    items: List[TrackFingerprint] = []         # computed by the agent after the scan
+
 class AnnouncePayload(BaseModel):
     user_id: str
     base_url: str
@@ -78,6 +105,7 @@ class MetadataEnrichPayload(BaseModel):
     apply: Optional[bool] = False
     providers: Optional[List[str]] = None  # e.g. ["musicbrainz", "discogs"]
     min_score: Optional[float] = 0.78
+    wait_for_rate_limit: Optional[bool] = True  # false: report "deferred" instead of waiting
 
 
 class MetadataEnrichLibraryPayload(BaseModel):
@@ -85,6 +113,18 @@ class MetadataEnrichLibraryPayload(BaseModel):
     apply: Optional[bool] = False
     providers: Optional[List[str]] = None
     min_score: Optional[float] = 0.78
+    wait_for_rate_limit: Optional[bool] = True
+    mode: Optional[str] = None  # "album" | "track" (default: RT_METADATA_ENRICH_MODE)
+
+
+class MetadataEnrichJobPayload(BaseModel):
+    limit: Optional[int] = 500            # lowest-quality tracks first
+    apply: Optional[bool] = False
+    providers: Optional[List[str]] = None
+    min_score: Optional[float] = 0.78
+    mode: Optional[str] = None            # "album" | "track" (default: RT_METADATA_ENRICH_MODE)
+    track_ids: Optional[List[str]] = None
+    max_quality: Optional[int] = None     # only tracks with metadata_quality below this
 
 
 class MetadataResetPayload(BaseModel):
@@ -109,3 +149,9 @@ class TrackHealthScanPayload(BaseModel):
     limit: Optional[int] = 25
     track_ids: Optional[List[str]] = None
     include_ok: Optional[bool] = False
+    skip_unchanged: Optional[bool] = True
+
+
+class TrackHealthJobPayload(BaseModel):
+    track_ids: Optional[List[str]] = None  # default: whole library
+    force: Optional[bool] = False          # re-check even if file unchanged since last ok
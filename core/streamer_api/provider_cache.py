@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .storage import ROOT, _json_default
+
+# SQLite file shared by every uvicorn worker on the host (WAL mode allows concurrent readers).
+CACHE_PATH = Path(os.getenv("RT_PROVIDER_CACHE_PATH") or (ROOT / "data" / "cache" / "provider-cache.sqlite3"))
+CACHE_ENABLED = str(os.getenv("RT_PROVIDER_CACHE_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+CACHE_MAX_ENTRIES = max(1000, int(os.getenv("RT_PROVIDER_CACHE_MAX_ENTRIES", "200000") or "200000"))
+NEGATIVE_TTL_SEC = max(60, int(os.getenv("RT_PROVIDER_CACHE_NEGATIVE_TTL_SEC", str(86400)) or "86400"))
+ERROR_TTL_SEC = max(0, int(os.getenv("RT_PROVIDER_CACHE_ERROR_TTL_SEC", "600") or "600"))
+
+# Positive-result TTLs per namespace; override with RT_PROVIDER_CACHE_TTL_<NAMESPACE>=seconds.
+DEFAULT_TTLS_SEC: Dict[str, int] = {
+    "url_status": 7 * 86400,
+    "musicbrainz": 30 * 86400,
+    "musicbrainz_search": 14 * 86400,
+    "discogs": 30 * 86400,
+    "discogs_search": 14 * 86400,
+    "acoustid": 30 * 86400,
+    "candidates": 14 * 86400,
+    "artwork": 30 * 86400,
+}
+FALLBACK_TTL_SEC = 7 * 86400
+
+# Returned by cache_get when nothing usable is cached (None is a valid cached value).
+MISS = object()
+
+_EVICT_EVERY_WRITES = 500
+_TOUCH_AFTER_SEC = 3600
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_STATS: Dict[str, Dict[str, int]] = {}
+_writes_since_evict = 0
+_disabled_reason: Optional[str] = None
+
+
+def _ttl_for(namespace: str) -> int:
+    raw = os.getenv(f"RT_PROVIDER_CACHE_TTL_{namespace.upper()}")
+    if raw:
+        try:
+            return max(0, int(raw))
+        except ValueError:
+            pass
+    return DEFAULT_TTLS_SEC.get(namespace, FALLBACK_TTL_SEC)
+
+
+def _bump(namespace: str, field: str, n: int = 1):
+    with _stats_lock:
+        ns = _STATS.setdefault(namespace, {})
+        ns[field] = ns.get(field, 0) + n
+
+
+def _conn() -> Optional[sqlite3.Connection]:
+    global _disabled_reason
+    if not CACHE_ENABLED or _disabled_reason:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(CACHE_PATH), timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS provider_cache (
+              cache_key TEXT PRIMARY KEY,
+              namespace TEXT NOT NULL,
+              kind TEXT NOT NULL,
+              payload TEXT,
+              expires_at REAL NOT NULL,
+              created_at REAL NOT NULL,
+              accessed_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_provider_cache_accessed ON provider_cache (accessed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_provider_cache_ns ON provider_cache (namespace, kind)")
+    except Exception as e:
+        _disabled_reason = str(e)
+        print(f"[provider-cache] disabled: {e}")
+        return None
+    _local.conn = conn
+    return conn
+
+
+def _cache_key(namespace: str, key: str) -> str:
+    return hashlib.sha1(f"{namespace}|{key}".encode("utf-8", "ignore")).hexdigest()
+
+
+def cache_get(namespace: str, key: str) -> Any:
+    """Return the cached payload (possibly None for negative entries) or MISS."""
+    conn = _conn()
+    if conn is None:
+        return MISS
+    now = time.time()
+    ck = _cache_key(namespace, key)
+    try:
+        row = conn.execute(
+            "SELECT kind, payload, expires_at, accessed_at FROM provider_cache WHERE cache_key = ?",
+            (ck,),
+        ).fetchone()
+        if not row or row[2] <= now:
+            _bump(namespace, "misses")
+            return MISS
+        kind, payload, _, accessed_at = row
+        if now - accessed_at > _TOUCH_AFTER_SEC:
+            # Coarse LRU bookkeeping without turning every hit into a write.
+            conn.execute("UPDATE provider_cache SET accessed_at = ? WHERE cache_key = ?", (now, ck))
+        _bump(namespace, "hits" if kind == "value" else f"{kind}_hits")
+        return json.loads(payload) if payload is not None else None
+    except Exception as e:
+        print(f"[provider-cache] get failed ns={namespace}: {e}")
+        return MISS
+
+
+def cache_set(namespace: str, key: str, value: Any, negative: bool = False, error: bool = False):
+    """
+    Store a provider response. `negative` marks empty/404 results, `error` marks
+    transient failures; both get shorter TTLs than real payloads.
+    """
+    global _writes_since_evict
+    conn = _conn()
+    if conn is None:
+        return
+    kind = "error" if error else ("negative" if negative else "value")
+    ttl = ERROR_TTL_SEC if error else (min(NEGATIVE_TTL_SEC, _ttl_for(namespace)) if negative else _ttl_for(namespace))
+    if ttl <= 0:
+        return
+    now = time.time()
+    try:
+        payload = json.dumps(value, ensure_ascii=False, default=_json_default) if value is not None else None
+        conn.execute(
+            """
+            INSERT INTO provider_cache (cache_key, namespace, kind, payload, expires_at, created_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+              kind=excluded.kind,
+              payload=excluded.payload,
+              expires_at=excluded.expires_at,
+              created_at=excluded.created_at,
+              accessed_at=excluded.accessed_at
+            """,
+            (_cache_key(namespace, key), namespace, kind, payload, now + ttl, now, now),
+        )
+        _bump(namespace, f"{kind}_writes")
+        _writes_since_evict += 1
+        if _writes_since_evict >= _EVICT_EVERY_WRITES:
+            _writes_since_evict = 0
+            _evict(conn)
+    except Exception as e:
+        print(f"[provider-cache] set failed ns={namespace}: {e}")
+
+
+def _evict(conn: sqlite3.Connection):
+    now = time.time()
+    conn.execute("DELETE FROM provider_cache WHERE expires_at <= ?", (now,))
+    total = conn.execute("SELECT COUNT(*) FROM provider_cache").fetchone()[0]
+    if total <= CACHE_MAX_ENTRIES:
+        return
+    # Trim to 90% of the cap so eviction does not run on every subsequent write.
+    excess = total - int(CACHE_MAX_ENTRIES * 0.9)
+    conn.execute(
+        """
+        DELETE FROM provider_cache WHERE cache_key IN (
+          SELECT cache_key FROM provider_cache ORDER BY accessed_at ASC LIMIT ?
+        )
+        """,
+        (excess,),
+    )
+    _bump("_all", "evicted", excess)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Per-namespace hit rates (this process) plus on-disk entry counts (all processes)."""
+    with _stats_lock:
+        counters = {ns: dict(v) for ns, v in _STATS.items()}
+    for ns, v in counters.items():
+        hits = sum(n for k, n in v.items() if k.endswith("hits"))
+        lookups = hits + v.get("misses", 0)
+        v["hit_rate"] = round(hits / lookups, 4) if lookups else None
+    entries: Dict[str, Dict[str, int]] = {}
+    conn = _conn()
+    if conn is not None:
+        try:
+            for ns, kind, n in conn.execute(
+                "SELECT namespace, kind, COUNT(*) FROM provider_cache WHERE expires_at > ? GROUP BY namespace, kind",
+                (time.time(),),
+            ):
+                entries.setdefault(ns, {})[kind] = n
+        except Exception as e:
+            print(f"[provider-cache] stats failed: {e}")
+    return {
+        "enabled": conn is not None,
+        "disabled_reason": _disabled_reason,
+        "path": str(CACHE_PATH),
+        "max_entries": CACHE_MAX_ENTRIES,
+        "entries": entries,
+        "process_counters": counters,
+    }
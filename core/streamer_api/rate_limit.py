@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+
+from .storage import ROOT
+
+# Token buckets live in SQLite so every thread and uvicorn worker on the host
+# draws from the same budget per provider.
+RATE_LIMIT_PATH = Path(os.getenv("RT_RATE_LIMIT_PATH") or (ROOT / "data" / "cache" / "rate-limits.sqlite3"))
+RATE_LIMIT_ENABLED = str(os.getenv("RT_RATE_LIMIT_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+# Longest a waiting caller sleeps for a token before giving up with "deferred".
+MAX_WAIT_SEC = max(0.0, float(os.getenv("RT_RATE_LIMIT_MAX_WAIT_SEC", "30") or "30"))
+# In a no-wait scope, the longest a started lookup's follow-up request sleeps for a token.
+FOLLOWUP_MAX_WAIT_SEC = max(0.0, float(os.getenv("RT_RATE_LIMIT_FOLLOWUP_MAX_WAIT_SEC", "2") or "2"))
+# Back-off applied on 429/503 responses that carry no usable Retry-After.
+DEFAULT_BACKOFF_SEC = max(1.0, float(os.getenv("RT_RATE_LIMIT_DEFAULT_BACKOFF_SEC", "5") or "5"))
+MAX_BACKOFF_SEC = 3600.0
+
+# (requests per second, burst). Override with RT_RATE_LIMIT_<PROVIDER>_PER_SEC / _BURST.
+#   musicbrainz: 1 req/s per client IP
+#   discogs:     60 req/min authenticated
+#   acoustid:    3 req/s
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "musicbrainz": (1.0, 1.0),
+    "discogs": (1.0, 3.0),
+    "acoustid": (3.0, 3.0),
+}
+
+DEFERRED = "deferred"
+
+
+class _FirstRequestOnly:
+    """
+    No-wait scope: the first token is refused rather than waited for. Once a
+    lookup holds it, its follow-up requests (detail fetches, bios, parallel
+    release lookups) wait up to FOLLOWUP_MAX_WAIT_SEC rather than throw away
+    the work already done; a longer wait still defers.
+    """
+
+    def __init__(self):
+        self.started = False
+
+
+# True (wait), or a _FirstRequestOnly for a rate_limit_mode(False) scope; shared by
+# copied contexts, so fan-out threads of one lookup see the same first request.
+_WAIT_MODE: ContextVar[Any] = ContextVar("rt_rate_limit_wait", default=True)
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_STATS: Dict[str, Dict[str, float]] = {}
+_disabled_reason: Optional[str] = None
+# In-process fallback when the SQLite file cannot be opened.
+_fallback_lock = threading.Lock()
+_fallback_buckets: Dict[str, Dict[str, float]] = {}
+
+
+class RateLimited(Exception):
+    """Raised instead of sleeping when the caller asked not to wait (or would wait too long)."""
+
+    def __init__(self, provider: str, retry_after_sec: float):
+        super().__init__(f"{provider} rate-limited, retry in {retry_after_sec:.1f}s")
+        self.provider = provider
+        self.retry_after_sec = retry_after_sec
+
+
+def _limit_for(provider: str) -> Tuple[float, float]:
+    rate, burst = DEFAULT_LIMITS.get(provider, (1.0, 1.0))
+    key = provider.upper()
+    try:
+        rate = max(0.01, float(os.getenv(f"RT_RATE_LIMIT_{key}_PER_SEC") or rate))
+        burst = max(1.0, float(os.getenv(f"RT_RATE_LIMIT_{key}_BURST") or burst))
+    except ValueError:
+        pass
+    return rate, burst
+
+
+def _bump(provider: str, field: str, n: float = 1):
+    with _stats_lock:
+        p = _STATS.setdefault(provider, {})
+        p[field] = p.get(field, 0) + n
+
+
+def _conn() -> Optional[sqlite3.Connection]:
+    global _disabled_reason
+    if _disabled_reason:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    try:
+        RATE_LIMIT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(RATE_LIMIT_PATH), timeout=10.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+              provider TEXT PRIMARY KEY,
+              tokens REAL NOT NULL,
+              updated_at REAL NOT NULL,
+              blocked_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+    except Exception as e:
+        _disabled_reason = str(e)
+        print(f"[rate-limit] shared buckets unavailable, using per-process buckets: {e}")
+        return None
+    _local.conn = conn
+    return conn
+
+
+def _refill(state: Dict[str, float], rate: float, burst: float, now: float):
+    elapsed = max(0.0, now - state["updated_at"])
+    state["tokens"] = min(burst, state["tokens"] + elapsed * rate)
+    state["updated_at"] = now
+
+
+def _take(state: Dict[str, float], rate: float, now: float) -> float:
+    """Consume a token if possible; otherwise return seconds until one is available."""
+    if state["blocked_until"] > now:
+        return state["blocked_until"] - now
+    if state["tokens"] >= 1.0:
+        state["tokens"] -= 1.0
+        return 0.0
+    return (1.0 - state["tokens"]) / rate
+
+
+def _try_acquire(provider: str) -> float:
+    rate, burst = _limit_for(provider)
+    now = time.time()
+    conn = _conn()
+    if conn is None:
+        with _fallback_lock:
+            state = _fallback_buckets.setdefault(provider, {"tokens": burst, "updated_at": now, "blocked_until": 0.0})
+            _refill(state, rate, burst, now)
+            return _take(state, rate, now)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT tokens, updated_at, blocked_until FROM rate_buckets WHERE provider = ?", (provider,)
+        ).fetchone()
+        state = {"tokens": burst, "updated_at": now, "blocked_until": 0.0}
+        if row:
+            state = {"tokens": float(row[0]), "updated_at": float(row[1]), "blocked_until": float(row[2])}
+        _refill(state, rate, burst, now)
+        needed = _take(state, rate, now)
+        conn.execute(
+            """
+            INSERT INTO rate_buckets (provider, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)
+            ON CONFLICT(provider) DO UPDATE SET
+              tokens=excluded.tokens, updated_at=excluded.updated_at, blocked_until=excluded.blocked_until
+            """,
+            (provider, state["tokens"], state["updated_at"], state["blocked_until"]),
+        )
+        conn.execute("COMMIT")
+        return needed
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def acquire(provider: str, wait: Optional[bool] = None, max_wait: Optional[float] = None):
+    """
+    Take one request token for `provider`.
+
+    With `wait` (default: the current wait mode, see `rate_limit_mode`) the
+    caller sleeps until a token frees up, up to `max_wait` seconds; otherwise,
+    or when the wait would exceed that, RateLimited is raised so the caller
+    can report the work as deferred.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    scope = None
+    if wait is None:
+        mode = _WAIT_MODE.get()
+        if isinstance(mode, _FirstRequestOnly):
+            scope = mode
+            wait = mode.started
+            if max_wait is None:
+                max_wait = FOLLOWUP_MAX_WAIT_SEC
+        else:
+            wait = bool(mode)
+    budget = MAX_WAIT_SEC if max_wait is None else max(0.0, max_wait)
+    started = time.time()
+    while True:
+        try:
+            needed = _try_acquire(provider)
+        except Exception as e:
+            # Never let limiter bookkeeping break provider lookups.
+            print(f"[rate-limit] acquire failed provider={provider}: {e}")
+            return
+        if needed <= 0:
+            if scope is not None:
+                scope.started = True
+            waited = time.time() - started
+            _bump(provider, "acquired")
+            if waited > 0.05:
+                _bump(provider, "waited")
+                _bump(provider, "wait_sec", round(waited, 3))
+            return
+        spent = time.time() - started
+        if not wait or spent + needed > budget:
+            _bump(provider, "deferred")
+            raise RateLimited(provider, needed)
+        time.sleep(min(needed, max(0.0, budget - spent)) + 0.005)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def penalize(provider: str, retry_after_sec: float):
+    """Block `provider` for every process until the server-requested back-off has passed."""
+    retry_after_sec = min(MAX_BACKOFF_SEC, max(0.0, retry_after_sec))
+    until = time.time() + retry_after_sec
+    conn = _conn()
+    try:
+        if conn is None:
+            with _fallback_lock:
+                state = _fallback_buckets.setdefault(provider, {"tokens": 0.0, "updated_at": time.time(), "blocked_until": 0.0})
+                state["blocked_until"] = max(state["blocked_until"], until)
+                state["tokens"] = 0.0
+        else:
+            conn.execute(
+                """
+                INSERT INTO rate_buckets (provider, tokens, updated_at, blocked_until) VALUES (?, 0, ?, ?)
+                ON CONFLICT(provider) DO UPDATE SET
+                  tokens=0, updated_at=excluded.updated_at,
+                  blocked_until=MAX(rate_buckets.blocked_until, excluded.blocked_until)
+                """,
+                (provider, time.time(), until),
+            )
+    except Exception as e:
+        print(f"[rate-limit] penalize failed provider={provider}: {e}")
+    _bump(provider, "throttled_responses")
+    print(f"[rate-limit] provider={provider} throttled by server, backing off {retry_after_sec:.1f}s")
+
+
+def raise_for_throttle(provider: str, response: Any):
+    """
+    Honour 429/503 + Retry-After from a provider response: block the provider
+    for every process and raise RateLimited so the work is reported as deferred.
+    """
+    status = getattr(response, "status_code", None)
+    if status not in {429, 503}:
+        return
+    headers = getattr(response, "headers", None) or {}
+    retry_after = _parse_retry_after(headers.get("Retry-After"))
+    retry_after = DEFAULT_BACKOFF_SEC if retry_after is None else retry_after
+    penalize(provider, retry_after)
+    raise RateLimited(provider, retry_after)
+
+
+@contextmanager
+def rate_limit_mode(wait: bool) -> Iterator[None]:
+    """
+    Set whether `acquire` calls in this context sleep for tokens. With
+    wait=False the scope's first request raises RateLimited when no token is
+    free; the requests after it wait briefly (see _FirstRequestOnly).
+    """
+    token = _WAIT_MODE.set(True if wait else _FirstRequestOnly())
+    try:
+        yield
+    finally:
+        _WAIT_MODE.reset(token)
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """Configured limits, shared bucket state (all processes) and throttling counters (this process)."""
+    with _stats_lock:
+        counters = {p: dict(v) for p, v in _STATS.items()}
+    buckets: Dict[str, Dict[str, float]] = {}
+    conn = _conn()
+    if conn is not None:
+        try:
+            for provider, tokens, updated_at, blocked_until in conn.execute(
+                "SELECT provider, tokens, updated_at, blocked_until FROM rate_buckets"
+            ):
+                buckets[provider] = {
+                    "tokens": round(float(tokens), 3),
+                    "updated_at": float(updated_at),
+                    "blocked_for_sec": round(max(0.0, float(blocked_until) - time.time()), 3),
+                }
+        except Exception as e:
+            print(f"[rate-limit] stats failed: {e}")
+    limits = {}
+    for provider in sorted(set(DEFAULT_LIMITS) | set(counters) | set(buckets)):
+        rate, burst = _limit_for(provider)
+        limits[provider] = {"per_sec": rate, "burst": burst}
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "shared": conn is not None,
+        "disabled_reason": _disabled_reason,
+        "path": str(RATE_LIMIT_PATH),
+        "max_wait_sec": MAX_WAIT_SEC,
+        "limits": limits,
+        "buckets": buckets,
+        "process_counters": counters,
+    }
@@ -1,28 +1,38 @@
 from typing import Dict, Any, Optional
+import copy
 import json, time, requests
 import os, subprocess, re
 import hashlib
 import uuid
 import random
-from difflib import SequenceMatcher
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse, RedirectResponse, Response
+from urllib.parse import quote
 from ..models import (
+    Track,
     ScanPayload,
+    ScanDeltaPayload,
+    ScanCompletePayload,
+    ScanRemovePayload,
+    ScanFingerprintsPayload,
     AnnouncePayload,
     PlaylistCreatePayload,
     PlaylistTrackUpdatePayload,
     MetadataLibraryUpsertPayload,
     MetadataEnrichPayload,
     MetadataEnrichLibraryPayload,
+    MetadataEnrichJobPayload,
     MetadataResetPayload,
     MetadataAlbumResetPayload,
     MobileNextPayload,
     TrackHealthScanPayload,
+    TrackHealthJobPayload,
 )
 from ..storage import (
     load_lib,
     save_lib,
+    lib_lock,
     load_agent,
     save_agent_stable,
     load_playlists,
@@ -31,9 +41,10 @@ from ..storage import (
     save_metadata_library,
     db_upsert_tracks,
     db_upsert_track_sources,
-    db_mark_all_track_sources_unavailable,
+    db_mark_track_sources_unavailable,
     db_upsert_track_health,
     db_list_track_health,
+    db_track_health_ok_fingerprints,
     db_insert_provider_snapshot,
     db_upsert_override,
     db_find_metadata_seed,
@@ -42,7 +53,36 @@ from ..storage import (
     db_delete_tracks,
 )
 from ..utils import normalize_rel_path, build_stream_url, enrich_track_metadata, normalize_text_key
-from ..metadata_providers import search_candidates
+from ..matching import similarity
+from ..metadata_providers import finalize_artwork, search_album, search_candidates
+from ..provider_cache import cache_stats
+from ..scan_manifest import diff_manifest, library_manifest
+from ..artwork_cache import (
+    ARTWORK_PROXY_ENABLED,
+    VARIANT_SIZES as ARTWORK_VARIANT_SIZES,
+    ArtworkError,
+    host_allowed as artwork_host_allowed,
+    load_variant as load_artwork_variant,
+    pick_format as pick_artwork_format,
+    resolve_original as resolve_artwork_original,
+)
+from ..rate_limit import DEFERRED as RATE_LIMIT_DEFERRED, rate_limit_stats
+from ..jobs import JobRunner, JOB_ACTIONS
+from ..scan_queue import (
+    SCAN_QUEUE_ENABLED,
+    batch_status as scan_batch_status,
+    enqueue_batch as enqueue_scan_batch,
+    queue_stats as scan_queue_stats,
+    set_processor as set_scan_queue_processor,
+)
+from ..enrich_queue import (
+    SCHEDULER_ENABLED as ENRICH_SCHEDULER_ENABLED,
+    enqueue_tracks as enrich_queue_tracks,
+    forget_tracks as enrich_queue_forget,
+    queue_stats as enrich_queue_stats,
+    record_play as enrich_queue_record_play,
+    set_processor as set_enrich_queue_processor,
+)
 
 
 router = APIRouter(prefix="/api", tags=["core"])
@@ -59,10 +99,30 @@ LEGACY_AUDIO_EXTS = {
     ".ogg", ".opus", ".wma", ".dsf", ".dff",
 }
 
+# "album": resolve each album once and map its tracklist onto local tracks; "track": one lookup per track.
+METADATA_ENRICH_MODE = str(os.getenv("RT_METADATA_ENRICH_MODE", "album") or "album").strip().lower()
+ALBUM_ENRICH_MIN_TRACKS = max(2, int(os.getenv("RT_ALBUM_ENRICH_MIN_TRACKS", "2") or "2"))
+
 PLAYABILITY_BAD_THRESHOLD = max(1, int(os.getenv("RT_PLAYABILITY_BAD_THRESHOLD", "3") or "3"))
 TRACK_HEALTH_FFPROBE_TIMEOUT_SEC = max(5, int(os.getenv("RT_TRACK_HEALTH_FFPROBE_TIMEOUT_SEC", "20") or "20"))
 TRACK_HEALTH_DECODE_SEC = max(0, int(os.getenv("RT_TRACK_HEALTH_DECODE_SEC", "8") or "8"))
 TRACK_HEALTH_DECODE_TIMEOUT_SEC = max(5, int(os.getenv("RT_TRACK_HEALTH_DECODE_TIMEOUT_SEC", "30") or "30"))
+# "single": one ffmpeg pass yields reachability, stream info, duration and decode validity.
+# "multi": legacy HEAD + ffprobe + ffmpeg decode (three fetches through the tunnel).
+TRACK_HEALTH_PROBE_MODE = str(os.getenv("RT_TRACK_HEALTH_PROBE_MODE", "single")).strip().lower()
+# "head": decode only the first TRACK_HEALTH_DECODE_SEC seconds.
+# "sampled": also decode middle/tail windows via ranged seeks to catch truncation/corruption.
+# "auto": sampled for lossless or large files, head otherwise.
+TRACK_HEALTH_DECODE_MODE = str(os.getenv("RT_TRACK_HEALTH_DECODE_MODE", "auto")).strip().lower()
+TRACK_HEALTH_SAMPLE_WINDOWS = max(0, int(os.getenv("RT_TRACK_HEALTH_SAMPLE_WINDOWS", "3") or "3"))
+TRACK_HEALTH_SAMPLE_SEC = max(1, int(os.getenv("RT_TRACK_HEALTH_SAMPLE_SEC", "4") or "4"))
+TRACK_HEALTH_SAMPLED_MIN_BYTES = max(0, int(os.getenv("RT_TRACK_HEALTH_SAMPLED_MIN_BYTES", str(20 * 1024 * 1024)) or "0"))
+HEALTH_JOB_ON_SCAN = str(os.getenv("RT_HEALTH_JOB_ON_SCAN", "1")).strip().lower() not in {"0", "false", "off", "no"}
+# Streaming scan ingest: records applied per save_lib/DB commit, and body limits.
+SCAN_STREAM_COMMIT_RECORDS = max(50, int(os.getenv("RT_SCAN_STREAM_COMMIT_RECORDS", "2000") or "2000"))
+SCAN_STREAM_MAX_LINE_BYTES = max(64 * 1024, int(os.getenv("RT_SCAN_STREAM_MAX_LINE_BYTES", str(1024 * 1024)) or "1048576"))
+SCAN_STREAM_MAX_BYTES = max(1024 * 1024, int(os.getenv("RT_SCAN_STREAM_MAX_BYTES", str(1024 * 1024 * 1024)) or "1073741824"))
+SCAN_STREAM_SESSION_TTL_SEC = max(3600, int(os.getenv("RT_SCAN_STREAM_SESSION_TTL_SEC", str(7 * 86400)) or "604800"))
 
 
 def _track_needs_mp3_proxy(track: Dict[str, Any]) -> bool:
@@ -120,13 +180,7 @@ def _is_generic_title(v: Any) -> bool:
 
 
 def _sim_text(a: Any, b: Any) -> float:
-    x = normalize_text_key(a)
-    y = normalize_text_key(b)
-    if not x and not y:
-        return 1.0
-    if not x or not y:
-        return 0.0
-    return SequenceMatcher(None, x, y).ratio()
+    return similarity(a, b)
 
 
 def _provider_min_score(provider: str, default_min: float) -> float:
@@ -233,6 +287,72 @@ def _candidate_passes_sanity(track: Dict[str, Any], best: Dict[str, Any]) -> boo
     return True
 
 
+def _album_group_key(track: Dict[str, Any]) -> Optional[tuple]:
+    album = track.get("album")
+    artist = track.get("album_artist") or track.get("artist")
+    if _is_weak_text(album) or _is_weak_text(artist):
+        return None
+    return (normalize_text_key(artist), normalize_text_key(album))
+
+
+def _search_for_enrichment(
+    tracks: list,
+    providers: list,
+    wait: bool = True,
+    mode: Optional[str] = None,
+    library_tracks: Optional[Dict[str, Any]] = None,
+) -> tuple:
+    """
+    Provider lookups for a batch of tracks, keyed by track_id in the
+    search_candidates(include_errors=True) shape.
+
+    In album mode, tracks sharing album_artist/album are resolved with one
+    release lookup; tracks the tracklist does not cover (and singletons) fall
+    back to per-track search.
+    """
+    mode = str(mode or METADATA_ENRICH_MODE).strip().lower()
+    results: Dict[str, Dict[str, Any]] = {}
+    stats = {"mode": mode, "album_lookups": 0, "album_matched_tracks": 0, "track_lookups": 0}
+    per_track = list(tracks)
+    if mode == "album" and any(p in {"local", "musicbrainz", "discogs"} for p in providers):
+        groups: Dict[tuple, list] = {}
+        per_track = []
+        for t in tracks:
+            key = _album_group_key(t)
+            if key is None:
+                per_track.append(t)
+            else:
+                groups.setdefault(key, []).append(t)
+        album_sizes: Dict[tuple, int] = {}
+        for t in (library_tracks or {}).values():
+            key = _album_group_key(t)
+            if key in groups:
+                album_sizes[key] = album_sizes.get(key, 0) + 1
+        for key, group in groups.items():
+            if len(group) < ALBUM_ENRICH_MIN_TRACKS:
+                per_track.extend(group)
+                continue
+            first = group[0]
+            resolved = search_album(
+                str(first.get("album_artist") or first.get("artist") or ""),
+                str(first.get("album") or ""),
+                group,
+                providers=providers,
+                wait=wait,
+                track_count=max(len(group), album_sizes.get(key, 0)),
+            )
+            stats["album_lookups"] += 1
+            for tid, cand in resolved["candidates"].items():
+                results[tid] = {"candidates": [cand], "errors": resolved["errors"]}
+                stats["album_matched_tracks"] += 1
+            unmatched = set(resolved["unmatched"])
+            per_track.extend(t for t in group if str(t.get("track_id")) in unmatched)
+    for t in per_track:
+        results[str(t.get("track_id"))] = search_candidates(t, providers=providers, include_errors=True, wait=wait)
+        stats["track_lookups"] += 1
+    return results, stats
+
+
 def _apply_seed_metadata(current: Dict[str, Any], seed: Dict[str, Any]) -> Dict[str, Any]:
     """
     Use same-user historical metadata as a conservative seed.
@@ -425,25 +545,211 @@ def _ffmpeg_decode_probe(url: str, decode_sec: int) -> Dict[str, Any]:
         return {"ok": False, "stderr": str(e)}
 
 
-def _track_health_entry(user_id: str, track: Dict[str, Any]) -> Dict[str, Any]:
-    source_path = track.get("source_path") or track.get("rel_path") or track.get("path")
-    url = build_stream_url(user_id, track)
-    details: Dict[str, Any] = {"url": url, "source_path": source_path}
-    entry: Dict[str, Any] = {
-        "track_uid": str(track.get("track_id") or ""),
-        "source_path": source_path,
-        "status": "warning",
-        "source_reachable": False,
-        "probe_ok": False,
-        "decode_ok": False,
-        "duration_sec": None,
-        "codec": track.get("codec"),
-        "error_reason": "unknown",
-        "details": details,
+_FFMPEG_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)")
+_FFMPEG_AUDIO_STREAM_RE = re.compile(r"Stream #\d+:\d+[^:]*: Audio: ([A-Za-z0-9_]+)")
+_FFMPEG_HTTP_STATUS_RE = re.compile(r"(?:Server returned|HTTP error) (\d{3})")
+_FFMPEG_INFO_PREFIXES = (
+    "Input #", "Output #", "Duration:", "Stream #", "Stream mapping", "Metadata:",
+    "Side data:", "Press [q]", "size=", "video:", "Chapters:", "Chapter #", "encoder",
+)
+
+
+def _ffmpeg_single_pass_probe(url: str, decode_sec: int) -> Dict[str, Any]:
+    """
+    Open, describe and decode the source in one ffmpeg run, parsing the info-level
+    log for container duration and audio codec. One tunnel fetch instead of three.
+    """
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-nostats",
+        "-v", "info",
+        "-xerror",
+    ]
+    if decode_sec > 0:
+        cmd += ["-t", str(int(decode_sec))]
+    cmd += ["-i", url, "-map", "0:a:0"]
+    if decode_sec <= 0:
+        cmd += ["-frames:a", "1"]
+    cmd += ["-f", "null", "-"]
+    try:
+        proc = subprocess.run(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=TRACK_HEALTH_DECODE_TIMEOUT_SEC,
+            check=False,
+            text=True,
+        )
+    except Exception as e:
+        return {"opened": False, "ok": False, "stderr": str(e)}
+
+    log = proc.stderr or ""
+    duration = None
+    m = _FFMPEG_DURATION_RE.search(log)
+    if m:
+        duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+    m = _FFMPEG_AUDIO_STREAM_RE.search(log)
+    codec = m.group(1) if m else None
+    m = _FFMPEG_HTTP_STATUS_RE.search(log)
+    http_status = int(m.group(1)) if m else None
+    # Keep only diagnostic lines; the info-level header is parsed above.
+    errors = [
+        ln.strip() for ln in log.splitlines()
+        if ln.strip() and not ln.strip().startswith(_FFMPEG_INFO_PREFIXES) and not ln.startswith((" ", "\t"))
+    ]
+    return {
+        "opened": "Input #" in log,
+        "ok": proc.returncode == 0,
+        "returncode": proc.returncode,
+        "http_status": http_status,
+        "duration_sec": duration,
+        "codec": codec,
+        "decode_sec": int(decode_sec),
+        "stderr": "\n".join(errors[-12:]),
     }
-    if not url:
-        entry["error_reason"] = "no-base-url-or-rel-path"
+
+
+def _ffmpeg_decode_window(url: str, start_sec: float, window_sec: float) -> Dict[str, Any]:
+    """
+    Decode one window starting at `start_sec`. Input-side seeking makes ffmpeg
+    jump with HTTP Range reads, so only the headers and the window cross the tunnel.
+    """
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-v", "error",
+        "-xerror",
+        "-nostats",
+        "-ss", f"{max(0.0, start_sec):.3f}",
+        "-t", f"{window_sec:.3f}",
+        "-i", url,
+        "-map", "0:a:0",
+        "-progress", "pipe:1",
+        "-f", "null",
+        "-",
+    ]
+    try:
+        proc = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=TRACK_HEALTH_DECODE_TIMEOUT_SEC,
+            check=False,
+            text=True,
+        )
+    except Exception as e:
+        return {"ok": False, "start_sec": round(start_sec, 3), "decoded_sec": 0.0, "stderr": str(e)}
+    decoded_us = 0
+    for ln in (proc.stdout or "").splitlines():
+        # out_time_ms is (despite the name) microseconds, same as out_time_us.
+        if ln.startswith(("out_time_us=", "out_time_ms=")):
+            try:
+                decoded_us = max(decoded_us, int(ln.split("=", 1)[1]))
+            except ValueError:
+                pass
+    decoded_sec = decoded_us / 1_000_000.0
+    return {
+        "ok": proc.returncode == 0,
+        "returncode": proc.returncode,
+        "start_sec": round(start_sec, 3),
+        "decoded_sec": round(decoded_sec, 3),
+        "stderr": (proc.stderr or "").strip()[-600:],
+    }
+
+
+def _health_should_sample(track: Dict[str, Any]) -> bool:
+    if TRACK_HEALTH_DECODE_MODE == "sampled":
+        return True
+    if TRACK_HEALTH_DECODE_MODE != "auto":
+        return False
+    if str(track.get("format_family") or "") == "lossless":
+        return True
+    try:
+        return TRACK_HEALTH_SAMPLED_MIN_BYTES > 0 and int(track.get("file_size") or 0) >= TRACK_HEALTH_SAMPLED_MIN_BYTES
+    except Exception:
+        return False
+
+
+def _sampled_decode_check(url: str, duration_sec: float, details: Dict[str, Any]) -> Optional[str]:
+    """
+    Decode a few middle windows plus the tail, each independently. The head was
+    already decoded by the main probe. Returns an error reason, or None when all
+    samples decode fully.
+    """
+    window = float(TRACK_HEALTH_SAMPLE_SEC)
+    if duration_sec <= (TRACK_HEALTH_DECODE_SEC + window):
+        details["samples"] = []
+        return None
+    n = TRACK_HEALTH_SAMPLE_WINDOWS
+    offsets = [duration_sec * i / (n + 1) for i in range(1, n + 1)]
+    offsets.append(max(0.0, duration_sec - window - 0.25))
+    samples = []
+    reason = None
+    for start in offsets:
+        expected = min(window, max(0.0, duration_sec - start))
+        sample = _ffmpeg_decode_window(url, start, window)
+        samples.append(sample)
+        if not sample.get("ok"):
+            reason = f"decode-failed@{sample['start_sec']}s:{sample.get('stderr') or 'unknown'}"
+            break
+        # A short read means the file ends (or breaks) before its declared duration.
+        if expected > 0 and float(sample.get("decoded_sec") or 0.0) < expected * 0.5:
+            reason = f"truncated@{sample['start_sec']}s:decoded={sample.get('decoded_sec')}s"
+            break
+    details["samples"] = samples
+    return reason
+
+
+def _track_health_single_pass(url: str, entry: Dict[str, Any], details: Dict[str, Any], sampled: bool = False) -> Dict[str, Any]:
+    probe = _ffmpeg_single_pass_probe(url, TRACK_HEALTH_DECODE_SEC)
+    details["probe_mode"] = "single"
+    details["probe"] = probe
+    if probe.get("http_status"):
+        details["head_status"] = probe.get("http_status")
+    if not probe.get("opened"):
+        status = probe.get("http_status")
+        entry["error_reason"] = (
+            f"source-unreachable:http-{status}" if status else f"source-unreachable:{probe.get('stderr') or 'unknown'}"
+        )
+        return entry
+    entry["source_reachable"] = True
+
+    if not probe.get("codec"):
+        entry["status"] = "error"
+        entry["error_reason"] = f"ffprobe-failed:{probe.get('stderr') or 'no-audio-stream'}"
+        return entry
+    entry["probe_ok"] = True
+    entry["codec"] = probe.get("codec")
+    if probe.get("duration_sec") is not None:
+        entry["duration_sec"] = probe.get("duration_sec")
+
+    if not entry.get("duration_sec") or float(entry.get("duration_sec") or 0.0) <= 0.0:
+        entry["status"] = "error"
+        entry["error_reason"] = "invalid-duration"
         return entry
+
+    if not probe.get("ok"):
+        entry["status"] = "error"
+        entry["error_reason"] = f"decode-failed:{probe.get('stderr') or 'unknown'}"
+        return entry
+
+    if sampled:
+        reason = _sampled_decode_check(url, float(entry["duration_sec"]), details)
+        if reason:
+            entry["status"] = "error"
+            entry["error_reason"] = reason
+            return entry
+
+    entry["decode_ok"] = True
+    entry["status"] = "ok"
+    entry["error_reason"] = ""
+    return entry
+
+
+def _track_health_multi_pass(url: str, entry: Dict[str, Any], details: Dict[str, Any], sampled: bool = False) -> Dict[str, Any]:
+    details["probe_mode"] = "multi"
     try:
         head = requests.head(url, timeout=(5, 15), allow_redirects=True, headers={"User-Agent": "RadioTiker-Health/0.1"})
         details["head_status"] = int(head.status_code)
@@ -480,11 +786,82 @@ def _track_health_entry(user_id: str, track: Dict[str, Any]) -> Dict[str, Any]:
         entry["error_reason"] = f"decode-failed:{decode.get('stderr') or 'unknown'}"
         return entry
 
+    if sampled:
+        reason = _sampled_decode_check(url, float(entry["duration_sec"]), details)
+        if reason:
+            entry["status"] = "error"
+            entry["error_reason"] = reason
+            return entry
+
     entry["decode_ok"] = True
     entry["status"] = "ok"
     entry["error_reason"] = ""
     return entry
 
+
+def _track_health_entry(user_id: str, track: Dict[str, Any]) -> Dict[str, Any]:
+    source_path = track.get("source_path") or track.get("rel_path") or track.get("path")
+    url = build_stream_url(user_id, track)
+    details: Dict[str, Any] = {"url": url, "source_path": source_path}
+    entry: Dict[str, Any] = {
+        "track_uid": str(track.get("track_id") or ""),
+        "source_path": source_path,
+        "file_size": track.get("file_size"),
+        "mtime": track.get("mtime"),
+        "status": "warning",
+        "source_reachable": False,
+        "probe_ok": False,
+        "decode_ok": False,
+        "duration_sec": None,
+        "codec": track.get("codec"),
+        "error_reason": "unknown",
+        "details": details,
+    }
+    if not url:
+        entry["error_reason"] = "no-base-url-or-rel-path"
+        return entry
+    sampled = _health_should_sample(track)
+    details["decode_mode"] = "sampled" if sampled else "head"
+    if TRACK_HEALTH_PROBE_MODE == "multi":
+        return _track_health_multi_pass(url, entry, details, sampled=sampled)
+    return _track_health_single_pass(url, entry, details, sampled=sampled)
+
+
+def _health_unchanged_since_ok(track: Dict[str, Any], ok_fingerprints: Dict[str, tuple]) -> bool:
+    """True when the track's (file_size, mtime) matches its last passing health check."""
+    last_ok = ok_fingerprints.get(str(track.get("track_id") or ""))
+    if not last_ok:
+        return False
+    try:
+        return (int(track.get("file_size")), int(track.get("mtime"))) == last_ok
+    except Exception:
+        return False
+
+
+def _health_job_prefetch(user_id: str, job: Dict[str, Any], track_ids: list) -> Optional[Dict[str, tuple]]:
+    """Last passing (file_size, mtime) for a window of job items, in one query."""
+    if (job.get("options") or {}).get("force"):
+        return None
+    return db_track_health_ok_fingerprints(user_id, [str(tid) for tid in track_ids])
+
+
+def _health_job_item(user_id: str, job: Dict[str, Any], track_id: str, ok_fingerprints: Optional[Dict[str, tuple]] = None) -> Dict[str, Any]:
+    lib = load_lib(user_id)
+    track = (lib.get("tracks") or {}).get(str(track_id))
+    if not track:
+        return {"skipped_missing": 1}
+    if not (job.get("options") or {}).get("force"):
+        if ok_fingerprints is None:
+            ok_fingerprints = db_track_health_ok_fingerprints(user_id, [str(track_id)])
+        if _health_unchanged_since_ok(track, ok_fingerprints):
+            return {"skipped_unchanged": 1}
+    entry = _track_health_entry(user_id, track)
+    db_upsert_track_health(user_id, [entry])
+    return {"checked": 1, "status": {str(entry.get("status") or "warning"): 1}}
+
+
+HEALTH_JOBS = JobRunner("health", _health_job_item, prefetch=_health_job_prefetch)
+
 def _ffmpeg_cmd_for_http_input(url: str, abr_kbps: int = 192, start_sec: float = 0.0) -> list[str]:
     # 192 kbps CBR is a sweet spot for mobile/Bluetooth reliability.
     cmd = [
@@ -798,6 +1175,7 @@ def clear_library(user_id: str):
     lib["tracks"] = {}
     lib["version"] = int(time.time())
     lib["_cleared_for"] = 0
+    lib.pop("_sweep_gen", None)
     save_lib(user_id, lib)
     if track_ids:
         db_delete_tracks(user_id, track_ids, purge_related=True)
@@ -840,9 +1218,15 @@ def scan_library_health(user_id: str, payload: TrackHealthScanPayload):
     tracks = list((lib.get("tracks") or {}).values())
     by_id = {str(t.get("track_id") or ""): t for t in tracks if t.get("track_id")}
     requested = [str(tid) for tid in (payload.track_ids or []) if str(tid or "").strip()]
+    skipped_unchanged = 0
     if requested:
         candidates = [by_id[tid] for tid in requested if tid in by_id]
     else:
+        if payload.skip_unchanged:
+            ok_fingerprints = db_track_health_ok_fingerprints(user_id)
+            before = len(tracks)
+            tracks = [t for t in tracks if not _health_unchanged_since_ok(t, ok_fingerprints)]
+            skipped_unchanged = before - len(tracks)
         candidates = sorted(
             tracks,
             key=lambda t: (
@@ -873,11 +1257,51 @@ def scan_library_health(user_id: str, payload: TrackHealthScanPayload):
         "ok": True,
         "user_id": user_id,
         "scanned": len(persisted),
+        "skipped_unchanged": skipped_unchanged,
         "returned": len(checked),
         "items": checked,
     }
 
 
+@router.post("/library/{user_id}/health-jobs")
+def create_health_job(user_id: str, payload: TrackHealthJobPayload):
+    """
+    Queue a background health-check job. Progress is persisted, so the job
+    resumes after a restart; unchanged files that last passed are skipped.
+    """
+    lib = load_lib(user_id)
+    tracks = lib.get("tracks") or {}
+    requested = [str(tid) for tid in (payload.track_ids or []) if str(tid or "").strip()]
+    track_ids = [tid for tid in requested if tid in tracks] if requested else list(tracks.keys())
+    if not track_ids:
+        raise HTTPException(status_code=400, detail="No tracks to check")
+    job = HEALTH_JOBS.create(user_id, track_ids, options={"force": bool(payload.force)})
+    return {"ok": True, "job": HEALTH_JOBS.get(user_id, job["job_id"])}
+
+
+@router.get("/library/{user_id}/health-jobs")
+def list_health_jobs(user_id: str):
+    return {"ok": True, "user_id": user_id, "jobs": HEALTH_JOBS.list(user_id)}
+
+
+@router.get("/library/{user_id}/health-jobs/{job_id}")
+def get_health_job(user_id: str, job_id: str):
+    job = HEALTH_JOBS.get(user_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job_id")
+    return {"ok": True, "job": job}
+
+
+@router.post("/library/{user_id}/health-jobs/{job_id}/{action}")
+def control_health_job(user_id: str, job_id: str, action: str):
+    if action not in JOB_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported action: {action}")
+    job = HEALTH_JOBS.control(user_id, job_id, action)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job_id")
+    return {"ok": True, "job": job}
+
+
 @router.post("/library/{user_id}/reset-enrichment")
 def reset_library_enrichment(user_id: str, payload: MetadataResetPayload):
     """
@@ -926,6 +1350,9 @@ def reset_library_enrichment(user_id: str, payload: MetadataResetPayload):
         save_lib(user_id, lib)
         db_upsert_tracks(user_id, db_rows)
 
+    if ENRICH_SCHEDULER_ENABLED and db_rows:
+        enrich_queue_tracks(user_id, db_rows, reason="reset", reset_backoff=True)
+
     if payload.clear_overrides:
         db_delete_overrides(user_id, target_ids)
     if payload.clear_provider_snapshots:
@@ -990,6 +1417,8 @@ def set_track_auto_enrich(user_id: str, track_id: str, payload: Dict[str, Any]):
     lib["version"] = int(time.time())
     save_lib(user_id, lib)
     db_upsert_tracks(user_id, [track])
+    if ENRICH_SCHEDULER_ENABLED:
+        enrich_queue_tracks(user_id, [track], reason="auto-enrich-toggle", reset_backoff=enabled)
     return {
         "ok": True,
         "track_id": track_id,
@@ -1029,6 +1458,8 @@ def remove_track(user_id: str, track_id: str):
     lib["version"] = int(time.time())
     save_lib(user_id, lib)
     db_delete_tracks(user_id, [track_id], purge_related=True)
+    if ENRICH_SCHEDULER_ENABLED:
+        enrich_queue_forget(user_id, [track_id])
     return {"ok": True, "removed": True, "track_id": track_id, "version": lib["version"]}
 
 @router.post("/library/{user_id}/migrate-relpaths")
@@ -1116,6 +1547,16 @@ def apply_metadata_library(user_id: str):
     return {"ok": True, "changed": changed, "count": len(tracks), "version": lib["version"]}
 
 
+@router.get("/metadata/provider-cache/stats")
+def metadata_provider_cache_stats():
+    return {"ok": True, **cache_stats()}
+
+
+@router.get("/metadata/rate-limits")
+def metadata_rate_limits():
+    return {"ok": True, **rate_limit_stats()}
+
+
 @router.post("/metadata/enrich/{user_id}/{track_id}")
 def metadata_enrich_track(user_id: str, track_id: str, payload: MetadataEnrichPayload):
     lib = load_lib(user_id)
@@ -1124,7 +1565,12 @@ def metadata_enrich_track(user_id: str, track_id: str, payload: MetadataEnrichPa
         raise HTTPException(status_code=404, detail="Unknown track_id")
 
     providers = payload.providers or ["musicbrainz", "discogs", "acoustid"]
-    searched = search_candidates(track, providers=providers, include_errors=True)
+    searched = search_candidates(
+        track,
+        providers=providers,
+        include_errors=True,
+        wait=payload.wait_for_rate_limit is not False,
+    )
     candidates = searched.get("candidates", [])
     provider_errors = searched.get("errors", [])
     if not candidates:
@@ -1145,6 +1591,7 @@ def metadata_enrich_track(user_id: str, track_id: str, payload: MetadataEnrichPa
     changed = False
 
     if payload.apply and accepted:
+        finalize_artwork(best)
         patch = best.get("patch") or {}
         rule = _store_metadata_patch_rule(
             user_id=user_id,
@@ -1165,6 +1612,8 @@ def metadata_enrich_track(user_id: str, track_id: str, payload: MetadataEnrichPa
             save_lib(user_id, lib)
             db_upsert_tracks(user_id, [patched])
             db_upsert_override(track_id, user_id, patch)
+            if ENRICH_SCHEDULER_ENABLED:
+                enrich_queue_forget(user_id, [track_id])
             changed = True
 
     db_insert_provider_snapshot(track_id, best)
@@ -1181,6 +1630,68 @@ def metadata_enrich_track(user_id: str, track_id: str, payload: MetadataEnrichPa
     }
 
 
+def _enrich_library_track(
+    user_id: str,
+    lib: Dict[str, Any],
+    t: Dict[str, Any],
+    searched: Dict[str, Any],
+    min_score: float,
+    apply: bool,
+    source: str = "batch",
+) -> Dict[str, Any]:
+    """
+    Judge one track's provider results and, when `apply`, patch it in `lib`
+    (caller saves). Returns the detail row plus `matched`/`applied` flags.
+    """
+    candidates = searched.get("candidates", [])
+    item = {
+        "track_id": t.get("track_id"),
+        "title": t.get("title"),
+        "artist": t.get("artist"),
+        "best": candidates[0] if candidates else None,
+        "provider_errors": searched.get("errors", []),
+        "matched": False,
+        "applied": False,
+    }
+    if not candidates:
+        return item
+    best = candidates[0]
+    score = float(best.get("score") or 0.0)
+    if score < _provider_min_score(str(best.get("provider") or ""), min_score):
+        return item
+    if not _candidate_passes_sanity(t, best):
+        return item
+    item["matched"] = True
+    if apply:
+        finalize_artwork(best)
+        patch = best.get("patch") or {}
+        rule = _store_metadata_patch_rule(
+            user_id=user_id,
+            src_track=t,
+            patch=patch,
+            provider=str(best.get("provider") or "unknown"),
+            score=float(best.get("score") or 0.0),
+        )
+        patched = dict(t)
+        patched.update(patch)
+        patched["metadata_source"] = f"{source}:{str(best.get('provider') or 'unknown')}"
+        patched["metadata_source_score"] = float(best.get("score") or 0.0)
+        patched["metadata_source_updated_at"] = int(time.time())
+        patched.update(enrich_track_metadata(patched))
+        tid = str(t.get("track_id"))
+        original = lib["tracks"].get(tid)
+        overwrite_ok = _overwrite_allowed(original or {}, best, mode="batch")
+        item["overwrite_allowed"] = overwrite_ok
+        if overwrite_ok and original and any(original.get(k) != patched.get(k) for k in patched.keys()):
+            lib["tracks"][tid] = patched
+            db_upsert_tracks(user_id, [patched])
+            db_upsert_override(tid, user_id, patch)
+            item["applied"] = True
+        item["rule"] = rule
+    db_insert_provider_snapshot(str(t.get("track_id") or ""), best)
+    return item
+
+
 @router.post("/metadata/enrich-library/{user_id}")
 def metadata_enrich_library(user_id: str, payload: MetadataEnrichLibraryPayload):
     lib = load_lib(user_id)
@@ -1196,74 +1707,26 @@ def metadata_enrich_library(user_id: str, payload: MetadataEnrichLibraryPayload)
     applied = 0
     details = []
 
-    for t in tracks[:limit]:
+    selected = tracks[:limit]
+    searched_by_id, lookup_stats = _search_for_enrichment(
+        selected,
+        providers,
+        wait=payload.wait_for_rate_limit is not False,
+        mode=payload.mode,
+        library_tracks=lib.get("tracks", {}),
+    )
+    for t in selected:
         scanned += 1
-        searched = search_candidates(t, providers=providers, include_errors=True)
-        candidates = searched.get("candidates", [])
-        provider_errors = searched.get("errors", [])
-        if not candidates:
-            details.append({
-                "track_id": t.get("track_id"),
-                "title": t.get("title"),
-                "artist": t.get("artist"),
-                "best": None,
-                "provider_errors": provider_errors,
-            })
-            continue
-        best = candidates[0]
-        score = float(best.get("score") or 0.0)
-        if score < _provider_min_score(str(best.get("provider") or ""), min_score):
-            details.append({
-                "track_id": t.get("track_id"),
-                "title": t.get("title"),
-                "artist": t.get("artist"),
-                "best": best,
-                "provider_errors": provider_errors,
-            })
-            continue
-        if not _candidate_passes_sanity(t, best):
-            details.append({
-                "track_id": t.get("track_id"),
-                "title": t.get("title"),
-                "artist": t.get("artist"),
-                "best": best,
-                "provider_errors": provider_errors,
-            })
-            continue
-        matched += 1
-        item = {
-            "track_id": t.get("track_id"),
-            "title": t.get("title"),
-            "artist": t.get("artist"),
-            "best": best,
-            "provider_errors": provider_errors,
-        }
-        if payload.apply:
-            patch = best.get("patch") or {}
-            rule = _store_metadata_patch_rule(
-                user_id=user_id,
-                src_track=t,
-                patch=patch,
-                provider=str(best.get("provider") or "unknown"),
-                score=float(best.get("score") or 0.0),
-            )
-            patched = dict(t)
-            patched.update(patch)
-            patched["metadata_source"] = f"batch:{str(best.get('provider') or 'unknown')}"
-            patched["metadata_source_score"] = float(best.get("score") or 0.0)
-            patched["metadata_source_updated_at"] = int(time.time())
-            patched.update(enrich_track_metadata(patched))
-            tid = str(t.get("track_id"))
-            original = lib["tracks"].get(tid)
-            overwrite_ok = _overwrite_allowed(original or {}, best, mode="batch")
-            item["overwrite_allowed"] = overwrite_ok
-            if overwrite_ok and original and any(original.get(k) != patched.get(k) for k in patched.keys()):
-                lib["tracks"][tid] = patched
-                db_upsert_tracks(user_id, [patched])
-                db_upsert_override(tid, user_id, patch)
-                applied += 1
-            item["rule"] = rule
-        db_insert_provider_snapshot(str(t.get("track_id") or ""), best)
+        item = _enrich_library_track(
+            user_id,
+            lib,
+            t,
+            searched_by_id.get(str(t.get("track_id")), {}),
+            min_score=min_score,
+            apply=bool(payload.apply),
+        )
+        matched += 1 if item.pop("matched") else 0
+        applied += 1 if item.pop("applied") else 0
         details.append(item)
 
     if payload.apply and applied > 0:
@@ -1275,9 +1738,233 @@ def metadata_enrich_library(user_id: str, payload: MetadataEnrichLibraryPayload)
         "scanned": scanned,
         "matched": matched,
         "applied": applied,
+        "lookups": lookup_stats,
         "details": details[:50],
     }
 
+def _library_snapshot(user_id: str, track_ids: list) -> tuple:
+    """
+    (copies of the tracks in `track_ids`, copy of the whole track map) taken under
+    the library lock, so provider work can read them while request threads keep
+    mutating the shared library. The map is only used to count album siblings.
+    """
+    with lib_lock(user_id):
+        tracks = load_lib(user_id).get("tracks", {})
+        return copy.deepcopy({tid: tracks[tid] for tid in track_ids if tid in tracks}), dict(tracks)
+
+
+def _enrich_job_item(user_id: str, job: Dict[str, Any], track_ids: list) -> Dict[str, Any]:
+    opts = job.get("options") or {}
+    providers = opts.get("providers") or ["musicbrainz", "discogs", "acoustid"]
+    wanted, snapshot = _library_snapshot(user_id, track_ids)
+    batch = [wanted[tid] for tid in track_ids if tid in wanted]
+    if not batch:
+        return {"skipped_missing": len(track_ids)}
+    # Provider work runs on copies without holding the lock; results are applied
+    # to the live library under lib_lock, so a scan or edit that landed meanwhile
+    # is neither overwritten nor raced.
+    searched_by_id, lookup_stats = _search_for_enrichment(
+        batch, providers, wait=True, mode=opts.get("mode"), library_tracks=snapshot
+    )
+    with lib_lock(user_id):
+        return _apply_enrich_job_item(user_id, opts, track_ids, searched_by_id, lookup_stats)
+
+
+def _apply_enrich_job_item(user_id: str, opts: Dict[str, Any], track_ids: list, searched_by_id: Dict[str, Any], lookup_stats: Dict[str, Any]) -> Dict[str, Any]:
+    lib = load_lib(user_id)
+    counters: Dict[str, Any] = {
+        "scanned": 0,
+        "matched": 0,
+        "applied": 0,
+        "deferred": 0,
+        "album_lookups": lookup_stats["album_lookups"],
+        "track_lookups": lookup_stats["track_lookups"],
+        "provider_errors": {},
+    }
+    for tid in track_ids:
+        t = lib.get("tracks", {}).get(tid)
+        if not t:
+            continue
+        searched = searched_by_id.get(tid, {})
+        item = _enrich_library_track(
+            user_id,
+            lib,
+            t,
+            searched,
+            min_score=float(opts.get("min_score") or 0.78),
+            apply=bool(opts.get("apply")),
+        )
+        counters["scanned"] += 1
+        counters["matched"] += 1 if item["matched"] else 0
+        counters["applied"] += 1 if item["applied"] else 0
+        errs = searched.get("errors", [])
+        if not searched.get("candidates") and any(e.get("error") == RATE_LIMIT_DEFERRED for e in errs):
+            counters["deferred"] += 1
+        for e in errs:
+            per = counters["provider_errors"].setdefault(str(e.get("provider") or "unknown"), {})
+            per[str(e.get("error") or "unknown")] = per.get(str(e.get("error") or "unknown"), 0) + 1
+    if counters["applied"]:
+        lib["version"] = int(time.time())
+        save_lib(user_id, lib)
+    return counters
+
+
+ENRICH_JOBS = JobRunner("enrich", _enrich_job_item)
+ENRICH_JOB_MAX_TRACKS = max(1, int(os.getenv("RT_ENRICH_JOB_MAX_TRACKS", "20000") or "20000"))
+ENRICH_JOB_GROUP_MAX = max(1, int(os.getenv("RT_ENRICH_JOB_GROUP_MAX", "40") or "40"))
+
+
+@router.post("/metadata/enrich-jobs/{user_id}")
+def create_enrich_job(user_id: str, payload: MetadataEnrichJobPayload):
+    """
+    Queue background enrichment and return immediately. Tracks are grouped by
+    album (one job item per album in album mode) so release lookups are shared;
+    progress and per-provider error counts are persisted and survive restarts.
+    """
+    lib = load_lib(user_id)
+    all_tracks = lib.get("tracks") or {}
+    requested = [str(tid) for tid in (payload.track_ids or []) if str(tid or "").strip()]
+    if requested:
+        tracks = [all_tracks[tid] for tid in requested if tid in all_tracks]
+    else:
+        tracks = sorted(all_tracks.values(), key=lambda t: int(t.get("metadata_quality") or 0))
+        if payload.max_quality is not None:
+            tracks = [t for t in tracks if int(t.get("metadata_quality") or 0) < int(payload.max_quality)]
+    tracks = tracks[: max(1, min(int(payload.limit or 500), ENRICH_JOB_MAX_TRACKS))]
+    if not tracks:
+        raise HTTPException(status_code=400, detail="No tracks to enrich")
+
+    mode = str(payload.mode or METADATA_ENRICH_MODE).strip().lower()
+    items: list = []
+    album_items: Dict[tuple, list] = {}
+    for t in tracks:
+        tid = str(t.get("track_id"))
+        key = _album_group_key(t) if mode == "album" else None
+        if key is None:
+            items.append([tid])
+            continue
+        group = album_items.get(key)
+        if group is None or len(group) >= ENRICH_JOB_GROUP_MAX:
+            group = []
+            album_items[key] = group
+            items.append(group)
+        group.append(tid)
+
+    job = ENRICH_JOBS.create(
+        user_id,
+        items,
+        options={
+            "apply": bool(payload.apply),
+            "providers": payload.providers or ["musicbrainz", "discogs", "acoustid"],
+            "min_score": float(payload.min_score or 0.78),
+            "mode": mode,
+            "track_count": len(tracks),
+        },
+    )
+    return {"ok": True, "job": ENRICH_JOBS.get(user_id, job["job_id"])}
+
+
+@router.get("/metadata/enrich-jobs/{user_id}")
+def list_enrich_jobs(user_id: str):
+    return {"ok": True, "user_id": user_id, "jobs": ENRICH_JOBS.list(user_id)}
+
+
+@router.get("/metadata/enrich-jobs/{user_id}/{job_id}")
+def get_enrich_job(user_id: str, job_id: str):
+    job = ENRICH_JOBS.get(user_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job_id")
+    return {"ok": True, "job": job}
+
+
+@router.post("/metadata/enrich-jobs/{user_id}/{job_id}/{action}")
+def control_enrich_job(user_id: str, job_id: str, action: str):
+    if action not in JOB_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported action: {action}")
+    job = ENRICH_JOBS.control(user_id, job_id, action)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job_id")
+    return {"ok": True, "job": job}
+
+
+def _enrich_queue_batch(user_id: str, track_ids: list) -> Dict[str, str]:
+    """
+    Scheduler drain step: enrich and apply one batch of queued tracks. The
+    scheduler is a background worker, so it waits for rate-limit tokens and
+    that wait is what paces it; tracks every provider still deferred (a
+    server-side back-off, or a wait past RT_RATE_LIMIT_MAX_WAIT_SEC) are
+    reported "deferred" so they come back later.
+    """
+    providers_raw = str(os.getenv("RT_ENRICH_SCHEDULER_PROVIDERS", "musicbrainz,discogs,acoustid"))
+    providers = [p.strip().lower() for p in providers_raw.split(",") if p.strip()] or ["musicbrainz", "discogs", "acoustid"]
+    try:
+        min_score = float(os.getenv("RT_ENRICH_SCHEDULER_MIN_SCORE", "0.78"))
+    except Exception:
+        min_score = 0.78
+    wanted, snapshot = _library_snapshot(user_id, track_ids)
+    outcomes: Dict[str, str] = {tid: "missing" for tid in track_ids if tid not in wanted}
+    batch = []
+    for tid in track_ids:
+        t = wanted.get(tid)
+        if t is None:
+            continue
+        if str(t.get("metadata_source") or "").lower().startswith("manual:") or t.get("auto_enrich_disabled"):
+            outcomes[tid] = "skipped"
+        else:
+            batch.append(t)
+    if not batch:
+        return outcomes
+    searched_by_id, _ = _search_for_enrichment(batch, providers, wait=True, library_tracks=snapshot)
+    with lib_lock(user_id):
+        applied = _apply_enrich_queue_batch(user_id, batch, searched_by_id, outcomes, min_score)
+    print(f"[enrich-queue] user={user_id} batch={len(track_ids)} applied={applied} outcomes={sorted(set(outcomes.values()))}")
+    return outcomes
+
+
+def _apply_enrich_queue_batch(user_id: str, batch: list, searched_by_id: Dict[str, Any], outcomes: Dict[str, str], min_score: float) -> int:
+    lib = load_lib(user_id)
+    applied = 0
+    for t in batch:
+        tid = str(t.get("track_id"))
+        cur = lib.get("tracks", {}).get(tid)
+        if not cur:
+            outcomes[tid] = "missing"
+            continue
+        searched = searched_by_id.get(tid, {})
+        item = _enrich_library_track(user_id, lib, cur, searched, min_score=min_score, apply=True, source="auto")
+        if item["applied"]:
+            outcomes[tid] = "applied"
+            applied += 1
+        elif item["matched"]:
+            outcomes[tid] = "matched"
+        elif not searched.get("candidates") and any(
+            e.get("error") == RATE_LIMIT_DEFERRED for e in searched.get("errors", [])
+        ):
+            outcomes[tid] = "deferred"
+        else:
+            outcomes[tid] = "unmatched"
+    if applied:
+        lib["version"] = int(time.time())
+        save_lib(user_id, lib)
+    return applied
+
+
+set_enrich_queue_processor(_enrich_queue_batch)
+
+
+@router.get("/metadata/enrich-queue/{user_id}")
+def get_enrich_queue(user_id: str, top: int = 20):
+    return {"ok": True, "user_id": user_id, **enrich_queue_stats(user_id, top=max(0, min(int(top or 0), 500)))}
+
+
+@router.post("/metadata/enrich-queue/{user_id}/rebuild")
+def rebuild_enrich_queue(user_id: str):
+    """Re-derive queue rows for the whole library (e.g. after enabling the scheduler)."""
+    lib = load_lib(user_id)
+    counts = enrich_queue_tracks(user_id, list((lib.get("tracks") or {}).values()), reason="rebuild")
+    return {"ok": True, "user_id": user_id, **counts, "queue": enrich_queue_stats(user_id, top=0)}
+
+
 # -------- agent announce/status --------
 @router.post("/agent/announce")
 def agent_announce(payload: AnnouncePayload):
@@ -1352,6 +2039,54 @@ def get_mobile_bootstrap(user_id: str):
     }
 
 
+# -------- artwork proxy --------
+def _artwork_proxy_path(url: Any, size: str = "medium") -> str:
+    """Cached/resized proxy path for a provider artwork URL; other URLs pass through."""
+    u = str(url or "").strip()
+    if not u or not ARTWORK_PROXY_ENABLED or not artwork_host_allowed(u):
+        return u
+    return f"/streamer/api/artwork?size={size}&url={quote(u, safe='')}"
+
+
+@router.get("/artwork")
+def artwork_proxy(request: Request, url: str, size: str = "medium", fmt: str = "auto"):
+    """
+    Fetch-once artwork proxy. Resolves `url` to its content-addressed original
+    and redirects to the immutable variant URL for `size` (thumb/medium/full)
+    in WebP or JPEG (negotiated from Accept unless `fmt` is given).
+    """
+    if not ARTWORK_PROXY_ENABLED:
+        raise HTTPException(status_code=404, detail="Artwork proxy disabled")
+    if size not in ARTWORK_VARIANT_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown size: {size}")
+    chosen = pick_artwork_format(fmt, request.headers.get("accept"))
+    try:
+        entry = resolve_artwork_original(url)
+    except ArtworkError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    target = str(request.url_for("artwork_variant", sha=entry["sha256"], name=f"{size}.{chosen}"))
+    headers = {"Cache-Control": "public, max-age=86400"}
+    if str(fmt or "auto").strip().lower() == "auto":
+        headers["Vary"] = "Accept"
+    return RedirectResponse(url=target, status_code=302, headers=headers)
+
+
+@router.get("/artwork/{sha}/{name}", name="artwork_variant")
+def artwork_variant(request: Request, sha: str, name: str):
+    variant, _, fmt = name.partition(".")
+    etag = f'"{sha}-{variant}-{fmt}"'
+    immutable = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=immutable)
+    try:
+        data, mime, cacheable = load_artwork_variant(sha, variant, fmt)
+    except ArtworkError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if not cacheable:
+        return Response(content=data, media_type=mime, headers={"Cache-Control": "public, max-age=60"})
+    return Response(content=data, media_type=mime, headers=immutable)
+
+
 @router.get("/mobile/track/{user_id}/{track_id}")
 def get_mobile_track_detail(user_id: str, track_id: str):
     lib = load_lib(user_id)
@@ -1384,6 +2119,9 @@ def get_mobile_track_detail(user_id: str, track_id: str):
         "artwork_urls": art_urls,
         "artist_image_url": str((artist_urls[0] if artist_urls else "") or ""),
         "artist_image_urls": artist_urls,
+        "artwork_thumb_url": _artwork_proxy_path(t.get("artwork_url") or (art_urls[0] if art_urls else ""), "thumb"),
+        "artwork_medium_url": _artwork_proxy_path(t.get("artwork_url") or (art_urls[0] if art_urls else ""), "medium"),
+        "artist_image_thumb_url": _artwork_proxy_path(artist_urls[0] if artist_urls else "", "thumb"),
         "artist_bio": str(t.get("artist_bio") or ""),
         "album_bio": str(t.get("album_bio") or ""),
         "playability_status": str(t.get("playability_status") or ""),
@@ -1630,13 +2368,163 @@ def delete_playlist(user_id: str, playlist_id: str):
     return {"ok": True}
 
 # -------- submit scan --------
+def _auto_enrich_cooldown_sec() -> int:
+    try:
+        auto_cooldown_sec = int(os.getenv("RT_AUTO_ENRICH_COOLDOWN_SEC", "43200"))
+    except Exception:
+        auto_cooldown_sec = 43200
+    return max(300, min(auto_cooldown_sec, 86400 * 7))
+
+
+def _begin_scan_session(lib: Dict[str, Any], session_ver: int, replace: bool) -> int:
+    """
+    Return the scan generation this batch's tracks are tagged with.
+
+    replace=True no longer clears the library: it opens a mark-and-sweep
+    generation (once per library_version, however many batches carry it) and
+    POST /scan-complete later drops the tracks that scan did not tag. The
+    library stays complete in the meantime, and a scan that never finishes
+    removes nothing. Incremental batches landing while a generation is open
+    join it, since their files exist too.
+    """
+    if replace and session_ver not in {lib.get("_sweep_gen"), lib.get("_swept_gen")}:
+        lib["_sweep_gen"] = session_ver
+    return int(lib.get("_sweep_gen") or session_ver)
+
+
+# Filled in by the agent after the scan (/scan-fingerprints), so not part of what a scan "saw".
+_LATE_SCAN_FIELDS = ("acoustid_fingerprint", "acoustid_duration")
+
+
+def _scan_signature(d: Dict[str, Any]) -> str:
+    core = {k: v for k, v in d.items() if k not in _LATE_SCAN_FIELDS}
+    return hashlib.sha1(json.dumps(core, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _auto_enrich_due(
+    existing: Dict[str, Any],
+    d: Dict[str, Any],
+    *,
+    changed_key_fields: bool,
+    now_ts: int,
+    auto_cooldown_sec: int,
+) -> bool:
+    lacks_rich_meta = not _has_rich_media(d)
+    try:
+        last_attempt_ts = int(existing.get("_auto_enrich_ts") or 0)
+    except Exception:
+        last_attempt_ts = 0
+    cooldown_ok = (now_ts - last_attempt_ts) >= auto_cooldown_sec
+    return (
+        lacks_rich_meta
+        and not bool(d.get("auto_enrich_disabled"))
+        and not bool(d.get("is_hidden"))
+        and (not last_attempt_ts or cooldown_ok or changed_key_fields)
+    )
+
+
+def _ingest_scan_track(
+    user_id: str,
+    tracks: Dict[str, Any],
+    d: Dict[str, Any],
+    *,
+    seed_enabled: bool,
+    now_ts: int,
+    auto_cooldown_sec: int,
+    scan_gen: int,
+) -> tuple[Dict[str, Any], bool, bool]:
+    """
+    Merge one scanned track into `tracks` and return (track, health_due, auto_enrich_due).
+    Shared by the batch and streaming ingest endpoints.
+
+    The track is tagged with `scan_gen` for mark-and-sweep. A track the agent
+    reports exactly as last time keeps its stored entry as is, so a full
+    rescan does not rebuild every entry's derived fields; a fingerprint it
+    now carries is merged in without a rebuild.
+    """
+    sig = _scan_signature(d)
+    existing = tracks.get(d["track_id"]) or {}
+    if existing.get("_scan_sig") == sig:
+        existing["_scan_gen"] = scan_gen
+        for k in _LATE_SCAN_FIELDS:
+            if d.get(k) is not None:
+                existing[k] = d[k]
+        auto_due = _auto_enrich_due(
+            existing, existing, changed_key_fields=False, now_ts=now_ts, auto_cooldown_sec=auto_cooldown_sec
+        )
+        return existing, False, auto_due
+    # Persist scanner-origin core fields so bad enrichments can be rolled back later.
+    for fld in ("title", "artist", "album", "genre", "year"):
+        d[f"_scan_{fld}"] = d.get(fld)
+    if d.get("rel_path"):
+        d["rel_path"] = normalize_rel_path(d["rel_path"])
+    d = _apply_metadata_library_patch(d, user_id)
+    d.update(enrich_track_metadata(d))
+    seed = db_find_metadata_seed(user_id, d) if seed_enabled else None
+    seed_applied = False
+    if seed:
+        d = _apply_seed_metadata(d, seed)
+        if any(seed.get(k) and d.get(k) == seed.get(k) for k in ("artwork_url", "artist_bio", "album_bio")):
+            seed_applied = True
+        d.update(enrich_track_metadata(d))
+    # Preserve internal enrichment markers across rescans.
+    if existing.get("_auto_enrich_ts"):
+        d["_auto_enrich_ts"] = existing.get("_auto_enrich_ts")
+    if existing.get("metadata_source") and not d.get("metadata_source"):
+        d["metadata_source"] = existing.get("metadata_source")
+    if existing.get("metadata_source_score") is not None and d.get("metadata_source_score") is None:
+        d["metadata_source_score"] = existing.get("metadata_source_score")
+    if existing.get("metadata_source_updated_at") and not d.get("metadata_source_updated_at"):
+        d["metadata_source_updated_at"] = existing.get("metadata_source_updated_at")
+    if existing.get("auto_enrich_disabled"):
+        d["auto_enrich_disabled"] = True
+    if existing.get("is_hidden"):
+        d["is_hidden"] = True
+        if existing.get("hidden_at"):
+            d["hidden_at"] = existing.get("hidden_at")
+        if existing.get("hidden_reason"):
+            d["hidden_reason"] = existing.get("hidden_reason")
+    if seed_applied:
+        d["metadata_source"] = "seed:db"
+        d["metadata_source_score"] = 1.0
+    d["_scan_sig"] = sig
+    d["_scan_gen"] = scan_gen
+    tracks[d["track_id"]] = d
+    health_due = not existing or any(existing.get(k) != d.get(k) for k in ("file_size", "mtime", "rel_path"))
+    # Incremental enrichment target: new/changed tracks still missing rich media metadata.
+    changed_key_fields = any(
+        str(existing.get(k) or "").strip() != str(d.get(k) or "").strip()
+        for k in ("title", "artist", "album", "rel_path")
+    )
+    auto_due = _auto_enrich_due(
+        existing, d, changed_key_fields=changed_key_fields, now_ts=now_ts, auto_cooldown_sec=auto_cooldown_sec
+    )
+    return d, health_due, auto_due
+
+
+def _commit_scan_rows(user_id: str, lib: Dict[str, Any], db_rows: list, health_candidates: list[str]):
+    save_lib(user_id, lib)
+    db_upsert_tracks(user_id, db_rows)
+    db_upsert_track_sources(user_id, db_rows)
+    if HEALTH_JOB_ON_SCAN and health_candidates:
+        # New/changed files feed one rolling per-user job; unchanged ones are skipped by the worker.
+        HEALTH_JOBS.create(user_id, health_candidates, merge_key="scan")
+
+
 @router.post("/submit-scan")
 def submit_scan(payload: ScanPayload):
     """
     Idempotent replace:
-      - If replace=True AND we haven't cleared for this library_version, clear once and remember it.
+      - replace=True opens one mark-and-sweep generation per library_version;
+        POST /scan-complete removes the tracks the scan did not send.
       - Normalize rel_path for every incoming track.
     """
+    # One writer per library at a time (background enrichment applies under the same lock).
+    with lib_lock(payload.user_id):
+        return _submit_scan(payload)
+
+
+def _submit_scan(payload: ScanPayload):
     lib = load_lib(payload.user_id)
     tracks = lib["tracks"]
     batch_size = len(payload.library or [])
@@ -1645,83 +2533,28 @@ def submit_scan(payload: ScanPayload):
     skip_hot_path_enrich = ingest_write_only and bulk_scan_payload
 
     session_ver = int(payload.library_version or int(time.time()))
-    if payload.replace and lib.get("_cleared_for") != session_ver:
-        tracks.clear()
-        lib["_cleared_for"] = session_ver
-        db_mark_all_track_sources_unavailable(payload.user_id)
+    scan_gen = _begin_scan_session(lib, session_ver, bool(payload.replace))
 
     db_rows = []
     auto_enrich_candidates: list[str] = []
-    try:
-        auto_cooldown_sec = int(os.getenv("RT_AUTO_ENRICH_COOLDOWN_SEC", "43200"))
-    except Exception:
-        auto_cooldown_sec = 43200
-    auto_cooldown_sec = max(300, min(auto_cooldown_sec, 86400 * 7))
+    health_candidates: list[str] = []
+    auto_cooldown_sec = _auto_enrich_cooldown_sec()
     now_ts = int(time.time())
     seed_config_enabled = str(os.getenv("RT_DB_SEED_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
     seed_enabled = seed_config_enabled and not skip_hot_path_enrich
     for t in payload.library:
-        d = t.model_dump()
-        # Persist scanner-origin core fields so bad enrichments can be rolled back later.
-        for fld in ("title", "artist", "album", "genre", "year"):
-            d[f"_scan_{fld}"] = d.get(fld)
-        if d.get("rel_path"):
-            d["rel_path"] = normalize_rel_path(d["rel_path"])
-        d = _apply_metadata_library_patch(d, payload.user_id)
-        d.update(enrich_track_metadata(d))
-        seed = db_find_metadata_seed(payload.user_id, d) if seed_enabled else None
-        seed_applied = False
-        if seed:
-            d = _apply_seed_metadata(d, seed)
-            if any(seed.get(k) and d.get(k) == seed.get(k) for k in ("artwork_url", "artist_bio", "album_bio")):
-                seed_applied = True
-            d.update(enrich_track_metadata(d))
-        existing = tracks.get(d["track_id"]) or {}
-        # Preserve internal enrichment markers across rescans.
-        if existing.get("_auto_enrich_ts"):
-            d["_auto_enrich_ts"] = existing.get("_auto_enrich_ts")
-        if existing.get("metadata_source") and not d.get("metadata_source"):
-            d["metadata_source"] = existing.get("metadata_source")
-        if existing.get("metadata_source_score") is not None and d.get("metadata_source_score") is None:
-            d["metadata_source_score"] = existing.get("metadata_source_score")
-        if existing.get("metadata_source_updated_at") and not d.get("metadata_source_updated_at"):
-            d["metadata_source_updated_at"] = existing.get("metadata_source_updated_at")
-        if existing.get("auto_enrich_disabled"):
-            d["auto_enrich_disabled"] = True
-        if existing.get("is_hidden"):
-            d["is_hidden"] = True
-            if existing.get("hidden_at"):
-                d["hidden_at"] = existing.get("hidden_at")
-            if existing.get("hidden_reason"):
-                d["hidden_reason"] = existing.get("hidden_reason")
-        if seed_applied:
-            d["metadata_source"] = "seed:db"
-            d["metadata_source_score"] = 1.0
-        tracks[d["track_id"]] = d
-        db_rows.append(d)
-        # Incremental enrichment target: new/changed tracks still missing rich media metadata.
-        changed_key_fields = any(
-            str(existing.get(k) or "").strip() != str(d.get(k) or "").strip()
-            for k in ("title", "artist", "album", "rel_path")
+        d, health_due, auto_due = _ingest_scan_track(
+            payload.user_id, tracks, t.model_dump(),
+            seed_enabled=seed_enabled, now_ts=now_ts, auto_cooldown_sec=auto_cooldown_sec, scan_gen=scan_gen,
         )
-        lacks_rich_meta = not _has_rich_media(d)
-        try:
-            last_attempt_ts = int(existing.get("_auto_enrich_ts") or 0)
-        except Exception:
-            last_attempt_ts = 0
-        cooldown_ok = (now_ts - last_attempt_ts) >= auto_cooldown_sec
-        if (
-            lacks_rich_meta
-            and not bool(d.get("auto_enrich_disabled"))
-            and not bool(d.get("is_hidden"))
-            and (not last_attempt_ts or cooldown_ok or changed_key_fields)
-        ):
+        db_rows.append(d)
+        if health_due:
+            health_candidates.append(str(d["track_id"]))
+        if auto_due:
             auto_enrich_candidates.append(str(d["track_id"]))
 
     lib["version"] = session_ver
-    save_lib(payload.user_id, lib)
-    db_upsert_tracks(payload.user_id, db_rows)
-    db_upsert_track_sources(payload.user_id, db_rows)
+    _commit_scan_rows(payload.user_id, lib, db_rows, health_candidates)
 
     # Keep bulk ingest write-only by default. Enrichment should run after scan completion,
     # not inside the submit-scan request path where it causes timeouts and retry churn.
@@ -1736,6 +2569,8 @@ def submit_scan(payload: ScanPayload):
     auto_stage2_scanned = 0
     auto_stage2_matched = 0
     auto_stage2_applied = 0
+    auto_deferred = 0
+    auto_lookup_stats: Dict[str, Any] = {}
     provider_raw = str(os.getenv("RT_AUTO_ENRICH_PROVIDERS", "musicbrainz,discogs,acoustid"))
     auto_providers = [p.strip().lower() for p in provider_raw.split(",") if p.strip()]
     if not auto_providers:
@@ -1764,10 +2599,10 @@ def submit_scan(payload: ScanPayload):
         stage1_ids = auto_enrich_candidates[:auto_limit]
         stage2_candidates: list[str] = []
 
-        def _attempt_auto_apply(tid: str, providers: list[str], stage: str) -> bool:
+        def _attempt_auto_apply(tid: str, providers: list[str], stage: str, searched: Optional[Dict[str, Any]] = None) -> bool:
             nonlocal auto_scanned, auto_matched, auto_applied
             nonlocal auto_stage1_scanned, auto_stage1_matched, auto_stage1_applied
-            nonlocal auto_stage2_scanned, auto_stage2_matched, auto_stage2_applied
+            nonlocal auto_stage2_scanned, auto_stage2_matched, auto_stage2_applied, auto_deferred
             tcur = tracks.get(tid)
             if not tcur:
                 return False
@@ -1776,10 +2611,20 @@ def submit_scan(payload: ScanPayload):
                 auto_stage1_scanned += 1
             else:
                 auto_stage2_scanned += 1
+            prev_attempt_ts = tcur.get("_auto_enrich_ts")
             tcur["_auto_enrich_ts"] = now_ts
-            searched = search_candidates(tcur, providers=providers, include_errors=True)
+            # No-wait lookups on the ingest path: at most a short follow-up wait
+            # (RT_RATE_LIMIT_FOLLOWUP_MAX_WAIT_SEC) per request; deferred tracks stay eligible.
+            if searched is None:
+                searched = search_candidates(tcur, providers=providers, include_errors=True, wait=False)
             candidates = searched.get("candidates", [])
             if not candidates:
+                if any(e.get("error") == RATE_LIMIT_DEFERRED for e in searched.get("errors", [])):
+                    auto_deferred += 1
+                    if prev_attempt_ts:
+                        tcur["_auto_enrich_ts"] = prev_attempt_ts
+                    else:
+                        tcur.pop("_auto_enrich_ts", None)
                 return False
             best = candidates[0]
             db_insert_provider_snapshot(tid, best)
@@ -1796,6 +2641,7 @@ def submit_scan(payload: ScanPayload):
                 auto_stage1_matched += 1
             else:
                 auto_stage2_matched += 1
+            finalize_artwork(best)
             patch = best.get("patch") or {}
             patched = dict(tcur)
             patched.update(patch)
@@ -1815,9 +2661,17 @@ def submit_scan(payload: ScanPayload):
                 return True
             return True
 
+        stage1_searched: Dict[str, Dict[str, Any]] = {}
+        if stage1_providers:
+            stage1_searched, auto_lookup_stats = _search_for_enrichment(
+                [tracks[tid] for tid in stage1_ids if tid in tracks],
+                stage1_providers,
+                wait=False,
+                library_tracks=tracks,
+            )
         for tid in stage1_ids:
             if stage1_providers:
-                ok = _attempt_auto_apply(tid, stage1_providers, "stage1")
+                ok = _attempt_auto_apply(tid, stage1_providers, "stage1", searched=stage1_searched.get(tid))
             else:
                 ok = False
             if not ok and stage2_enabled:
@@ -1829,6 +2683,13 @@ def submit_scan(payload: ScanPayload):
         if auto_applied > 0:
             save_lib(payload.user_id, lib)
 
+    enrich_queue_counts: Dict[str, int] = {}
+    if ENRICH_SCHEDULER_ENABLED and auto_enrich_candidates:
+        # Whatever the hot path did not finish is left to the background scheduler.
+        enrich_queue_counts = enrich_queue_tracks(
+            payload.user_id, [tracks[tid] for tid in auto_enrich_candidates if tid in tracks], reason="scan"
+        )
+
     preview = []
     for i, (_, v) in enumerate(tracks.items()):
         if i >= 3:
@@ -1849,6 +2710,8 @@ def submit_scan(payload: ScanPayload):
             "scanned": auto_scanned,
             "matched": auto_matched,
             "applied": auto_applied,
+            "deferred": auto_deferred,
+            "lookups": auto_lookup_stats,
             "stage1": {
                 "providers": [p for p in auto_providers if p != "acoustid"],
                 "scanned": auto_stage1_scanned,
@@ -1863,11 +2726,432 @@ def submit_scan(payload: ScanPayload):
             },
             "seed_enabled": seed_enabled,
             "seed_config_enabled": seed_config_enabled,
+            "queued": enrich_queue_counts,
         },
         "ingest_mode": "write-only" if skip_hot_path_enrich else "inline-enrich",
         "preview": preview
     }
 
+async def _iter_ndjson_lines(request: Request):
+    """Yield raw NDJSON lines as the body arrives (already inflated by DecompressRequestMiddleware)."""
+    total = 0
+    buf = b""
+    async for chunk in request.stream():
+        total += len(chunk)
+        if total > SCAN_STREAM_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Scan stream too large")
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        if len(buf) > SCAN_STREAM_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail="Scan stream line too long")
+        for line in lines:
+            yield line
+    if buf:
+        yield buf
+
+
+def _scan_stream_session(lib: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+    return (lib.get("_ingest_sessions") or {}).get(session_id) or {}
+
+
+def _scan_stream_commit(user_id: str, lib: Dict[str, Any], session_id: str, session: Dict[str, Any], db_rows: list, health_candidates: list[str]):
+    """Persist one stream batch; the session ack is saved in the same library write as its tracks."""
+    now_ts = int(time.time())
+    sessions = {
+        sid: st for sid, st in (lib.get("_ingest_sessions") or {}).items()
+        if now_ts - int(st.get("updated_at") or 0) < SCAN_STREAM_SESSION_TTL_SEC
+    }
+    session["updated_at"] = now_ts
+    sessions[session_id] = dict(session)
+    lib["_ingest_sessions"] = sessions
+    _commit_scan_rows(user_id, lib, db_rows, health_candidates)
+
+
+@router.post("/submit-scan-stream")
+async def submit_scan_stream(
+    request: Request,
+    user_id: str,
+    library_version: Optional[int] = None,
+    replace: bool = False,
+    session_id: Optional[str] = None,
+):
+    """
+    Streaming scan ingest: one Track JSON object per line (NDJSON), optionally
+    gzip/zstd encoded and chunked. Tracks are merged as they arrive and
+    committed every RT_SCAN_STREAM_COMMIT_RECORDS records.
+
+    Each line may carry an increasing integer "seq" (default: its line number).
+    After every commit the session's acked_seq is stored with the tracks, so a
+    client that lost the connection asks GET /submit-scan-stream/{user_id}/{session_id}
+    and resends from acked_seq + 1; records at or below it are skipped. Acks only
+    apply to a session the client names: without session_id every request is a
+    fresh session, so uploads sharing a library_version never skip each other.
+    """
+    session_ver = int(library_version or int(time.time()))
+    session_id = str(session_id or "").strip()[:128] or f"v{session_ver}-{uuid.uuid4().hex[:12]}"
+
+    def _open_session():
+        # Opening the sweep generation writes the shared library entry.
+        with lib_lock(user_id):
+            lib = load_lib(user_id)
+            return lib, _begin_scan_session(lib, session_ver, replace), dict(_scan_stream_session(lib, session_id))
+
+    lib, scan_gen, session = await run_in_threadpool(_open_session)
+    tracks = lib["tracks"]
+    acked_seq = int(session.get("acked_seq") or 0)
+    session.setdefault("library_version", session_ver)
+    session.setdefault("started_at", int(time.time()))
+
+    seed_enabled = str(os.getenv("RT_DB_SEED_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+    # Bulk ingest stays write-only, as in /submit-scan.
+    if str(os.getenv("RT_SCAN_INGEST_WRITE_ONLY", "1")).strip().lower() not in {"0", "false", "off", "no"}:
+        seed_enabled = False
+    auto_cooldown_sec = _auto_enrich_cooldown_sec()
+    now_ts = int(time.time())
+
+    received = skipped = 0
+    rejected: list[Dict[str, Any]] = []
+    rejected_count = 0
+    acks: list[int] = []
+    db_rows: list = []
+    health_candidates: list[str] = []
+    auto_enrich_candidates: list[str] = []
+    pending_seq = acked_seq
+
+    def _apply_batch(rows: list) -> list:
+        applied = []
+        for d in rows:
+            d, health_due, auto_due = _ingest_scan_track(
+                user_id, tracks, d,
+                seed_enabled=seed_enabled, now_ts=now_ts, auto_cooldown_sec=auto_cooldown_sec, scan_gen=scan_gen,
+            )
+            applied.append(d)
+            if health_due:
+                health_candidates.append(str(d["track_id"]))
+            if auto_due:
+                auto_enrich_candidates.append(str(d["track_id"]))
+        return applied
+
+    def _apply_and_commit(rows: list):
+        with lib_lock(user_id):
+            applied = _apply_batch(rows)
+            lib["version"] = session_ver
+            session["acked_seq"] = pending_seq
+            session["committed"] = int(session.get("committed") or 0) + len(applied)
+            _scan_stream_commit(user_id, lib, session_id, session, applied, health_candidates)
+
+    async def _flush():
+        nonlocal db_rows, health_candidates
+        await run_in_threadpool(_apply_and_commit, db_rows)
+        acks.append(pending_seq)
+        db_rows = []
+        health_candidates = []
+
+    line_no = 0
+    async for raw in _iter_ndjson_lines(request):
+        line_no += 1
+        raw = raw.strip()
+        if not raw:
+            continue
+        received += 1
+        try:
+            obj = json.loads(raw)
+            if not isinstance(obj, dict):
+                raise ValueError("expected a JSON object")
+            seq = int(obj.pop("seq", line_no))
+            if seq <= acked_seq:
+                skipped += 1
+                continue
+            d = Track.model_validate(obj).model_dump()
+        except Exception as e:
+            rejected_count += 1
+            if len(rejected) < 20:
+                rejected.append({"line": line_no, "error": str(e)[:200]})
+            continue
+        db_rows.append(d)
+        pending_seq = max(pending_seq, seq)
+        if len(db_rows) >= SCAN_STREAM_COMMIT_RECORDS:
+            await _flush()
+    # Final commit; an empty stream still persists a replace=True generation.
+    if db_rows or pending_seq > int(session.get("acked_seq") or 0) or not acks:
+        await _flush()
+
+    enrich_queue_counts: Dict[str, int] = {}
+    if ENRICH_SCHEDULER_ENABLED and auto_enrich_candidates:
+        enrich_queue_counts = await run_in_threadpool(
+            enrich_queue_tracks, user_id, [tracks[tid] for tid in auto_enrich_candidates if tid in tracks], "scan"
+        )
+    print(
+        f"[scan] stream user={user_id} session={session_id} received={received} "
+        f"committed={int(session.get('committed') or 0)} skipped={skipped} rejected={rejected_count} acks={len(acks)}"
+    )
+    return {
+        "ok": True,
+        "user_id": user_id,
+        "session_id": session_id,
+        "count": len(tracks),
+        "version": lib["version"],
+        "received": received,
+        "skipped": skipped,
+        "rejected": rejected_count,
+        "rejected_samples": rejected,
+        "acks": acks,
+        "acked_seq": int(session.get("acked_seq") or 0),
+        "committed": int(session.get("committed") or 0),
+        "auto_enrich": {"candidates": len(auto_enrich_candidates), "queued": enrich_queue_counts},
+        "ingest_mode": "stream",
+    }
+
+
+@router.get("/submit-scan-stream/{user_id}/{session_id}")
+def submit_scan_stream_status(user_id: str, session_id: str):
+    """Resume point of a streaming ingest session (acked_seq 0 = nothing committed yet)."""
+    lib = load_lib(user_id)
+    session = _scan_stream_session(lib, session_id)
+    return {
+        "user_id": user_id,
+        "session_id": session_id,
+        "known": bool(session),
+        "acked_seq": int(session.get("acked_seq") or 0),
+        "committed": int(session.get("committed") or 0),
+        "library_version": session.get("library_version"),
+        "updated_at": session.get("updated_at"),
+    }
+
+
+def _scan_batch_key(payload: ScanPayload) -> str:
+    """Content-derived idempotency key for agents that do not send Idempotency-Key."""
+    h = hashlib.sha256()
+    h.update(f"{payload.user_id}|{payload.library_version}|{bool(payload.replace)}".encode("utf-8"))
+    for t in payload.library:
+        h.update(f"|{t.track_id}:{t.rel_path}:{t.file_size}:{t.mtime}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _apply_queued_scan(user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    result = submit_scan(ScanPayload.model_validate(payload))
+    result.pop("preview", None)
+    return result
+
+
+set_scan_queue_processor(_apply_queued_scan)
+
+
+@router.post("/scan-batches", status_code=202)
+def submit_scan_batch(payload: ScanPayload, request: Request, response: Response):
+    """
+    Asynchronous /submit-scan: validate, store durably and return 202 right away.
+    The batch is applied in order with the user's other batches; poll
+    GET /scan-batches/{user_id}/{batch_id}. Resending with the same
+    Idempotency-Key (default: a hash of the batch) returns the original batch.
+    """
+    if not SCAN_QUEUE_ENABLED:
+        raise HTTPException(status_code=404, detail="Async scan ingest disabled")
+    idem_key = str(request.headers.get("idempotency-key") or "").strip()[:200] or _scan_batch_key(payload)
+    batch = enqueue_scan_batch(payload.user_id, idem_key, payload.model_dump(exclude_none=True))
+    if batch is None:
+        raise HTTPException(status_code=503, detail="Scan queue unavailable")
+    if batch["status"] in {"done", "failed"}:
+        response.status_code = 200
+    return {"ok": True, **batch}
+
+
+@router.get("/scan-batches/{user_id}/{batch_id}")
+def get_scan_batch(user_id: str, batch_id: str):
+    batch = scan_batch_status(user_id, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Unknown batch_id")
+    return {"ok": True, **batch}
+
+
+@router.get("/scan-batches/{user_id}")
+def get_scan_batches(user_id: str, recent: int = 20):
+    return {"ok": True, "user_id": user_id, **scan_queue_stats(user_id, recent=max(0, min(int(recent or 0), 200)))}
+
+
+@router.post("/scan-complete")
+def scan_complete(payload: ScanCompletePayload):
+    """
+    Finish a replace scan: drop every track not tagged with its generation
+    (library_version), in one pass. Calling it again for a swept version is a no-op.
+    """
+    gen = int(payload.library_version)
+    with lib_lock(payload.user_id):
+        lib = load_lib(payload.user_id)
+        tracks = lib["tracks"]
+        if lib.get("_sweep_gen") != gen:
+            if lib.get("_swept_gen") == gen:
+                return {"ok": True, "user_id": payload.user_id, "library_version": gen, "removed": 0, "stale": 0,
+                        "already_swept": True, "count": len(tracks), "version": lib.get("version")}
+            raise HTTPException(status_code=409, detail="No open replace scan for this library_version")
+        stale = [tid for tid, t in tracks.items() if t.get("_scan_gen") != gen]
+        source_paths = []
+        if not payload.dry_run:
+            source_paths = [tracks[tid].get("rel_path") or tracks[tid].get("path") for tid in stale]
+            for tid in stale:
+                tracks.pop(tid, None)
+            lib.pop("_sweep_gen", None)
+            lib["_swept_gen"] = gen
+            lib["version"] = int(time.time())
+            save_lib(payload.user_id, lib)
+        count, version = len(tracks), lib.get("version")
+    if not payload.dry_run:
+        if source_paths:
+            db_mark_track_sources_unavailable(payload.user_id, [p for p in source_paths if p])
+        if stale and ENRICH_SCHEDULER_ENABLED:
+            enrich_queue_forget(payload.user_id, stale)
+        print(f"[scan] sweep user={payload.user_id} gen={gen} removed={len(stale)} kept={count}")
+    return {
+        "ok": True,
+        "user_id": payload.user_id,
+        "library_version": gen,
+        "removed": 0 if payload.dry_run else len(stale),
+        "stale": len(stale),
+        "count": count,
+        "version": version,
+    }
+
+
+@router.post("/scan-remove")
+def scan_remove(payload: ScanRemovePayload):
+    """
+    Incremental removal for the agent's watch mode: drop the tracks stored under
+    the given file rel_paths or below the given dirs, except the track_ids the
+    agent just uploaded for them (a changed file gets a new track_id, so this
+    also retires its previous entry).
+    """
+    paths = {normalize_rel_path(p) for p in payload.paths if p}
+    prefixes = tuple(normalize_rel_path(d).rstrip("/") + "/" for d in payload.dirs if d)
+    keep = set(payload.keep)
+    with lib_lock(payload.user_id):
+        lib = load_lib(payload.user_id)
+        tracks = lib["tracks"]
+        stale = []
+        for tid, t in tracks.items():
+            rel = normalize_rel_path(t.get("rel_path") or "")
+            if tid not in keep and rel and (rel in paths or (prefixes and rel.startswith(prefixes))):
+                stale.append(tid)
+        source_paths = []
+        if stale and not payload.dry_run:
+            # A changed file keeps its path under the new track_id; only truly gone files lose their source.
+            live = {tracks[tid].get("rel_path") for tid in keep if tid in tracks}
+            source_paths = [tracks[tid].get("rel_path") or tracks[tid].get("path") for tid in stale]
+            source_paths = [p for p in source_paths if p and p not in live]
+            for tid in stale:
+                tracks.pop(tid, None)
+            lib["version"] = int(time.time())
+            save_lib(payload.user_id, lib)
+        count, version = len(tracks), lib.get("version")
+    if stale and not payload.dry_run:
+        db_mark_track_sources_unavailable(payload.user_id, source_paths)
+        if ENRICH_SCHEDULER_ENABLED:
+            enrich_queue_forget(payload.user_id, stale)
+        print(f"[scan] remove user={payload.user_id} paths={len(paths)} dirs={len(prefixes)} removed={len(stale)}")
+    return {
+        "ok": True,
+        "user_id": payload.user_id,
+        "removed": 0 if payload.dry_run else len(stale),
+        "stale": len(stale),
+        "count": count,
+        "version": version,
+    }
+
+
+@router.post("/scan-fingerprints")
+def scan_fingerprints(payload: ScanFingerprintsPayload):
+    """
+    Late Chromaprint results from the agent's background fingerprint queue, set
+    on tracks already in the library. track_ids not known yet (their scan batch
+    may still be queued) come back in "missing" for the agent to retry.
+    """
+    updated = []
+    missing = []
+    with lib_lock(payload.user_id):
+        lib = load_lib(payload.user_id)
+        tracks = lib["tracks"]
+        for item in payload.items:
+            track = tracks.get(item.track_id)
+            if not track:
+                missing.append(item.track_id)
+                continue
+            if (track.get("acoustid_fingerprint"), track.get("acoustid_duration")) == (item.acoustid_fingerprint, item.acoustid_duration):
+                continue
+            track["acoustid_fingerprint"] = item.acoustid_fingerprint
+            track["acoustid_duration"] = item.acoustid_duration
+            updated.append(dict(track))
+        if updated:
+            lib["version"] = int(time.time())
+            save_lib(payload.user_id, lib)
+        version = lib.get("version")
+    if updated:
+        db_upsert_tracks(payload.user_id, updated)
+    return {
+        "ok": True,
+        "user_id": payload.user_id,
+        "updated": len(updated),
+        "missing": missing,
+        "version": version,
+    }
+
+
+@router.post("/scan-delta")
+def scan_delta(payload: ScanDeltaPayload):
+    """
+    Delta-sync negotiation for rescans (see scan_manifest). The agent starts with
+    {"dirs": {"": root_digest}}; each reply names the directories to expand next
+    round (their file listings plus child digests) and the rel_paths to upload
+    through /submit-scan-stream with replace=false. Tracks whose files are gone
+    are removed here, so no replace/clear pass is needed; changed files keep
+    their current entries, listed in "replaced", until the agent has uploaded
+    the new ones and retires the old ones through /scan-remove with keep.
+    """
+    with lib_lock(payload.user_id):
+        lib = load_lib(payload.user_id)
+        tracks = lib["tracks"]
+        diff = diff_manifest(library_manifest(tracks), payload.dirs or {}, payload.files or {})
+        stale = [tid for tid in diff["stale"] if tid in tracks]
+        source_paths = []
+        if stale and not payload.dry_run:
+            source_paths = [tracks[tid].get("rel_path") or tracks[tid].get("path") for tid in stale]
+            for tid in stale:
+                tracks.pop(tid, None)
+            lib["version"] = int(time.time())
+            save_lib(payload.user_id, lib)
+            # An old entry retired next to its current upload shares its path, which keeps its source.
+            live = {t.get("rel_path") for t in tracks.values()}
+            source_paths = [p for p in source_paths if p and p not in live]
+        count, version = len(tracks), lib.get("version")
+    if stale and not payload.dry_run:
+        if source_paths:
+            db_mark_track_sources_unavailable(payload.user_id, source_paths)
+        if ENRICH_SCHEDULER_ENABLED:
+            enrich_queue_forget(payload.user_id, stale)
+    return {
+        "ok": True,
+        "user_id": payload.user_id,
+        "changed": diff["changed"],
+        "missing": diff["missing"],
+        "need": diff["need"],
+        "replaced": diff["replaced"],
+        "removed": 0 if payload.dry_run else len(stale),
+        "stale": len(stale),
+        "count": count,
+        "version": version,
+    }
+
+
+def _note_playback(user_id: str, track_id: str, request: Request):
+    """Count a play for the enrichment queue: GETs from the start only, not seeks/HEADs."""
+    if not ENRICH_SCHEDULER_ENABLED or request.method != "GET":
+        return
+    client_range = str(request.headers.get("range") or "").strip().lower()
+    if client_range and not client_range.startswith("bytes=0-"):
+        return
+    if str(request.query_params.get("start") or "0").strip() not in {"", "0", "0.0"}:
+        return
+    enrich_queue_record_play(user_id, track_id)
+
+
 # -------- relay (GET/HEAD) --------
 @router.api_route("/relay/{user_id}/{track_id}", methods=["GET", "HEAD"])
 def relay(user_id: str, track_id: str, request: Request):
@@ -1883,6 +3167,7 @@ def relay(user_id: str, track_id: str, request: Request):
             target_url = f"{target_url}?{request.url.query}"
         return RedirectResponse(url=target_url, status_code=302)
 
+    _note_playback(user_id, track_id, request)
     url = build_stream_url(user_id, track)
     if not url:
         _mark_track_playability(user_id, track_id, ok=False, reason="no-base-url-or-rel-path")
@@ -2030,6 +3315,7 @@ def relay_mp3(user_id: str, track_id: str, request: Request):
     track = lib["tracks"].get(track_id)
     if not track:
         raise HTTPException(status_code=404, detail="Unknown track_id")
+    _note_playback(user_id, track_id, request)
 
     url = build_stream_url(user_id, track)
     if not url:
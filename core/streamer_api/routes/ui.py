@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 import json
+from ..artwork_cache import ALLOWED_HOSTS as ARTWORK_PROXY_HOSTS, ARTWORK_PROXY_ENABLED
 from ..storage import load_lib
 
 router = APIRouter(prefix="/api", tags=["ui"])
@@ -60,6 +61,7 @@ def player(user_id: str):
             "force_mp3": _track_needs_mp3_proxy(t),
         })
     tracks_json = json.dumps(tracks)
+    artwork_hosts_json = json.dumps(sorted(ARTWORK_PROXY_HOSTS) if ARTWORK_PROXY_ENABLED else [])
 
     html = f"""<!doctype html>
 <html>
@@ -241,6 +243,7 @@ const userId = "{user_id}";
 const LIBRARY_VERSION = "{lib['version']}";
 const API = (window.location.pathname.startsWith("/streamer/")) ? "/streamer/api" : "/api";
 const TRACKS = {tracks_json};
+const ARTWORK_PROXY_HOSTS = {artwork_hosts_json};
 const TRACK_BY_ID = Object.fromEntries(TRACKS.map(t => [t.track_id, t]));
 const ALBUM_STATE_KEY = "rt-album-enabled-" + userId;
 const ALBUM_OPEN_KEY = "rt-album-open-" + userId;
@@ -455,11 +458,20 @@ function upgradeImageUrl(url) {{
   return u;
 }}
 
+// Provider artwork goes through the server cache (resized, long-lived cache headers).
+function artProxy(url, size) {{
+  const u = String(url || "").trim();
+  let host = "";
+  try {{ host = new URL(u).hostname.toLowerCase(); }} catch (e) {{ return u; }}
+  if (!ARTWORK_PROXY_HOSTS.some(h => host === h || host.endsWith("." + h))) return u;
+  return API + "/artwork?size=" + size + "&url=" + encodeURIComponent(u);
+}}
+
 function selectMetaImage(url) {{
   const u = String(url || "").trim();
   const hero = document.getElementById("nowHeroImg");
   if (!hero || !u) return;
-  const candidate = upgradeImageUrl(u);
+  const candidate = artProxy(upgradeImageUrl(u), "full");
   hero.onerror = () => {{
     if (hero.src !== u) {{
       hero.onerror = null;
@@ -1554,7 +1566,7 @@ function renderNowMeta(m) {{
 
   const artwork = String(m?.artist_image_url || m?.artwork_url || "").trim();
   if (artwork) {{
-    hero.src = upgradeImageUrl(artwork);
+    hero.src = artProxy(upgradeImageUrl(artwork), "full");
     hero.style.display = "";
     hero.onerror = () => {{ hero.style.display = "none"; }};
   }} else {{
@@ -1590,7 +1602,7 @@ function renderNowMeta(m) {{
   urls.sort((a, b) => imageQualityScore(b) - imageQualityScore(a));
   if (urls.length) selectMetaImage(urls[0]);
   const thumbs = urls.slice(0, 12).map(u =>
-    '<img class="now-meta-thumb" src="' + escapeHtml(u) + '" data-url="' + escapeHtml(u) + '" loading="lazy" alt="More image" title="Preview image" onclick="selectMetaImage(this.dataset.url)" ondblclick="openMetaImage(this.dataset.url)">'
+    '<img class="now-meta-thumb" src="' + escapeHtml(artProxy(u, "thumb")) + '" data-url="' + escapeHtml(u) + '" loading="lazy" alt="More image" title="Preview image" onclick="selectMetaImage(this.dataset.url)" ondblclick="openMetaImage(this.dataset.url)">'
   ).join("");
   gallery.innerHTML = thumbs;
 }}
@@ -2565,7 +2577,7 @@ async function playIndex(i, opts = {{}}) {{
       }}
     }}
     if (detail && nowImg) {{
-      const src = String(detail.artwork_url || detail.artist_image_url || "").trim();
+      const src = String(detail.artwork_medium_url || detail.artwork_url || detail.artist_image_url || "").trim();
       if (src) {{
         nowImg.src = src;
         nowImg.style.display = "";
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Tuple
+from urllib.parse import unquote
+import hashlib
+
+# Delta-sync manifests: a Merkle-style digest per directory over its audio files
+# (name, size, mtime) and its subdirectories' digests. The thin agent computes
+# the same digests from disk (thin_agent._manifest_digests), so an unchanged
+# library is settled by comparing one root digest and only differing
+# directories are ever listed file by file.
+#
+# Paths are the raw (un-encoded) rel_path with "/" separators; the root
+# directory is "".
+
+
+def split_rel(rel: str) -> Tuple[str, str]:
+    if "/" in rel:
+        parent, name = rel.rsplit("/", 1)
+        return parent, name
+    return "", rel
+
+
+def raw_rel_path(rel: str) -> str:
+    """Stored rel_path (one URL-encoding level per segment) back to the agent's on-disk form."""
+    return "/".join(unquote(seg) for seg in str(rel or "").lstrip("/").split("/"))
+
+
+class Manifest:
+    """Directory tree of (name, size, mtime[, track_id]) entries with per-directory digests."""
+
+    def __init__(self):
+        self.files: Dict[str, List[Tuple[str, int, int, Any]]] = {}
+        self.children: Dict[str, set] = {"": set()}
+        self.digests: Dict[str, str] = {}
+
+    def add(self, rel: str, size: Any, mtime: Any, ref: Any = None):
+        parent, name = split_rel(rel)
+        self.files.setdefault(parent, []).append((name, int(size or 0), int(mtime or 0), ref))
+        while parent not in self.children:
+            self.children[parent] = set()
+            grand, _ = split_rel(parent)
+            self.children.setdefault(grand, set()).add(parent)
+            parent = grand
+
+    def finish(self) -> "Manifest":
+        # Deepest directories first so every child digest exists before its parent's.
+        for d in sorted(self.children, key=lambda p: -p.count("/") - (1 if p else 0)):
+            lines = [f"f\t{name}\t{size}\t{mtime}" for name, size, mtime, _ in self.files.get(d, [])]
+            lines += [f"d\t{split_rel(c)[1]}\t{self.digests[c]}" for c in self.children.get(d, ())]
+            self.digests[d] = hashlib.sha1("\n".join(sorted(lines)).encode("utf-8")).hexdigest()
+        return self
+
+    def subtree(self, d: str) -> Iterable[str]:
+        stack = [d]
+        while stack:
+            cur = stack.pop()
+            yield cur
+            stack.extend(self.children.get(cur, ()))
+
+
+def library_manifest(tracks: Dict[str, Any]) -> Manifest:
+    manifest = Manifest()
+    for tid, t in tracks.items():
+        rel = t.get("rel_path")
+        if rel:
+            manifest.add(raw_rel_path(rel), t.get("file_size"), t.get("mtime"), tid)
+    return manifest.finish()
+
+
+def diff_manifest(
+    manifest: Manifest,
+    dirs: Dict[str, str],
+    files: Dict[str, List[List[Any]]],
+) -> Dict[str, Any]:
+    """
+    Compare one round of the agent's manifest with the library.
+
+    `dirs` maps directories to the agent's digests; `files` lists the
+    (name, size, mtime) entries of directories the agent expanded, whose
+    subdirectories must all appear in `dirs`. Returns the directories to expand
+    next (`changed`), those the server has nothing under (`missing`, upload
+    everything), the rel_paths to upload (`need`), the track_ids the agent
+    no longer has (`stale`) and the rel_paths in `need` whose files changed
+    (`replaced`): their current entries stay until the new ones are uploaded.
+    """
+    changed: List[str] = []
+    missing: List[str] = []
+    for d, digest in dirs.items():
+        if manifest.digests.get(d) == digest:
+            continue
+        (changed if d in manifest.digests else missing).append(d)
+
+    need: List[str] = []
+    stale: List[Any] = []
+    replaced: List[str] = []
+    for d, entries in files.items():
+        have: Dict[Tuple[str, int, int], List[Any]] = {}
+        for name, size, mtime, tid in manifest.files.get(d, []):
+            have.setdefault((name, size, mtime), []).append(tid)
+        needed = set()
+        for entry in entries:
+            name, size, mtime = str(entry[0]), int(entry[1] or 0), int(entry[2] or 0)
+            if not have.pop((name, size, mtime), None):
+                needed.add(name)
+                need.append(f"{d}/{name}" if d else name)
+        for (name, _, _), tids in have.items():
+            if name in needed:
+                # Changed file: retired once its new version is uploaded (/scan-remove with keep).
+                replaced.append(f"{d}/{name}" if d else name)
+            else:
+                # Gone, or an old entry left behind by an upload that was never retired.
+                stale.extend(tids)
+        # Server-side subdirectories the agent no longer has.
+        for child in manifest.children.get(d, ()):
+            if child in dirs:
+                continue
+            for sub in manifest.subtree(child):
+                stale.extend(tid for _, _, _, tid in manifest.files.get(sub, []))
+    return {"changed": changed, "missing": missing, "need": need, "stale": stale, "replaced": sorted(set(replaced))}
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .jobs import file_lock
+from .storage import DATA_DIR, _json_default
+
+# Durable scan ingest queue: POST /scan-batches validates and stores a batch
+# (keyed by an idempotency key, so agent retries never apply twice) and returns
+# 202; one worker per host applies batches in arrival order, which keeps each
+# user's batches ordered.
+QUEUE_PATH = Path(os.getenv("RT_SCAN_QUEUE_PATH") or (DATA_DIR / "scan-queue.sqlite3"))
+SCAN_QUEUE_ENABLED = str(os.getenv("RT_SCAN_QUEUE_ENABLED", "1")).strip().lower() not in {"0", "false", "off", "no"}
+SCAN_QUEUE_IDLE_SEC = max(1, int(os.getenv("RT_SCAN_QUEUE_IDLE_SEC", "5") or "5"))
+SCAN_QUEUE_MAX_ATTEMPTS = max(1, int(os.getenv("RT_SCAN_QUEUE_MAX_ATTEMPTS", "3") or "3"))
+# A failed attempt is retried after base * 2^(attempt-1) seconds, capped; the
+# user's later batches wait behind it so their order is kept.
+SCAN_QUEUE_RETRY_BASE_SEC = max(1, int(os.getenv("RT_SCAN_QUEUE_RETRY_BASE_SEC", "10") or "10"))
+SCAN_QUEUE_RETRY_MAX_SEC = max(SCAN_QUEUE_RETRY_BASE_SEC, int(os.getenv("RT_SCAN_QUEUE_RETRY_MAX_SEC", "600") or "600"))
+# A batch left "running" this long (worker died mid-apply) is picked up again.
+SCAN_QUEUE_STALE_SEC = max(60, int(os.getenv("RT_SCAN_QUEUE_STALE_SEC", "900") or "900"))
+SCAN_QUEUE_RETENTION_SEC = max(3600, int(os.getenv("RT_SCAN_QUEUE_RETENTION_SEC", str(2 * 86400)) or "172800"))
+
+FINAL_STATUSES = {"done", "failed"}
+
+_local = threading.local()
+_disabled_reason: Optional[str] = None
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS scan_batches (
+      seq INTEGER PRIMARY KEY AUTOINCREMENT,
+      batch_id TEXT NOT NULL UNIQUE,
+      user_id TEXT NOT NULL,
+      idem_key TEXT NOT NULL,
+      status TEXT NOT NULL,
+      tracks INTEGER NOT NULL,
+      payload BLOB,
+      attempts INTEGER NOT NULL DEFAULT 0,
+      not_before REAL NOT NULL DEFAULT 0,
+      result TEXT,
+      error TEXT,
+      received_at REAL NOT NULL,
+      started_at REAL,
+      finished_at REAL,
+      UNIQUE (user_id, idem_key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_scan_batches_status ON scan_batches (status, seq)",
+    "CREATE INDEX IF NOT EXISTS idx_scan_batches_user ON scan_batches (user_id, seq)",
+]
+
+
+def _conn() -> Optional[sqlite3.Connection]:
+    global _disabled_reason
+    if _disabled_reason:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    try:
+        QUEUE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(QUEUE_PATH), timeout=10.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+        cols = {r["name"] for r in conn.execute("PRAGMA table_info(scan_batches)")}
+        if "not_before" not in cols:
+            # Queues created before retry back-off existed.
+            conn.execute("ALTER TABLE scan_batches ADD COLUMN not_before REAL NOT NULL DEFAULT 0")
+    except Exception as e:
+        _disabled_reason = str(e)
+        print(f"[scan-queue] disabled: {e}")
+        return None
+    _local.conn = conn
+    return conn
+
+
+def _view(conn: sqlite3.Connection, row: sqlite3.Row) -> Dict[str, Any]:
+    out = {
+        "batch_id": row["batch_id"],
+        "user_id": row["user_id"],
+        "status": row["status"],
+        "tracks": int(row["tracks"] or 0),
+        "attempts": int(row["attempts"] or 0),
+        "received_at": row["received_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "error": row["error"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+    }
+    if row["status"] not in FINAL_STATUSES:
+        ahead = conn.execute(
+            "SELECT COUNT(*) AS n FROM scan_batches WHERE user_id = ? AND seq < ? AND status IN ('queued', 'running')",
+            (row["user_id"], row["seq"]),
+        ).fetchone()
+        out["position"] = int(ahead["n"] or 0)
+        if row["not_before"] and row["not_before"] > time.time():
+            out["retry_at"] = row["not_before"]
+    return out
+
+
+def enqueue_batch(user_id: str, idem_key: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Store a validated ScanPayload. A repeated idem_key returns the existing
+    batch (with "duplicate": True) instead of queueing it again, unless that
+    batch failed: a resend queues it again (same batch_id, fresh attempts)
+    behind whatever the user sent meanwhile.
+    """
+    conn = _conn()
+    if conn is None:
+        return None
+    blob = gzip.compress(json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8"), compresslevel=5)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = conn.execute(
+                "SELECT batch_id FROM scan_batches WHERE user_id = ? AND idem_key = ? AND status = 'failed'",
+                (user_id, idem_key),
+            ).fetchone()
+            if failed:
+                # Re-inserting (rather than updating) gives it a new seq, i.e. its place in the order.
+                conn.execute("DELETE FROM scan_batches WHERE user_id = ? AND idem_key = ?", (user_id, idem_key))
+            cur = conn.execute(
+                """
+                INSERT INTO scan_batches (batch_id, user_id, idem_key, status, tracks, payload, received_at)
+                VALUES (?, ?, ?, 'queued', ?, ?, ?)
+                ON CONFLICT(user_id, idem_key) DO NOTHING
+                """,
+                (failed["batch_id"] if failed else uuid.uuid4().hex, user_id, idem_key,
+                 len(payload.get("library") or []), blob, time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        row = conn.execute(
+            "SELECT * FROM scan_batches WHERE user_id = ? AND idem_key = ?", (user_id, idem_key)
+        ).fetchone()
+        out = _view(conn, row)
+    except Exception as e:
+        print(f"[scan-queue] enqueue failed user={user_id}: {e}")
+        return None
+    out["duplicate"] = cur.rowcount == 0
+    if failed:
+        out["requeued"] = True
+    if not out["duplicate"]:
+        _WAKE.set()
+    return out
+
+
+def batch_status(user_id: str, batch_id: str) -> Optional[Dict[str, Any]]:
+    conn = _conn()
+    if conn is None:
+        return None
+    try:
+        row = conn.execute(
+            "SELECT * FROM scan_batches WHERE user_id = ? AND batch_id = ?", (user_id, batch_id)
+        ).fetchone()
+        return _view(conn, row) if row else None
+    except Exception as e:
+        print(f"[scan-queue] status failed user={user_id}: {e}")
+        return None
+
+
+def queue_stats(user_id: Optional[str] = None, recent: int = 20) -> Dict[str, Any]:
+    conn = _conn()
+    out: Dict[str, Any] = {
+        "enabled": SCAN_QUEUE_ENABLED,
+        "available": conn is not None,
+        "disabled_reason": _disabled_reason,
+        "path": str(QUEUE_PATH),
+    }
+    if conn is None:
+        return out
+    where, args = ("WHERE user_id = ?", [user_id]) if user_id else ("", [])
+    try:
+        out["counts"] = {
+            r["status"]: {"batches": int(r["n"] or 0), "tracks": int(r["tracks"] or 0)}
+            for r in conn.execute(
+                f"SELECT status, COUNT(*) AS n, SUM(tracks) AS tracks FROM scan_batches {where} GROUP BY status", args
+            )
+        }
+        out["recent"] = [
+            _view(conn, r)
+            for r in conn.execute(f"SELECT * FROM scan_batches {where} ORDER BY seq DESC LIMIT ?", [*args, max(0, recent)])
+        ]
+    except Exception as e:
+        print(f"[scan-queue] stats failed: {e}")
+    return out
+
+
+def _claim_next(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Oldest open batch of a user goes first; one waiting out a retry back-off holds the user's later ones.
+        row = conn.execute(
+            """
+            SELECT * FROM scan_batches b
+            WHERE (
+              (b.status = 'queued' AND b.not_before <= ?)
+              OR (b.status = 'running' AND b.started_at < ?)
+            )
+            AND NOT EXISTS (
+              SELECT 1 FROM scan_batches e
+              WHERE e.user_id = b.user_id AND e.seq < b.seq AND e.status IN ('queued', 'running')
+            )
+            ORDER BY b.seq LIMIT 1
+            """,
+            (now, now - SCAN_QUEUE_STALE_SEC),
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE scan_batches SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE seq = ?",
+                (now, row["seq"]),
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _prune(conn: sqlite3.Connection):
+    conn.execute(
+        "DELETE FROM scan_batches WHERE status IN ('done', 'failed') AND finished_at < ?",
+        (time.time() - SCAN_QUEUE_RETENTION_SEC,),
+    )
+
+
+# -------- worker --------
+_WAKE = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+_START_LOCK = threading.Lock()
+_PROCESSOR: Optional[Callable[[str, Dict[str, Any]], Dict[str, Any]]] = None
+
+
+def set_processor(fn: Callable[[str, Dict[str, Any]], Dict[str, Any]]):
+    """Register the batch applier: (user_id, ScanPayload dict) -> result summary."""
+    global _PROCESSOR
+    _PROCESSOR = fn
+
+
+def _apply_next(conn: sqlite3.Connection) -> bool:
+    row = _claim_next(conn)
+    if not row:
+        return False
+    started = time.time()
+    try:
+        payload = json.loads(gzip.decompress(row["payload"]).decode("utf-8"))
+        result = _PROCESSOR(row["user_id"], payload) or {}
+    except Exception as e:
+        attempts = int(row["attempts"] or 0) + 1
+        status = "failed" if attempts >= SCAN_QUEUE_MAX_ATTEMPTS else "queued"
+        delay = min(SCAN_QUEUE_RETRY_MAX_SEC, SCAN_QUEUE_RETRY_BASE_SEC * (2 ** (attempts - 1)))
+        conn.execute(
+            "UPDATE scan_batches SET status = ?, error = ?, finished_at = ?, not_before = ? WHERE seq = ?",
+            (status, str(e)[:500], time.time() if status == "failed" else None, time.time() + delay, row["seq"]),
+        )
+        retry = f", retrying in {delay}s" if status == "queued" else ""
+        print(f"[scan-queue] batch {row['batch_id']} user={row['user_id']} attempt {attempts} failed{retry}: {e}")
+        return True
+    # The payload is only needed until applied.
+    conn.execute(
+        "UPDATE scan_batches SET status = 'done', payload = NULL, error = NULL, result = ?, finished_at = ? WHERE seq = ?",
+        (json.dumps(result, default=_json_default), time.time(), row["seq"]),
+    )
+    print(
+        f"[scan-queue] applied batch {row['batch_id']} user={row['user_id']} "
+        f"tracks={row['tracks']} in {time.time() - started:.2f}s"
+    )
+    return True
+
+
+def _loop():
+    run_path = QUEUE_PATH.with_suffix(".run")
+    last_prune = 0.0
+    while True:
+        did_work = False
+        try:
+            # One process applies batches at a time, which is what keeps them ordered.
+            with file_lock(run_path, blocking=False) as locked:
+                conn = _conn()
+                if locked and conn is not None and _PROCESSOR is not None:
+                    while _apply_next(conn):
+                        did_work = True
+                    if time.time() - last_prune > 3600:
+                        _prune(conn)
+                        last_prune = time.time()
+        except Exception as e:
+            print(f"[scan-queue] worker error: {e}")
+        if not did_work:
+            _WAKE.wait(SCAN_QUEUE_IDLE_SEC)
+            _WAKE.clear()
+
+
+def start_scan_queue_worker():
+    global _THREAD
+    if not SCAN_QUEUE_ENABLED or _PROCESSOR is None:
+        return
+    with _START_LOCK:
+        if _THREAD and _THREAD.is_alive():
+            return
+        _THREAD = threading.Thread(target=_loop, name="rt-scan-queue", daemon=True)
+        _THREAD.start()
@@ -1,6 +1,6 @@
 from pathlib import Path
 from typing import Dict, Any, Iterable, List, Optional
-import json, time, os
+import json, time, os, threading
 from decimal import Decimal
 from urllib.parse import urlparse, unquote
 
@@ -17,6 +17,9 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 # In-memory state caches
 LIBS: Dict[str, Dict[str, Any]] = {}
 AGENTS: Dict[str, Dict[str, Any]] = {}
+# LIBS entries are shared by every request and job thread; mutate one only under its lib_lock.
+_LIB_LOCKS: Dict[str, threading.RLock] = {}
+_LIB_LOCKS_GUARD = threading.Lock()
 
 DB_DSN = os.getenv("RADIO_DB_DSN") or os.getenv("DATABASE_URL") or ""
 DB_CANONICAL_READS = str(os.getenv("RT_DB_CANONICAL_READS", "0")).strip().lower() in {"1", "true", "yes", "on"}
@@ -102,6 +105,12 @@ def playlists_path(user_id: str) -> Path:
 def metadata_library_path(user_id: str) -> Path:
     return DATA_DIR / f"{_safe_name(user_id)}.metadata-library.json"
 
+def jobs_path(user_id: str, kind: str) -> Path:
+    return DATA_DIR / f"{_safe_name(user_id)}.{_safe_name(kind)}-jobs.json"
+
+def job_items_path(user_id: str, kind: str, job_id: str) -> Path:
+    return DATA_DIR / f"{_safe_name(user_id)}.{_safe_name(kind)}-job-{_safe_name(job_id)}.items.json"
+
 
 def db_load_library(user_id: str) -> Optional[Dict[str, Any]]:
     conn = _db_conn()
@@ -198,9 +207,18 @@ def load_lib(user_id: str) -> Dict[str, Any]:
     LIBS[user_id] = {"tracks": {}, "version": int(time.time()), "_cleared_for": 0}
     return LIBS[user_id]
 
+def lib_lock(user_id: str) -> threading.RLock:
+    """Per-user re-entrant lock for read-modify-write of the cached library."""
+    with _LIB_LOCKS_GUARD:
+        lock = _LIB_LOCKS.get(user_id)
+        if lock is None:
+            lock = _LIB_LOCKS[user_id] = threading.RLock()
+        return lock
+
 def save_lib(user_id: str, lib: Dict[str, Any]):
-    LIBS[user_id] = lib
-    lib_path(user_id).write_text(json.dumps(lib, indent=2, default=_json_default))
+    with lib_lock(user_id):
+        LIBS[user_id] = lib
+        lib_path(user_id).write_text(json.dumps(lib, indent=2, default=_json_default))
 
 
 def db_upsert_tracks(user_id: str, tracks: List[Dict[str, Any]]) -> bool:
@@ -294,6 +312,61 @@ def db_insert_provider_snapshot(track_uid: str, best: Dict[str, Any]) -> bool:
         return False
 
 
+def db_upsert_media_cache(entry: Dict[str, Any]) -> bool:
+    conn = _db_conn()
+    if not conn:
+        return False
+    sql = """
+    INSERT INTO media_cache (cache_key, source_url, mime_type, size_bytes, sha256, storage_kind, storage_url)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+      mime_type=VALUES(mime_type),
+      size_bytes=VALUES(size_bytes),
+      sha256=VALUES(sha256),
+      storage_kind=VALUES(storage_kind),
+      storage_url=VALUES(storage_url),
+      updated_at=CURRENT_TIMESTAMP
+    """
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    sql,
+                    (
+                        entry.get("cache_key"),
+                        entry.get("source_url"),
+                        entry.get("mime_type"),
+                        entry.get("size_bytes"),
+                        entry.get("sha256"),
+                        entry.get("storage_kind") or "local",
+                        entry.get("storage_url"),
+                    ),
+                )
+        return True
+    except Exception as e:
+        print(f"[db] upsert media cache failed key={entry.get('cache_key')}: {e}")
+        return False
+
+
+def db_get_media_cache(cache_key: str) -> Optional[Dict[str, Any]]:
+    conn = _db_conn()
+    if not conn:
+        return None
+    sql = """
+    SELECT cache_key, source_url, mime_type, size_bytes, sha256, storage_kind, storage_url
+    FROM media_cache WHERE cache_key = %s
+    """
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (cache_key,))
+                row = cur.fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        print(f"[db] media cache lookup failed key={cache_key}: {e}")
+        return None
+
+
 def db_upsert_track_sources(user_id: str, tracks: List[Dict[str, Any]]) -> bool:
     conn = _db_conn()
     if not conn or not tracks:
@@ -416,19 +489,42 @@ def db_mark_all_track_sources_unavailable(user_id: str) -> bool:
         return False
 
 
+def db_mark_track_sources_unavailable(user_id: str, source_paths: List[str]) -> bool:
+    conn = _db_conn()
+    if not conn or not source_paths:
+        return False
+    placeholders = ",".join(["%s"] * len(source_paths))
+    sql = f"""
+    UPDATE track_sources
+    SET is_available = 0,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE user_id = %s AND source_path IN ({placeholders})
+    """
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, tuple([user_id] + [str(p) for p in source_paths]))
+        return True
+    except Exception as e:
+        print(f"[db] mark track sources unavailable failed user={user_id}: {e}")
+        return False
+
+
 def db_upsert_track_health(user_id: str, entries: List[Dict[str, Any]]) -> bool:
     conn = _db_conn()
     if not conn or not entries:
         return False
     sql = """
     INSERT INTO track_health (
-      track_uid, user_id, source_path, status, source_reachable, probe_ok,
+      track_uid, user_id, source_path, file_size, mtime, status, source_reachable, probe_ok,
       decode_ok, duration_sec, codec, error_reason, details_json, checked_at
     ) VALUES (
-      %(track_uid)s, %(user_id)s, %(source_path)s, %(status)s, %(source_reachable)s, %(probe_ok)s,
+      %(track_uid)s, %(user_id)s, %(source_path)s, %(file_size)s, %(mtime)s, %(status)s, %(source_reachable)s, %(probe_ok)s,
       %(decode_ok)s, %(duration_sec)s, %(codec)s, %(error_reason)s, %(details_json)s, CURRENT_TIMESTAMP
     )
     ON DUPLICATE KEY UPDATE
+      file_size=VALUES(file_size),
+      mtime=VALUES(mtime),
       status=VALUES(status),
       source_reachable=VALUES(source_reachable),
       probe_ok=VALUES(probe_ok),
@@ -450,6 +546,8 @@ def db_upsert_track_health(user_id: str, entries: List[Dict[str, Any]]) -> bool:
                 "track_uid": track_uid,
                 "user_id": user_id,
                 "source_path": entry.get("source_path"),
+                "file_size": entry.get("file_size"),
+                "mtime": entry.get("mtime"),
                 "status": str(entry.get("status") or "warning")[:32],
                 "source_reachable": 1 if entry.get("source_reachable") else 0,
                 "probe_ok": 1 if entry.get("probe_ok") else 0,
@@ -500,6 +598,39 @@ def db_list_track_health(user_id: str, status: Optional[str] = None, limit: int
         return []
 
 
+def db_track_health_ok_fingerprints(user_id: str, track_uids: Optional[List[str]] = None) -> Dict[str, tuple]:
+    """
+    Map track_uid -> (file_size, mtime) for tracks whose last health check passed.
+    Used to skip re-checking files that have not changed since.
+    """
+    conn = _db_conn()
+    if not conn:
+        return {}
+    sql = """
+    SELECT track_uid, file_size, mtime
+    FROM track_health
+    WHERE user_id = %s AND status = 'ok'
+    """
+    params: List[Any] = [user_id]
+    if track_uids:
+        sql += f" AND track_uid IN ({','.join(['%s'] * len(track_uids))})"
+        params.extend(str(tid) for tid in track_uids)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, tuple(params))
+                rows = cur.fetchall() or []
+        out: Dict[str, tuple] = {}
+        for row in rows:
+            if row.get("file_size") is None or row.get("mtime") is None:
+                continue
+            out[str(row.get("track_uid") or "")] = (int(row["file_size"]), int(row["mtime"]))
+        return out
+    except Exception as e:
+        print(f"[db] track health fingerprints failed user={user_id}: {e}")
+        return {}
+
+
 def db_upsert_override(track_uid: str, user_id: str, patch: Dict[str, Any]) -> bool:
     conn = _db_conn()
     if not conn:
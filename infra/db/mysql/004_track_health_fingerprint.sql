@@ -0,0 +1,7 @@
+-- RadioTiker vNext MySQL migration: remember which file version a health check covered
+-- Apply with:
+--   mysql --defaults-extra-file=~/.mysql-radio.cnf < infra/db/mysql/004_track_health_fingerprint.sql
+
+ALTER TABLE track_health
+  ADD COLUMN file_size BIGINT NULL AFTER source_path,
+  ADD COLUMN mtime BIGINT NULL AFTER file_size;
@@ -0,0 +1,7 @@
+-- RadioTiker vNext MySQL migration: media_cache indexes the server-side artwork cache
+-- Apply with:
+--   mysql --defaults-extra-file=~/.mysql-radio.cnf < infra/db/mysql/005_media_cache_local.sql
+
+ALTER TABLE media_cache
+  MODIFY COLUMN storage_kind ENUM('remote', 's3', 'local') NOT NULL DEFAULT 'remote',
+  ADD INDEX idx_media_cache_sha256 (sha256);
@@ -0,0 +1,148 @@
+"""
+Benchmark scanner metadata extraction: one mutagen parse per file
+(thin_agent._read_audio) vs the old path that parsed every file three times
+(easy tags, then duration, then stream info).
+
+With --workers it also times the scan pipeline's extraction pool
+(scan_pipeline.ordered_map) at each worker count.
+
+Builds a synthetic tagged corpus of mp3/flac/m4a/wav files with ffmpeg, or
+reads an existing folder with --corpus (point it at a NAS mount to see the
+real I/O cost).
+
+    python bench_scan.py --files 200 --seconds 5
+    python bench_scan.py --corpus /mnt/music --limit 2000 --workers 1,2,4
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from mutagen import File
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import thin_agent  # noqa: E402
+from scan_pipeline import make_executor, ordered_map  # noqa: E402
+
+FORMATS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "192k"],
+    "flac": ["-c:a", "flac"],
+    "m4a": ["-c:a", "aac", "-b:a", "160k"],
+    "wav": ["-c:a", "pcm_s16le"],
+}
+WORDS = "love night heart blue dream fire road home light rain summer river dance gold shadow city".split()
+
+
+def _phrase(rng, lo=1, hi=3):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(lo, hi)))
+
+
+def _build_corpus(root, files, seconds, seed):
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        sys.exit("ffmpeg is needed to build the synthetic corpus (or pass --corpus DIR).")
+    rng = random.Random(seed)
+    exts = list(FORMATS)
+    for i in range(files):
+        ext = exts[i % len(exts)]
+        artist, album = _phrase(rng), _phrase(rng)
+        folder = os.path.join(root, artist, album)
+        os.makedirs(folder, exist_ok=True)
+        out = os.path.join(folder, f"{i:04d} {_phrase(rng)}.{ext}")
+        tags = {
+            "title": _phrase(rng), "artist": artist, "album": album,
+            "genre": rng.choice(["Rock", "Jazz", "Pop"]), "date": str(rng.randint(1960, 2024)), "track": str(i % 12 + 1),
+        }
+        cmd = [ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", f"sine=frequency={rng.randint(200, 900)}:duration={seconds}"]
+        for k, v in tags.items():
+            cmd += ["-metadata", f"{k}={v}"]
+        subprocess.run(cmd + FORMATS[ext] + [out], check=True)
+
+
+def _corpus_files(root, limit):
+    out = list(thin_agent._iter_audio_files(root))
+    return out[:limit] if limit else out
+
+
+def _read_three_parses(path):
+    """The pre-single-parse scanner: tags, duration and stream info each opened the file."""
+    audio = File(path, easy=True)
+    tags = {k: thin_agent._first_tag(audio, k) for k in ("title", "artist", "album", "genre", "date", "tracknumber")}
+    mf = File(path)
+    duration = thin_agent._duration_seconds(getattr(mf, "info", None) if mf else None)
+    mf = File(path)
+    tech = thin_agent._technical_info(path, getattr(mf, "info", None) if mf else None)
+    return tags, duration, tech
+
+
+def _timed(label, fn, paths, rounds):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for p in paths:
+            fn(p)
+        spent = time.perf_counter() - started
+        best = spent if best is None else min(best, spent)
+    print(f"{label:28} {best * 1000:9.1f} ms  {len(paths) / best:9.1f} files/s")
+    return best
+
+
+def _pool_run(paths, kind, workers):
+    executor, used = make_executor(kind, workers)
+    with executor:
+        for _ in ordered_map(thin_agent._read_audio, ((p, (p,)) for p in paths), executor, workers * 4):
+            pass
+    return used
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark thin-agent metadata extraction.")
+    parser.add_argument("--corpus", help="existing music folder instead of a synthetic corpus")
+    parser.add_argument("--files", type=int, default=200, help="synthetic files (spread over mp3/flac/m4a/wav)")
+    parser.add_argument("--seconds", type=int, default=5, help="synthetic track length")
+    parser.add_argument("--limit", type=int, default=0, help="only read the first N files of --corpus")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", default="", help="comma-separated pool sizes to time, e.g. 1,2,4")
+    parser.add_argument("--kind", default="auto", help="pool kind for --workers: auto, process or thread")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tmp = None
+    root = args.corpus
+    if not root:
+        tmp = tempfile.mkdtemp(prefix="rt-bench-scan-")
+        root = tmp
+        started = time.perf_counter()
+        _build_corpus(root, args.files, args.seconds, args.seed)
+        print(f"built {args.files} files in {time.perf_counter() - started:.1f}s under {root}")
+    try:
+        paths = _corpus_files(os.path.abspath(root), args.limit)
+        by_ext = {}
+        for p in paths:
+            ext = os.path.splitext(p)[1].lower()
+            by_ext[ext] = by_ext.get(ext, 0) + 1
+        print(f"{len(paths)} files: " + ", ".join(f"{k} {v}" for k, v in sorted(by_ext.items())))
+
+        # Same answers from both paths before timing them.
+        for p in paths[:20]:
+            tags, duration, tech = _read_three_parses(p)
+            one = thin_agent._read_audio(p)
+            assert one["duration_sec"] == duration, p
+            assert (one["codec"], one["sample_rate"], one["bit_depth"], one["bitrate_kbps"], one["channels"]) == tech, p
+
+        old = _timed("three parses per file", _read_three_parses, paths, args.rounds)
+        new = _timed("thin_agent._read_audio", thin_agent._read_audio, paths, args.rounds)
+        print(f"speedup: {old / new:.2f}x (warm page cache; cold NAS reads gain more)")
+        for n in [int(x) for x in args.workers.split(",") if x.strip()]:
+            started = time.perf_counter()
+            kind = _pool_run(paths, args.kind, n)
+            spent = time.perf_counter() - started
+            print(f"{f'pool {kind} x{n}':28} {spent * 1000:9.1f} ms  {len(paths) / spent:9.1f} files/s  {new / spent:5.2f}x vs 1 thread")
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,202 @@
+# fingerprints.py
+# Chromaprint for the thin agent, off the scan path: a small pool of background
+# workers runs fpcalc, results are cached by (path, size, mtime) so each file
+# is fingerprinted once, and finished fingerprints go to the server in batches
+# as incremental track updates.
+import os, shutil, sqlite3, subprocess, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+  path TEXT PRIMARY KEY,
+  size INTEGER NOT NULL,
+  mtime INTEGER NOT NULL,
+  fingerprint TEXT,
+  duration REAL,
+  computed_at INTEGER NOT NULL,
+  expires_at INTEGER
+)
+"""
+# Tries per update whose track the server does not know yet (its scan batch may still be queued).
+_MAX_TRIES = 20
+# A file fpcalc timed out on (slow disk, NAS hiccup) is tried again after this long.
+_TIMEOUT_RETRY_SEC = 7 * 86400
+
+
+def run_fpcalc(path: str, timeout: float = 20.0):
+    """
+    One fpcalc run. Its plain key=value output is printed by every version, so
+    there is no -json attempt first. Returns (fingerprint, duration), or
+    (None, None) when fpcalc ran but could not fingerprint the file, which the
+    same file will do again. A missing fpcalc (FileNotFoundError), a failed
+    launch (OSError) or a timeout (subprocess.TimeoutExpired) raise instead.
+    """
+    exe = shutil.which("fpcalc")
+    if not exe:
+        raise FileNotFoundError("fpcalc not found on PATH")
+    p = subprocess.run([exe, path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout, text=True, check=False)
+    fp = None
+    dur = None
+    for ln in (p.stdout or "").splitlines():
+        if ln.startswith("FINGERPRINT="):
+            fp = ln.split("=", 1)[1].strip() or None
+        elif ln.startswith("DURATION="):
+            try:
+                dur = float(ln.split("=", 1)[1].strip())
+            except Exception:
+                dur = None
+    return (fp, dur) if fp else (None, None)
+
+
+class FingerprintCache:
+    """
+    Fingerprints per (path, size, mtime), and fpcalc failures, so an undecodable
+    file is not retried every scan; failures that may pass (timeouts) expire.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(fingerprints)")}
+        if "expires_at" not in cols:
+            self._conn.execute("ALTER TABLE fingerprints ADD COLUMN expires_at INTEGER")
+            # Older caches also stored timeouts and a missing fpcalc as permanent failures.
+            self._conn.execute("DELETE FROM fingerprints WHERE fingerprint IS NULL")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, size: int, mtime: int):
+        """(fingerprint, duration) for this version of the file, (None, None) if fpcalc failed on it, None if unknown."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT size, mtime, fingerprint, duration, expires_at FROM fingerprints WHERE path = ?", (path,)
+                ).fetchone()
+        except Exception:
+            return None
+        if row and row[0] == size and row[1] == mtime and not (row[4] and row[4] <= time.time()):
+            return row[2], row[3]
+        return None
+
+    def put(self, path: str, size: int, mtime: int, fingerprint, duration, ttl=None):
+        """Store a result; `ttl` (seconds) makes it expire, e.g. for a failure that may pass."""
+        now = int(time.time())
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO fingerprints (path, size, mtime, fingerprint, duration, computed_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime, fingerprint, duration, now, now + int(ttl) if ttl else None),
+                )
+                self._conn.commit()
+        except Exception as e:
+            # Only costs an fpcalc run again next scan.
+            print(f"⚠️ Fingerprint cache write failed: {e}")
+
+
+def open_fingerprint_cache(path: str):
+    try:
+        return FingerprintCache(path)
+    except Exception as e:
+        print(f"⚠️ Fingerprint cache unavailable ({path}): {e}; fingerprints are not computed.")
+        return None
+
+
+class FingerprintQueue:
+    """
+    want() schedules a file (once, however often scans see it; never when fpcalc
+    is not installed); `workers` fpcalc runs at most in parallel. send(items) gets batches of
+    {"track_id", "acoustid_fingerprint", "acoustid_duration"} and returns the
+    track_ids to retry later, or None when the server cannot take updates.
+    """
+
+    def __init__(self, cache: FingerprintCache, send, workers: int = 2, batch_size: int = 200,
+                 flush_sec: float = 15.0, timeout: float = 20.0, log_fn=print):
+        self.cache = cache
+        self._send = send
+        self.batch_size = max(1, int(batch_size))
+        self.flush_sec = max(1.0, float(flush_sec))
+        self.timeout = timeout
+        self.log_fn = log_fn
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="rt-fpcalc")
+        self._lock = threading.Lock()
+        self._scheduled = set()
+        self._ready = []
+        self._wake = threading.Event()
+        self._sending = True
+        self.done = 0
+        self.failed = 0
+        self.available = shutil.which("fpcalc") is not None
+        if not self.available:
+            log_fn("⚠️ fpcalc not found; fingerprints are not computed (install chromaprint / libchromaprint-tools).")
+        threading.Thread(target=self._sender, name="rt-fp-send", daemon=True).start()
+
+    def want(self, path: str, size: int, mtime: int, track_id: str):
+        if not self.available:
+            return
+        with self._lock:
+            if path in self._scheduled:
+                return
+            self._scheduled.add(path)
+        self._pool.submit(self._work, path, size, mtime, track_id)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._scheduled) + len(self._ready)
+
+    def _work(self, path, size, mtime, track_id):
+        try:
+            try:
+                fp, dur = run_fpcalc(path, self.timeout)
+            except subprocess.TimeoutExpired:
+                self.cache.put(path, size, mtime, None, None, ttl=_TIMEOUT_RETRY_SEC)
+                fp, dur = None, None
+            except FileNotFoundError:
+                self.available = False  # uninstalled while running; nothing is cached
+                fp, dur = None, None
+            except OSError as e:
+                self.log_fn(f"⚠️ fpcalc failed on {path}: {e}")
+                fp, dur = None, None
+            else:
+                self.cache.put(path, size, mtime, fp, dur)
+            with self._lock:
+                if fp:
+                    self.done += 1
+                    self._ready.append({"track_id": track_id, "acoustid_fingerprint": fp, "acoustid_duration": dur, "tries": 0})
+                else:
+                    self.failed += 1
+                full = len(self._ready) >= self.batch_size
+            if full:
+                self._wake.set()
+        finally:
+            with self._lock:
+                self._scheduled.discard(path)
+
+    def _sender(self):
+        while True:
+            self._wake.wait(self.flush_sec)
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    batch, self._ready = self._ready[:self.batch_size], self._ready[self.batch_size:]
+                if not batch:
+                    break
+                if not self._sending:
+                    continue  # the cache still has them for the next scan's records
+                try:
+                    retry = self._send([{k: v for k, v in item.items() if k != "tries"} for item in batch])
+                except Exception as e:
+                    self.log_fn(f"⚠️ Fingerprint upload failed: {e}")
+                    retry = [item["track_id"] for item in batch]
+                if retry is None:
+                    self._sending = False
+                    continue
+                retry = set(retry)
+                again = [dict(item, tries=item["tries"] + 1) for item in batch if item["track_id"] in retry]
+                with self._lock:
+                    self._ready.extend(item for item in again if item["tries"] < _MAX_TRIES)
+                if again:
+                    break  # wait a flush interval before retrying
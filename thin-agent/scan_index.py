@@ -0,0 +1,114 @@
+# scan_index.py
+# Persistent per-file metadata cache for the thin agent scanners: records are
+# keyed by absolute path and reused while (size, mtime) still match, so a
+# rescan of an unchanged library is a directory walk plus one stat per file.
+import os, json, sqlite3, threading, time
+
+# Bump when the extracted record changes shape; older rows then count as misses.
+INDEX_FORMAT = 1
+_FLUSH_EVERY = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+  path TEXT PRIMARY KEY,
+  size INTEGER NOT NULL,
+  mtime INTEGER NOT NULL,
+  format INTEGER NOT NULL,
+  meta TEXT NOT NULL,
+  indexed_at INTEGER NOT NULL
+)
+"""
+
+
+class ScanIndex:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._pending = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, size: int, mtime: int):
+        """Cached record for `path`, or None if it is unknown or changed."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT size, mtime, format, meta FROM files WHERE path = ?", (path,)
+                ).fetchone()
+        except Exception:
+            row = None
+        if row and row[0] == size and row[1] == mtime and row[2] == INDEX_FORMAT:
+            try:
+                meta = json.loads(row[3])
+                self.hits += 1
+                return meta
+            except Exception:
+                pass
+        self.misses += 1
+        return None
+
+    def put(self, path: str, size: int, mtime: int, meta: dict):
+        with self._lock:
+            self._pending.append((path, size, mtime, INDEX_FORMAT, json.dumps(meta), int(time.time())))
+            if len(self._pending) >= _FLUSH_EVERY:
+                self._flush_locked()
+
+    def forget(self, paths):
+        with self._lock:
+            self._flush_locked()
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+            self._conn.commit()
+
+    def prune(self, root_abs: str, seen) -> int:
+        """Drop records under `root_abs` for files the last full walk did not see."""
+        prefix = root_abs.rstrip(os.sep) + os.sep
+        with self._lock:
+            self._flush_locked()
+            known = [
+                p for (p,) in self._conn.execute(
+                    "SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+                )
+            ]
+            gone = [p for p in known if p not in seen]
+            if gone:
+                self._conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in gone])
+                self._conn.commit()
+        return len(gone)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime, format, meta, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        except Exception as e:
+            # A lost write only means those files are parsed again next scan.
+            print(f"⚠️ Scan index write failed: {e}")
+
+    def take_stats(self):
+        """(hits, misses) since the last call."""
+        out = (self.hits, self.misses)
+        self.hits = self.misses = 0
+        return out
+
+
+def open_scan_index(path: str):
+    try:
+        return ScanIndex(path)
+    except Exception as e:
+        print(f"⚠️ Scan index unavailable ({path}): {e}; every file will be parsed.")
+        return None
@@ -0,0 +1,96 @@
+# scan_pipeline.py
+# Parallel scan plumbing shared by the thin agent scanners: the caller's walk
+# (stat + scan index lookups) feeds a pool of extraction workers, results come
+# back in walk order, and a background uploader sends finished batches while
+# extraction carries on.
+import os, sys, queue, threading, multiprocessing
+from collections import deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def default_workers() -> int:
+    return max(1, min(8, os.cpu_count() or 1))
+
+
+def make_executor(kind: str, workers: int):
+    """
+    Extraction pool: "process" (tag parsing is CPU-bound Python, so this is what
+    scales with cores), "thread" (enough when reads from a slow NAS dominate),
+    or "auto" (process on multi-core Linux). Returns (executor, kind actually used).
+
+    Workers start from a forkserver (spawn where there is none), never by
+    forking the agent itself: by now it runs the uploader, fingerprint and
+    file-server threads, and a fork can inherit one of their locks held.
+    """
+    workers = max(1, int(workers or 1))
+    kind = str(kind or "auto").strip().lower()
+    if kind == "auto":
+        kind = "process" if sys.platform.startswith("linux") and workers > 1 else "thread"
+    if kind == "process":
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)), "process"
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rt-scan"), "thread"
+
+
+def ordered_map(fn, jobs, executor, window: int):
+    """
+    Run fn(*args) on `executor` for each (item, args) in `jobs` and yield
+    (item, result, error) in input order, with at most `window` jobs in flight.
+    args=None passes the item through without running fn (result None), e.g.
+    files already answered by the scan index.
+
+    A broken pool (a worker process died) is raised rather than reported per
+    item: every job after it would fail the same way.
+    """
+    pending = deque()
+
+    def pop():
+        item, fut = pending.popleft()
+        if fut is None:
+            return item, None, None
+        try:
+            return item, fut.result(), None
+        except BrokenExecutor:
+            raise
+        except Exception as e:
+            return item, None, e
+
+    window = max(1, int(window))
+    for item, args in jobs:
+        pending.append((item, executor.submit(fn, *args) if args is not None else None))
+        while pending and (len(pending) >= window or pending[0][1] is None or pending[0][1].done()):
+            yield pop()
+    while pending:
+        yield pop()
+
+
+class BackgroundUploader:
+    """Send batches in order on one thread; at most `depth` wait behind the one in flight."""
+
+    def __init__(self, send, depth: int = 2):
+        self._send = send
+        self._queue = queue.Queue(maxsize=max(1, int(depth)))
+        self.failed = False
+        self._thread = threading.Thread(target=self._run, name="rt-scan-upload", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            # After a failure the rest is dropped; the resume checkpoint points at the failed batch.
+            if not self.failed and not self._send(*job):
+                self.failed = True
+
+    def put(self, *job) -> bool:
+        if self.failed:
+            return False
+        self._queue.put(job)
+        return True
+
+    def close(self) -> bool:
+        """Wait for queued batches; True if every one was sent."""
+        self._queue.put(None)
+        self._thread.join()
+        return not self.failed
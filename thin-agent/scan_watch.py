@@ -0,0 +1,239 @@
+# scan_watch.py
+# Library watch for the thin agent scanners: inotify on Linux (through libc, no
+# extra dependency), otherwise a stat-only polling walk. Create/modify/move/
+# delete events are coalesced per path and handed out as one batch once the
+# tree has been quiet for the debounce window.
+import os, sys, time, errno, select, struct, ctypes, ctypes.util
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT = struct.Struct("iIII")
+
+
+class WatchBatch:
+    """
+    Coalesced changes: `files` are audio paths that were created, changed,
+    moved or deleted (check the disk to tell which), `dirs` are directories
+    that vanished or moved away, and `rescan` means events were lost and only
+    a full rescan is safe.
+    """
+
+    def __init__(self):
+        self.files = set()
+        self.dirs = set()
+        self.rescan = False
+
+    def __bool__(self):
+        return bool(self.files or self.dirs or self.rescan)
+
+    def merge(self, other: "WatchBatch"):
+        self.files |= other.files
+        self.dirs |= other.dirs
+        self.rescan = self.rescan or other.rescan
+
+
+class _Inotify:
+    def __init__(self, root: str, is_audio, log_fn):
+        self.root = root
+        self.is_audio = is_audio
+        self.log_fn = log_fn
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # wd -> directory path
+        try:
+            self._add_tree(root, None)
+        except Exception:
+            os.close(self.fd)
+            raise
+
+    def _add_tree(self, top: str, batch):
+        """Watch `top` and everything below it; new directories also report their audio files."""
+        for cur, dirs, files in os.walk(top):
+            dirs.sort()
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(cur), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch limit reached (raise fs.inotify.max_user_watches)")
+                if err in {errno.ENOENT, errno.ENOTDIR}:
+                    continue  # gone again before we got to it
+                raise OSError(err, f"inotify_add_watch failed for {cur}")
+            self._dirs[wd] = cur
+            if batch is not None:
+                batch.files.update(os.path.join(cur, f) for f in files if self.is_audio(f))
+
+    def _drop_tree(self, top: str):
+        prefix = top.rstrip(os.sep) + os.sep
+        for wd, path in list(self._dirs.items()):
+            if path == top or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self.fd, wd)
+                self._dirs.pop(wd, None)
+
+    def read(self, timeout: float, batch: WatchBatch) -> bool:
+        """Fold pending events into `batch`; True if any arrived within `timeout`."""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return False
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        pos = 0
+        while pos + _EVENT.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, pos)
+            name = buf[pos + _EVENT.size:pos + _EVENT.size + length].split(b"\0", 1)[0]
+            pos += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                batch.rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if parent == self.root:
+                    batch.rescan = True  # the library root itself went away
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add_tree(path, batch)
+                    except OSError as e:
+                        self.log_fn(f"⚠️ Watch: cannot follow {path}: {e}; next rescan picks it up.")
+                        batch.rescan = True
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._drop_tree(path)
+                    batch.dirs.add(path)
+            elif name and self.is_audio(os.fsdecode(name)):
+                batch.files.add(path)
+        return True
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class _Poller:
+    """Fallback: compare (size, mtime) snapshots of the tree; no file is opened."""
+
+    def __init__(self, root: str, is_audio, interval: float):
+        self.root = root
+        self.is_audio = is_audio
+        self.interval = max(1.0, float(interval))
+        self._snapshot = self._walk()
+        self._next = time.monotonic() + self.interval
+
+    def _walk(self):
+        out = {}
+        for cur, dirs, files in os.walk(self.root):
+            for f in files:
+                if self.is_audio(f):
+                    p = os.path.join(cur, f)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    out[p] = (st.st_size, int(st.st_mtime))
+        return out
+
+    def read(self, timeout: float, batch: WatchBatch) -> bool:
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(0.0, timeout))
+            return False
+        time.sleep(max(0.0, wait))
+        self._next = time.monotonic() + self.interval
+        snapshot = self._walk()
+        old = self._snapshot
+        self._snapshot = snapshot
+        changed = {p for p, sig in snapshot.items() if old.get(p) != sig}
+        changed |= old.keys() - snapshot.keys()
+        batch.files |= changed
+        return bool(changed)
+
+    def close(self):
+        pass
+
+
+class LibraryWatcher:
+    """
+    next_batch(timeout) returns the changes collected once nothing has happened
+    for `debounce` seconds (or `max_delay` after the first event, so a long copy
+    still syncs as it goes), or None when there is nothing to hand out yet.
+    """
+
+    def __init__(self, root: str, extensions, mode: str = "auto", debounce: float = 2.0,
+                 poll_interval: float = 30.0, max_delay: float = 30.0, log_fn=print):
+        self.root = os.path.abspath(root)
+        exts = tuple(e.lower() for e in extensions)
+        is_audio = lambda name: name.lower().endswith(exts)
+        self.debounce = max(0.1, float(debounce))
+        self.max_delay = max(self.debounce, float(max_delay))
+        self._pending = WatchBatch()
+        self._first_at = None
+        self._last_at = None
+        mode = str(mode or "auto").strip().lower()
+        self.backend = None
+        if mode in {"auto", "inotify"} and sys.platform.startswith("linux"):
+            try:
+                self.backend = _Inotify(self.root, is_audio, log_fn)
+                self.mode = "inotify"
+            except Exception as e:
+                log_fn(f"⚠️ inotify unavailable ({e}); polling every {poll_interval:.0f}s instead.")
+        if self.backend is None:
+            self.backend = _Poller(self.root, is_audio, poll_interval)
+            self.mode = "poll"
+
+    def requeue(self, batch: WatchBatch):
+        """Put back a batch that could not be synced; it goes out with the next one."""
+        self._pending.merge(batch)
+        now = time.monotonic()
+        self._first_at = self._first_at or now
+        self._last_at = now
+
+    def next_batch(self, timeout: float):
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            now = time.monotonic()
+            if self._pending and (now - self._last_at >= self.debounce or now - self._first_at >= self.max_delay):
+                out, self._pending = self._pending, WatchBatch()
+                self._first_at = self._last_at = None
+                return out
+            wait = deadline - now
+            if self._pending:
+                wait = min(wait, self._last_at + self.debounce - now, self._first_at + self.max_delay - now)
+            if wait <= 0 and now >= deadline:
+                return None
+            if self.backend.read(max(0.0, wait), self._pending):
+                now = time.monotonic()
+                self._first_at = self._first_at or now
+                self._last_at = now
+
+    def close(self):
+        self.backend.close()
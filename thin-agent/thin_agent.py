@@ -1,17 +1,25 @@
 # thin_agent.py
 
 import os
+import gzip
 import time
 import hashlib
 import re
-import shutil
 import json
-import subprocess
 import threading
 import requests
+from concurrent.futures import BrokenExecutor
 from mutagen import File
+try:
+    import zstandard  # optional: smaller, faster uploads than gzip
+except Exception:
+    zstandard = None
 from dotenv import load_dotenv
+from fingerprints import FingerprintQueue, open_fingerprint_cache
 from local_file_server import LocalFileServer
+from scan_index import open_scan_index
+from scan_pipeline import BackgroundUploader, default_workers, make_executor, ordered_map
+from scan_watch import LibraryWatcher
 from tunnel_manager import start_tunnel_from_env
 
 load_dotenv()
@@ -25,6 +33,34 @@ ENRICH_URL_BASE = os.getenv(
     "ENRICH_URL_BASE",
     SERVER_URL.replace("/submit-scan", "/metadata/enrich-library"),
 )
+ENRICH_JOBS_URL_BASE = os.getenv(
+    "ENRICH_JOBS_URL_BASE",
+    SERVER_URL.replace("/submit-scan", "/metadata/enrich-jobs"),
+)
+SCAN_STREAM_URL = os.getenv(
+    "SCAN_STREAM_URL",
+    SERVER_URL.replace("/submit-scan", "/submit-scan-stream"),
+)
+SCAN_DELTA_URL = os.getenv(
+    "SCAN_DELTA_URL",
+    SERVER_URL.replace("/submit-scan", "/scan-delta"),
+)
+SCAN_BATCHES_URL = os.getenv(
+    "SCAN_BATCHES_URL",
+    SERVER_URL.replace("/submit-scan", "/scan-batches"),
+)
+SCAN_COMPLETE_URL = os.getenv(
+    "SCAN_COMPLETE_URL",
+    SERVER_URL.replace("/submit-scan", "/scan-complete"),
+)
+SCAN_REMOVE_URL = os.getenv(
+    "SCAN_REMOVE_URL",
+    SERVER_URL.replace("/submit-scan", "/scan-remove"),
+)
+SCAN_FINGERPRINTS_URL = os.getenv(
+    "SCAN_FINGERPRINTS_URL",
+    SERVER_URL.replace("/submit-scan", "/scan-fingerprints"),
+)
 USER_ID = os.getenv("USER_ID", "test-user-001")
 LIBRARY_PATH = os.getenv("LIBRARY_PATH", "./Music")
 AGENT_PORT = int(os.getenv("AGENT_PORT", "8765"))
@@ -39,18 +75,86 @@ SCAN_SUBMIT_RETRIES = max(1, int(os.getenv("RT_SCAN_SUBMIT_RETRIES", "3") or "3"
 SCAN_RETRY_BACKOFF_SEC = max(1.0, float(os.getenv("RT_SCAN_RETRY_BACKOFF_SEC", "2") or "2"))
 SCAN_RESUME_ENABLED = str(os.getenv("RT_SCAN_RESUME_ENABLED", "1")).strip().lower() in {"1", "true", "yes", "on"}
 SCAN_RESUME_RESET = str(os.getenv("RT_SCAN_RESUME_RESET", "0")).strip().lower() in {"1", "true", "yes", "on"}
+# Streaming NDJSON ingest: far fewer, larger uploads; falls back to /submit-scan on older servers.
+SCAN_STREAM_ENABLED = str(os.getenv("RT_SCAN_STREAM_ENABLED", "1")).strip().lower() in {"1", "true", "yes", "on"}
+SCAN_STREAM_BATCH_SIZE = max(SCAN_BATCH_SIZE, int(os.getenv("RT_SCAN_STREAM_BATCH_SIZE", "1000") or "1000"))
+# Manifest-based rescans: only new/changed files are read and uploaded, deletions are pruned server-side.
+SCAN_DELTA_ENABLED = str(os.getenv("RT_SCAN_DELTA_ENABLED", "1")).strip().lower() in {"1", "true", "yes", "on"}
+# Async ingest: batches are queued server-side (202) and polled, so uploads never wait on the apply.
+SCAN_ASYNC_ENABLED = str(os.getenv("RT_SCAN_ASYNC_ENABLED", "1")).strip().lower() in {"1", "true", "yes", "on"}
+SCAN_ASYNC_MAX_PENDING = max(1, int(os.getenv("RT_SCAN_ASYNC_MAX_PENDING", "8") or "8"))
+SCAN_ASYNC_WAIT_SEC = max(30, int(os.getenv("RT_SCAN_ASYNC_WAIT_SEC", "1800") or "1800"))
+SCAN_ASYNC_POLL_SEC = max(0.5, float(os.getenv("RT_SCAN_ASYNC_POLL_SEC", "2") or "2"))
+# Local index of parsed files: rescans only re-read files whose (size, mtime) changed.
+SCAN_INDEX_ENABLED = str(os.getenv("RT_SCAN_INDEX_ENABLED", "1")).strip().lower() in {"1", "true", "yes", "on"}
+SCAN_INDEX_PATH = os.getenv("RT_SCAN_INDEX_PATH") or os.path.join(os.path.expanduser("~"), ".radiotiker", "scan-index.sqlite3")
+# Extraction pool (a Pi wants ~2-4 workers, a desktop up to its core count) and uploads overlapping it.
+SCAN_WORKERS = max(1, int(os.getenv("RT_SCAN_WORKERS", str(default_workers())) or "1"))
+SCAN_WORKER_KIND = str(os.getenv("RT_SCAN_WORKER_KIND", "auto")).strip().lower()
+SCAN_UPLOAD_QUEUE = max(1, int(os.getenv("RT_SCAN_UPLOAD_QUEUE", "2") or "2"))
+# Watch mode: sync changed files a few seconds after they land instead of waiting for a rescan.
+WATCH_ENABLED = str(os.getenv("RT_WATCH_ENABLED", "0")).strip().lower() in {"1", "true", "yes", "on"}
+WATCH_MODE = str(os.getenv("RT_WATCH_MODE", "auto")).strip().lower()
+WATCH_DEBOUNCE_SEC = max(0.5, float(os.getenv("RT_WATCH_DEBOUNCE_SEC", "3") or "3"))
+WATCH_MAX_DELAY_SEC = max(WATCH_DEBOUNCE_SEC, float(os.getenv("RT_WATCH_MAX_DELAY_SEC", "30") or "30"))
+WATCH_POLL_SEC = max(5, int(os.getenv("RT_WATCH_POLL_SEC", "60") or "60"))
+# Chromaprint (ENABLE_ACOUSTID_SCAN) runs in the background after the scan; results are cached per file version.
+FP_WORKERS = max(1, int(os.getenv("RT_FP_WORKERS", "2") or "2"))
+FP_TIMEOUT_SEC = max(5, int(os.getenv("RT_FP_TIMEOUT_SEC", "20") or "20"))
+FP_BATCH_SIZE = max(1, int(os.getenv("RT_FP_BATCH_SIZE", "200") or "200"))
+FP_CACHE_PATH = os.getenv("RT_FP_CACHE_PATH") or os.path.join(os.path.expanduser("~"), ".radiotiker", "fingerprints.sqlite3")
 POST_SCAN_ENRICH_ENABLED = str(os.getenv("RT_POST_SCAN_ENRICH_ENABLED", "0")).strip().lower() in {"1", "true", "yes", "on"}
 POST_SCAN_ENRICH_LIMIT = max(20, int(os.getenv("RT_POST_SCAN_ENRICH_LIMIT", "300") or "300"))
 POST_SCAN_ENRICH_MAX_PASSES = max(1, int(os.getenv("RT_POST_SCAN_ENRICH_MAX_PASSES", "25") or "25"))
 POST_SCAN_ENRICH_MIN_SCORE = float(os.getenv("RT_POST_SCAN_ENRICH_MIN_SCORE", "0.88") or "0.88")
 POST_SCAN_ENRICH_APPLY = str(os.getenv("RT_POST_SCAN_ENRICH_APPLY", "1")).strip().lower() in {"1", "true", "yes", "on"}
 POST_SCAN_ENRICH_TIMEOUT_SEC = max(15, int(os.getenv("RT_POST_SCAN_ENRICH_TIMEOUT_SEC", "180") or "180"))
+# Server-side enrichment job: how long to follow its progress (0 = submit and move on).
+POST_SCAN_ENRICH_WAIT_SEC = max(0, int(os.getenv("RT_POST_SCAN_ENRICH_WAIT_SEC", "1800") or "1800"))
+POST_SCAN_ENRICH_POLL_SEC = max(2, int(os.getenv("RT_POST_SCAN_ENRICH_POLL_SEC", "15") or "15"))
 POST_SCAN_ENRICH_PROVIDERS = [
     p.strip().lower()
     for p in os.getenv("RT_POST_SCAN_ENRICH_PROVIDERS", "musicbrainz,discogs,acoustid").split(",")
     if p.strip()
 ]
 HEARTBEAT_INTERVAL_SEC = max(15, int(os.getenv("RT_AGENT_HEARTBEAT_INTERVAL_SEC", "60") or "60"))
+# Request compression for uploads (the server inflates gzip, and zstd when it has zstandard).
+COMPRESS_REQUESTS = str(os.getenv("RT_COMPRESS_REQUESTS", "1")).strip().lower() in {"1", "true", "yes", "on"}
+COMPRESS_ENCODING = str(os.getenv("RT_COMPRESS_ENCODING", "zstd" if zstandard is not None else "gzip")).strip().lower()
+COMPRESS_MIN_BYTES = max(0, int(os.getenv("RT_COMPRESS_MIN_BYTES", "1024") or "1024"))
+
+
+_compression_available = COMPRESS_REQUESTS
+
+
+def _post_body(url: str, raw: bytes, content_type: str, timeout, params=None, extra_headers=None):
+    """
+    POST a body compressed with RT_COMPRESS_ENCODING (zstd when installed, else gzip).
+    Servers that reject the encoding get the plain body once and compression is turned off.
+    """
+    global _compression_available
+    headers = {"Content-Type": content_type, **(extra_headers or {})}
+    body = raw
+    if _compression_available and len(raw) >= COMPRESS_MIN_BYTES:
+        if COMPRESS_ENCODING == "zstd" and zstandard is not None:
+            body = zstandard.ZstdCompressor(level=3).compress(raw)
+            headers["Content-Encoding"] = "zstd"
+        else:
+            body = gzip.compress(raw, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    r = requests.post(url, params=params, data=body, headers=headers, timeout=timeout)
+    if "Content-Encoding" in headers and r.status_code in {400, 415, 422}:
+        plain_headers = {k: v for k, v in headers.items() if k != "Content-Encoding"}
+        plain = requests.post(url, params=params, data=raw, headers=plain_headers, timeout=timeout)
+        if plain.status_code < 400:
+            _compression_available = False
+            print(f"ℹ️ Server rejected {headers['Content-Encoding']} bodies; sending uncompressed.")
+        return plain
+    return r
+
+
+def _post_json(url: str, payload, timeout):
+    return _post_body(url, json.dumps(payload, separators=(",", ":")).encode("utf-8"), "application/json", timeout)
 
 
 def _scan_resume_file(user_id: str):
@@ -96,10 +200,9 @@ def _track_id(path: str, size: int, mtime: int) -> str:
     h.update(b"|"); h.update(str(mtime).encode())
     return h.hexdigest()
 
-def _duration_seconds(path: str):
+def _duration_seconds(info):
     try:
-        mf = File(path)
-        return round(float(getattr(mf.info, "length", 0.0)), 3) if mf and getattr(mf, "info", None) else None
+        return round(float(getattr(info, "length", 0.0)), 3) if info else None
     except Exception:
         return None
 
@@ -141,15 +244,13 @@ def _codec_from_path(path: str) -> str | None:
     ext = os.path.splitext(path)[1].lower().lstrip(".")
     return ext or None
 
-def _technical_info(path: str):
+def _technical_info(path: str, info):
     codec = _codec_from_path(path)
     sample_rate = None
     bit_depth = None
     bitrate_kbps = None
     channels = None
     try:
-        mf = File(path)
-        info = getattr(mf, "info", None) if mf else None
         if info:
             sr = getattr(info, "sample_rate", None)
             if isinstance(sr, int) and sr > 0:
@@ -167,52 +268,40 @@ def _technical_info(path: str):
         pass
     return codec, sample_rate, bit_depth, bitrate_kbps, channels
 
-
-def _acoustid_fingerprint(path: str):
+def _read_audio(path: str) -> dict:
     """
-    Best-effort Chromaprint using fpcalc on the agent host.
-    Returns (fingerprint, duration) or (None, None).
+    Tags, duration and stream info from one mutagen parse: the easy wrapper
+    still carries the format's full `info`, so each file is opened once.
     """
-    if not ENABLE_ACOUSTID_SCAN:
-        return None, None
-    exe = shutil.which("fpcalc")
-    if not exe:
-        return None, None
-    try:
-        # Prefer JSON output when available.
-        p = subprocess.run([exe, "-json", path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=20, text=True, check=False)
-        out = (p.stdout or "").strip()
-        if out.startswith("{"):
-            j = json.loads(out)
-            fp = str(j.get("fingerprint") or "").strip()
-            dur = float(j.get("duration")) if j.get("duration") is not None else None
-            if fp:
-                return fp, dur
-    except Exception:
-        pass
-    try:
-        # Fallback key=value output.
-        p = subprocess.run([exe, path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=20, text=True, check=False)
-        fp = None
-        dur = None
-        for ln in (p.stdout or "").splitlines():
-            if ln.startswith("FINGERPRINT="):
-                fp = ln.split("=", 1)[1].strip()
-            elif ln.startswith("DURATION="):
-                try:
-                    dur = float(ln.split("=", 1)[1].strip())
-                except Exception:
-                    dur = None
-        if fp:
-            return fp, dur
-    except Exception:
-        pass
-    return None, None
+    audio = File(path, easy=True)
+    info = getattr(audio, "info", None) if audio else None
+    codec, sample_rate, bit_depth, bitrate_kbps, channels = _technical_info(path, info)
+    title_default = os.path.splitext(os.path.basename(path))[0]
+    return {
+        "title": _first_tag(audio, "title", title_default),
+        "artist": _first_tag(audio, "artist", "Unknown"),
+        "album": _first_tag(audio, "album", "Unknown"),
+        "album_artist": _first_tag(audio, "albumartist"),
+        "genre": _first_tag(audio, "genre"),
+        "year": _parse_first_int(_first_tag(audio, "date")),
+        "track_no": _parse_first_int(_first_tag(audio, "tracknumber")),
+        "disc_no": _parse_first_int(_first_tag(audio, "discnumber")),
+        "composer": _first_tag(audio, "composer"),
+        "bpm": _parse_float(_first_tag(audio, "bpm")),
+        "musical_key": _first_tag(audio, "initialkey") or _first_tag(audio, "key"),
+        "codec": codec,
+        "sample_rate": sample_rate,
+        "bit_depth": bit_depth,
+        "bitrate_kbps": bitrate_kbps,
+        "channels": channels,
+        "duration_sec": _duration_seconds(info),
+    }
+
 
 def announce_agent(user_id: str, base_url: str):
     payload = {"user_id": user_id, "base_url": base_url}
     try:
-        r = requests.post(ANNOUNCE_URL, json=payload, timeout=10)
+        r = _post_json(ANNOUNCE_URL, payload, timeout=10)
         print("📣 Announce:", r.status_code, r.text[:200])
     except Exception as e:
         print("❌ Announce failed:", e)
@@ -224,7 +313,7 @@ def start_heartbeat_loop(user_id: str, base_url: str):
     def _beat():
         while not stop_event.is_set():
             try:
-                requests.post(ANNOUNCE_URL, json={"user_id": user_id, "base_url": base_url}, timeout=5)
+                _post_json(ANNOUNCE_URL, {"user_id": user_id, "base_url": base_url}, timeout=5)
             except Exception:
                 pass
             stop_event.wait(HEARTBEAT_INTERVAL_SEC)
@@ -234,12 +323,8 @@ def start_heartbeat_loop(user_id: str, base_url: str):
     return stop_event
 
 
-def run_post_scan_enrichment(user_id: str):
-    if not POST_SCAN_ENRICH_ENABLED:
-        return
-    if not POST_SCAN_ENRICH_PROVIDERS:
-        print("ℹ️ Post-scan enrich skipped: no providers configured.")
-        return
+def _run_post_scan_enrichment_passes(user_id: str):
+    """Legacy synchronous passes for servers without the enrichment job API."""
     url = f"{ENRICH_URL_BASE.rstrip('/')}/{user_id}"
     print(
         "🧠 Post-scan enrich started:",
@@ -260,7 +345,7 @@ def run_post_scan_enrichment(user_id: str):
             "min_score": POST_SCAN_ENRICH_MIN_SCORE,
         }
         try:
-            r = requests.post(url, json=payload, timeout=POST_SCAN_ENRICH_TIMEOUT_SEC)
+            r = _post_json(url, payload, timeout=POST_SCAN_ENRICH_TIMEOUT_SEC)
             if r.status_code >= 400:
                 print(f"⚠️ Post-scan enrich pass {i} failed: HTTP {r.status_code} {r.text[:200]}")
                 break
@@ -288,68 +373,334 @@ def run_post_scan_enrichment(user_id: str):
         f"applied={total_applied}",
     )
 
+def run_post_scan_enrichment(user_id: str):
+    """
+    Queue the post-scan enrich job and follow it from a background thread, so
+    the caller (the watch loop after a scan) is never held up by the wait.
+    """
+    if not POST_SCAN_ENRICH_ENABLED:
+        return
+    if not POST_SCAN_ENRICH_PROVIDERS:
+        print("ℹ️ Post-scan enrich skipped: no providers configured.")
+        return
+    url = f"{ENRICH_JOBS_URL_BASE.rstrip('/')}/{user_id}"
+    payload = {
+        "limit": POST_SCAN_ENRICH_LIMIT * POST_SCAN_ENRICH_MAX_PASSES,
+        "apply": POST_SCAN_ENRICH_APPLY,
+        "providers": POST_SCAN_ENRICH_PROVIDERS,
+        "min_score": POST_SCAN_ENRICH_MIN_SCORE,
+    }
+    try:
+        r = _post_json(url, payload, timeout=30)
+    except Exception as e:
+        print(f"⚠️ Post-scan enrich job submit error: {e}")
+        return
+    if r.status_code in (404, 405):
+        # Server predates enrichment jobs.
+        threading.Thread(
+            target=_run_post_scan_enrichment_passes, args=(user_id,), name="rt-enrich-passes", daemon=True
+        ).start()
+        return
+    if r.status_code >= 400:
+        print(f"⚠️ Post-scan enrich job submit failed: HTTP {r.status_code} {r.text[:200]}")
+        return
+    job = (r.json() or {}).get("job") or {}
+    job_id = job.get("job_id")
+    print(
+        "🧠 Post-scan enrich job queued:",
+        f"job={job_id}",
+        f"tracks={(job.get('options') or {}).get('track_count')}",
+        f"providers={POST_SCAN_ENRICH_PROVIDERS}",
+        f"min_score={POST_SCAN_ENRICH_MIN_SCORE}",
+        f"apply={POST_SCAN_ENRICH_APPLY}",
+    )
+    if not job_id or POST_SCAN_ENRICH_WAIT_SEC <= 0:
+        return
+    threading.Thread(
+        target=_follow_enrich_job, args=(url, job_id, job), name="rt-enrich-wait", daemon=True
+    ).start()
+
+
+def _follow_enrich_job(url: str, job_id: str, job: dict):
+    # The server keeps working if we stop following; a slow poll is not a failure.
+    deadline = time.time() + POST_SCAN_ENRICH_WAIT_SEC
+    last_done = None
+    while time.time() < deadline:
+        time.sleep(POST_SCAN_ENRICH_POLL_SEC)
+        try:
+            r = requests.get(f"{url}/{job_id}", timeout=30)
+            if r.status_code >= 400:
+                print(f"⚠️ Post-scan enrich status failed: HTTP {r.status_code}")
+                continue
+            job = (r.json() or {}).get("job") or job
+        except Exception as e:
+            print(f"⚠️ Post-scan enrich status error: {e}")
+            continue
+        progress = job.get("progress") or {}
+        counters = job.get("counters") or {}
+        if progress.get("done") != last_done:
+            last_done = progress.get("done")
+            print(
+                f"🧠 Enrich job {progress.get('percent')}%:",
+                f"scanned={counters.get('scanned', 0)}",
+                f"matched={counters.get('matched', 0)}",
+                f"applied={counters.get('applied', 0)}",
+                f"eta={progress.get('eta_sec')}s",
+            )
+        if job.get("status") in {"completed", "cancelled"}:
+            break
+    counters = job.get("counters") or {}
+    print(
+        "✅ Post-scan enrich job completed:" if job.get("status") == "completed" else f"ℹ️ Post-scan enrich job {job.get('status')}:",
+        f"scanned={counters.get('scanned', 0)}",
+        f"matched={counters.get('matched', 0)}",
+        f"applied={counters.get('applied', 0)}",
+        f"deferred={counters.get('deferred', 0)}",
+        f"provider_errors={counters.get('provider_errors') or {}}",
+    )
+
 def scan_folder(folder_path, base_url):
     library = []
     root_abs = os.path.abspath(folder_path)
-    for root, _, files in os.walk(root_abs):
-        for file in files:
-            if not file.lower().endswith(VALID_EXTENSIONS):
-                continue
-            full_path = os.path.join(root, file)
-            try:
-                audio = File(full_path, easy=True)
-                size, mtime = _file_fingerprint(full_path)
-                rel = os.path.relpath(full_path, root_abs).replace("\\", "/")
-                duration_sec = _duration_seconds(full_path)
-                acoustid_fp, acoustid_dur = _acoustid_fingerprint(full_path)
-                codec, sample_rate, bit_depth, bitrate_kbps, channels = _technical_info(full_path)
-                track_no = _parse_first_int(_first_tag(audio, "tracknumber"))
-                disc_no = _parse_first_int(_first_tag(audio, "discnumber"))
-                year = _parse_first_int(_first_tag(audio, "date"))
-                bpm = _parse_float(_first_tag(audio, "bpm"))
-                title_default = os.path.splitext(file)[0]
-                metadata = {
-                    "title": _first_tag(audio, "title", title_default),
-                    "artist": _first_tag(audio, "artist", "Unknown"),
-                    "album": _first_tag(audio, "album", "Unknown"),
-                    "album_artist": _first_tag(audio, "albumartist"),
-                    "genre": _first_tag(audio, "genre"),
-                    "year": year,
-                    "track_no": track_no,
-                    "disc_no": disc_no,
-                    "composer": _first_tag(audio, "composer"),
-                    "bpm": bpm,
-                    "musical_key": _first_tag(audio, "initialkey") or _first_tag(audio, "key"),
-                    "codec": codec,
-                    "sample_rate": sample_rate,
-                    "bit_depth": bit_depth,
-                    "bitrate_kbps": bitrate_kbps,
-                    "channels": channels,
-                    "path": full_path,
-                    "rel_path": rel,
-                    "file_size": size,
-                    "mtime": mtime,
-                    "duration_sec": duration_sec,
-                    "acoustid_fingerprint": acoustid_fp,
-                    "acoustid_duration": acoustid_dur,
-                    "track_id": _track_id(full_path, size, mtime),
-                }
-                library.append(metadata)
-            except Exception as e:
-                print(f"Error reading {full_path}: {e}")
+    for full_path in _iter_audio_files(root_abs):
+        try:
+            library.append(_scan_track(full_path, root_abs))
+        except Exception as e:
+            print(f"Error reading {full_path}: {e}")
+    _scan_index_done(root_abs, set(p["path"] for p in library))
     return library
 
-def _post_scan_chunk(user_id, chunk, version, replace, range_start, range_end, total):
+
+# Opened by _open_agent_state() from __main__ only: extraction pool workers
+# re-import this module and must not open their own index, cache or queue.
+_scan_index = None
+_fp_cache = None
+_fingerprints = None
+
+
+def _send_fingerprints(items):
+    """Fingerprint queue sender: the track_ids the server does not have yet, or None if it takes no updates."""
+    r = _post_json(SCAN_FINGERPRINTS_URL, {"user_id": USER_ID, "items": items}, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
+    if r.status_code in {404, 405}:
+        print("ℹ️ Server has no /scan-fingerprints; fingerprints go up with the next scan instead.")
+        return None
+    if r.status_code >= 400:
+        raise RuntimeError(f"HTTP {r.status_code}: {r.text[:240]}")
+    data = r.json()
+    print(f"🔏 Fingerprints: sent={len(items)} updated={data.get('updated', 0)} queued={_fingerprints.pending()}")
+    return data.get("missing") or []
+
+
+def _open_agent_state():
+    global _scan_index, _fp_cache, _fingerprints
+    _scan_index = open_scan_index(SCAN_INDEX_PATH) if SCAN_INDEX_ENABLED else None
+    _fp_cache = open_fingerprint_cache(FP_CACHE_PATH) if ENABLE_ACOUSTID_SCAN else None
+    _fingerprints = FingerprintQueue(
+        _fp_cache, _send_fingerprints, workers=FP_WORKERS, batch_size=FP_BATCH_SIZE, timeout=FP_TIMEOUT_SEC,
+    ) if _fp_cache else None
+
+
+def _extract_meta(full_path: str) -> dict:
+    """Everything read from the file itself; runs on the extraction pool, so no index access here."""
+    return _read_audio(full_path)
+
+
+def _scan_jobs(paths):
+    """Walker side of the pipeline: stat and index lookup here; only misses go to the pool."""
+    for full_path in paths:
+        try:
+            size, mtime = _file_fingerprint(full_path)
+        except OSError as e:
+            print(f"Error reading {full_path}: {e}")
+            continue
+        meta = _scan_index.get(full_path, size, mtime) if _scan_index else None
+        yield (full_path, size, mtime, meta), (None if meta is not None else (full_path,))
+
+
+def _track_record(full_path: str, root_abs: str, size: int, mtime: int, meta: dict, fresh: bool) -> dict:
+    if fresh and _scan_index:
+        _scan_index.put(full_path, size, mtime, meta)
+    track_id = _track_id(full_path, size, mtime)
+    # Fingerprints never hold up a scan: cached ones ride along, the rest are computed in the background.
+    fp = _fp_cache.get(full_path, size, mtime) if _fp_cache else None
+    if fp is None and _fingerprints:
+        _fingerprints.want(full_path, size, mtime, track_id)
+    fingerprint, fp_duration = fp or (None, None)
+    return {
+        **meta,
+        "acoustid_fingerprint": fingerprint,
+        "acoustid_duration": fp_duration,
+        "path": full_path,
+        "rel_path": os.path.relpath(full_path, root_abs).replace("\\", "/"),
+        "file_size": size,
+        "mtime": mtime,
+        "track_id": track_id,
+    }
+
+
+def _scan_track(full_path: str, root_abs: str) -> dict:
+    size, mtime = _file_fingerprint(full_path)
+    meta = _scan_index.get(full_path, size, mtime) if _scan_index else None
+    if meta is not None:
+        return _track_record(full_path, root_abs, size, mtime, meta, fresh=False)
+    return _track_record(full_path, root_abs, size, mtime, _extract_meta(full_path), fresh=True)
+
+
+def _scan_index_done(root_abs: str, seen=None):
+    """Persist index updates; after a full walk (`seen`) also drop records of deleted files."""
+    if not _scan_index:
+        return
+    pruned = 0
+    try:
+        if seen is not None:
+            pruned = _scan_index.prune(root_abs, seen)
+        _scan_index.flush()
+    except Exception as e:
+        print(f"⚠️ Scan index update failed: {e}")
+    hits, misses = _scan_index.take_stats()
+    print(f"📇 Scan index: reused={hits} parsed={misses} pruned={pruned}")
+
+
+_scan_async_available = SCAN_ASYNC_ENABLED
+_pending_scan_batches = []
+
+
+def _enqueue_scan_batch(payload):
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return _post_body(
+        SCAN_BATCHES_URL,
+        raw,
+        "application/json",
+        SCAN_SUBMIT_TIMEOUT_SEC,
+        extra_headers={"Idempotency-Key": hashlib.sha256(raw).hexdigest()},
+    )
+
+
+def _await_scan_batches(user_id, max_pending=0) -> bool:
+    """
+    Wait until at most `max_pending` queued batches are unapplied (oldest first,
+    as the server applies them in order). False if one failed or waiting timed out.
+    """
+    ok = True
+    deadline = time.time() + SCAN_ASYNC_WAIT_SEC
+    while len(_pending_scan_batches) > max_pending:
+        batch_id = _pending_scan_batches[0]
+        status, error = None, None
+        try:
+            r = requests.get(f"{SCAN_BATCHES_URL.rstrip('/')}/{user_id}/{batch_id}", timeout=30)
+            if r.status_code == 404:
+                status = "missing"
+            elif r.status_code < 400:
+                j = r.json()
+                status, error = j.get("status"), j.get("error")
+        except Exception as e:
+            error = e
+        if status in {"done", "failed", "missing"}:
+            _pending_scan_batches.pop(0)
+            if status != "done":
+                ok = False
+                print(f"❌ Queued batch {batch_id} {status}: {error}")
+            continue
+        if time.time() > deadline:
+            print(f"⚠️ Gave up waiting for {len(_pending_scan_batches)} queued batches.")
+            return False
+        time.sleep(SCAN_ASYNC_POLL_SEC)
+    return ok
+
+
+def _complete_scan(user_id, version) -> bool:
+    """Ask the server to drop the tracks a finished replace scan did not send."""
+    try:
+        r = _post_json(SCAN_COMPLETE_URL, {"user_id": user_id, "library_version": version}, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
+    except Exception as e:
+        print(f"⚠️ Scan-complete call failed: {e}")
+        return False
+    if r.status_code in {404, 405}:
+        # Older servers clear the library on the first replace batch instead.
+        return True
+    if r.status_code == 409:
+        print("ℹ️ Nothing to sweep: the server has no open replace scan for this version.")
+        return True
+    if r.status_code >= 400:
+        print(f"⚠️ Scan-complete failed: HTTP {r.status_code}: {r.text[:240]}")
+        return False
+    print(f"🧹 Removed {r.json().get('removed', 0)} tracks no longer on disk.")
+    return True
+
+
+_scan_stream_available = SCAN_STREAM_ENABLED
+
+
+def _new_stream_session(version):
+    """
+    A stream session id of its own for every upload: the server skips records
+    at or below a session's acked seq, so two uploads must never share one.
+    """
+    return f"v{version}-{os.urandom(6).hex()}"
+
+
+def _post_scan_stream(user_id, chunk, version, replace, range_start, session_id):
+    # seq numbers follow the scan position so a resumed upload lines up with the server's acks.
+    lines = [
+        json.dumps(dict(track, seq=range_start + offset), separators=(",", ":"))
+        for offset, track in enumerate(chunk)
+    ]
+    return _post_body(
+        SCAN_STREAM_URL,
+        ("\n".join(lines) + "\n").encode("utf-8"),
+        "application/x-ndjson",
+        SCAN_SUBMIT_TIMEOUT_SEC,
+        params={
+            "user_id": user_id,
+            "library_version": version,
+            "replace": "true" if replace else "false",
+            "session_id": session_id,
+        },
+    )
+
+
+def _post_scan_chunk(user_id, chunk, version, replace, range_start, range_end, total, session_id=None):
     payload = {
         "user_id": user_id,
         "library": chunk,
         "library_version": version,
         "replace": bool(replace),
     }
+    global _scan_stream_available, _scan_async_available
     last_err = None
     for attempt in range(1, SCAN_SUBMIT_RETRIES + 1):
         try:
-            response = requests.post(SERVER_URL, json=payload, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
+            response = None
+            if _scan_async_available:
+                response = _enqueue_scan_batch(payload)
+                if response.status_code in {404, 405}:
+                    _scan_async_available = False
+                    response = None
+                    print("ℹ️ Server has no async scan queue; uploading synchronously.")
+                elif response.status_code < 400:
+                    batch = response.json()
+                    if batch.get("status") != "done":
+                        _pending_scan_batches.append(batch["batch_id"])
+                    print(
+                        f"📥 Batch {range_start}-{range_end}/{total} queued:",
+                        batch.get("batch_id"), batch.get("status"), f"position={batch.get('position')}",
+                    )
+                    # Back-pressure: never run too far ahead of the server's apply worker.
+                    return _await_scan_batches(user_id, max_pending=SCAN_ASYNC_MAX_PENDING)
+            if response is None and _scan_stream_available:
+                response = _post_scan_stream(user_id, chunk, version, replace, range_start, session_id or _new_stream_session(version))
+                if response.status_code in {404, 405}:
+                    _scan_stream_available = False
+                    print("ℹ️ Server has no streaming ingest; falling back to /submit-scan batches.")
+                    return all(
+                        _post_scan_chunk(
+                            user_id, chunk[i:i + SCAN_BATCH_SIZE], version, replace,
+                            range_start + i, range_start + i + len(chunk[i:i + SCAN_BATCH_SIZE]) - 1, total,
+                        )
+                        for i in range(0, len(chunk), SCAN_BATCH_SIZE)
+                    )
+            elif response is None:
+                response = _post_json(SERVER_URL, payload, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
             if response.status_code >= 400:
                 raise RuntimeError(f"HTTP {response.status_code}: {response.text[:240]}")
             print(f"✅ Batch {range_start}-{range_end}/{total}:", response.status_code, response.text[:200])
@@ -369,7 +720,10 @@ def _post_scan_chunk(user_id, chunk, version, replace, range_start, range_end, t
 
 def scan_and_send_incremental(user_id, folder_path, batch_size=SCAN_BATCH_SIZE, replace=True):
     root_abs = os.path.abspath(folder_path)
+    if _scan_async_available or _scan_stream_available:
+        batch_size = max(batch_size, SCAN_STREAM_BATCH_SIZE)
     version = int(time.time())
+    session_id = _new_stream_session(version)
     candidates = list(_iter_audio_files(root_abs))
     total = len(candidates)
     resume_from = 0
@@ -391,6 +745,10 @@ def scan_and_send_incremental(user_id, folder_path, batch_size=SCAN_BATCH_SIZE,
             resume_from = max(0, int(resume_state.get("committed_scanned", 0) or 0))
             uploaded = max(0, int(resume_state.get("uploaded", 0) or 0))
             replace_next = bool(resume_state.get("replace_next", replace))
+            # Keep the interrupted session's version so replace and stream acks stay idempotent.
+            version = int(resume_state.get("version") or version)
+            # Checkpoints from before per-upload sessions used the server's default session.
+            session_id = str(resume_state.get("session_id") or f"v{version}")
             if resume_from > 0:
                 print(f"↩️ Resuming scan from {resume_from}/{total} committed files.")
         else:
@@ -398,6 +756,7 @@ def scan_and_send_incremental(user_id, folder_path, batch_size=SCAN_BATCH_SIZE,
                 "user_id": user_id,
                 "folder_path": root_abs,
                 "version": version,
+                "session_id": session_id,
                 "total_candidates": total,
                 "committed_scanned": 0,
                 "uploaded": 0,
@@ -410,117 +769,81 @@ def scan_and_send_incremental(user_id, folder_path, batch_size=SCAN_BATCH_SIZE,
     print(f"Total candidates: {total}")
     scanned = resume_from
     chunk = []
+    state = {"uploaded": uploaded, "replace_next": replace_next}
 
-    for idx in range(resume_from, total):
-        full_path = candidates[idx]
-        file = os.path.basename(full_path)
-        try:
-            audio = File(full_path, easy=True)
-            size, mtime = _file_fingerprint(full_path)
-            rel = os.path.relpath(full_path, root_abs).replace("\\", "/")
-            duration_sec = _duration_seconds(full_path)
-            acoustid_fp, acoustid_dur = _acoustid_fingerprint(full_path)
-            codec, sample_rate, bit_depth, bitrate_kbps, channels = _technical_info(full_path)
-            track_no = _parse_first_int(_first_tag(audio, "tracknumber"))
-            disc_no = _parse_first_int(_first_tag(audio, "discnumber"))
-            year = _parse_first_int(_first_tag(audio, "date"))
-            bpm = _parse_float(_first_tag(audio, "bpm"))
-            title_default = os.path.splitext(file)[0]
-            metadata = {
-                "title": _first_tag(audio, "title", title_default),
-                "artist": _first_tag(audio, "artist", "Unknown"),
-                "album": _first_tag(audio, "album", "Unknown"),
-                "album_artist": _first_tag(audio, "albumartist"),
-                "genre": _first_tag(audio, "genre"),
-                "year": year,
-                "track_no": track_no,
-                "disc_no": disc_no,
-                "composer": _first_tag(audio, "composer"),
-                "bpm": bpm,
-                "musical_key": _first_tag(audio, "initialkey") or _first_tag(audio, "key"),
-                "codec": codec,
-                "sample_rate": sample_rate,
-                "bit_depth": bit_depth,
-                "bitrate_kbps": bitrate_kbps,
-                "channels": channels,
-                "path": full_path,
-                "rel_path": rel,
-                "file_size": size,
-                "mtime": mtime,
-                "duration_sec": duration_sec,
-                "acoustid_fingerprint": acoustid_fp,
-                "acoustid_duration": acoustid_dur,
-                "track_id": _track_id(full_path, size, mtime),
-            }
-            chunk.append(metadata)
+    def save_resume(committed_scanned):
+        if SCAN_RESUME_ENABLED:
+            _save_scan_resume(user_id, {
+                "user_id": user_id,
+                "folder_path": root_abs,
+                "version": version,
+                "session_id": session_id,
+                "total_candidates": total,
+                "committed_scanned": committed_scanned,
+                "uploaded": state["uploaded"],
+                "replace_next": state["replace_next"],
+                "completed": False,
+                "updated_at": int(time.time()),
+            })
+
+    def send(chunk, start, end):
+        # Runs on the uploader thread, in scan order.
+        if not _post_scan_chunk(user_id, chunk, version, state["replace_next"], start, end, total, session_id):
+            save_resume(start - 1)
+            print(f"⏸️ Paused after failed batch {start}-{end}; restart will resume.")
+            return False
+        state["replace_next"] = False
+        state["uploaded"] += len(chunk)
+        save_resume(end)
+        return True
+
+    uploader = BackgroundUploader(send, depth=SCAN_UPLOAD_QUEUE)
+    executor, kind = make_executor(SCAN_WORKER_KIND, SCAN_WORKERS)
+    print(f"⚙️ Extracting with {SCAN_WORKERS} {kind} worker(s).")
+    aborted = False
+    try:
+        results = ordered_map(_extract_meta, _scan_jobs(candidates[resume_from:]), executor, SCAN_WORKERS * 4)
+        for (full_path, size, mtime, cached), meta, err in results:
+            if err is not None:
+                print(f"Error reading {full_path}: {err}")
+                continue
+            chunk.append(_track_record(full_path, root_abs, size, mtime, cached or meta, fresh=cached is None))
             scanned += 1
             if scanned % 25 == 0 or scanned == total:
                 print(f"  • Scanned {scanned}/{total} ...")
             if len(chunk) >= batch_size:
-                start = scanned - len(chunk) + 1
-                end = scanned
-                if not _post_scan_chunk(user_id, chunk, version, replace_next, start, end, total):
-                    failed = True
-                    if SCAN_RESUME_ENABLED:
-                        _save_scan_resume(user_id, {
-                            "user_id": user_id,
-                            "folder_path": root_abs,
-                            "version": version,
-                            "total_candidates": total,
-                            "committed_scanned": scanned - len(chunk),
-                            "uploaded": uploaded,
-                            "replace_next": replace_next,
-                            "completed": False,
-                            "updated_at": int(time.time()),
-                        })
-                    print(f"⏸️ Paused after failed batch {start}-{end}; restart will resume.")
-                    return {"scanned": scanned, "uploaded": uploaded, "failed": True}
-                replace_next = False
-                uploaded += len(chunk)
-                if SCAN_RESUME_ENABLED:
-                    _save_scan_resume(user_id, {
-                        "user_id": user_id,
-                        "folder_path": root_abs,
-                        "version": version,
-                        "total_candidates": total,
-                        "committed_scanned": scanned,
-                        "uploaded": uploaded,
-                        "replace_next": replace_next,
-                        "completed": False,
-                        "updated_at": int(time.time()),
-                    })
+                if not uploader.put(chunk, scanned - len(chunk) + 1, scanned):
+                    break
                 chunk = []
-        except Exception as e:
-            print(f"Error reading {full_path}: {e}")
+        if chunk and not uploader.failed:
+            uploader.put(chunk, scanned - len(chunk) + 1, scanned)
+    except BrokenExecutor as e:
+        # Not one unreadable file: every file after this would "fail", and the
+        # sweep would then remove their tracks. Stop; the next run resumes.
+        print(f"❌ Extraction workers died ({e}); scan aborted after {scanned}/{total} files.")
+        aborted = True
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        ok = uploader.close()
+    uploaded = state["uploaded"]
+    if not ok or aborted:
+        _scan_index_done(root_abs)
+        return {"scanned": scanned, "uploaded": uploaded, "failed": True}
 
-    if chunk:
-        start = scanned - len(chunk) + 1
-        end = scanned
-        if not _post_scan_chunk(user_id, chunk, version, replace_next, start, end, total):
-            failed = True
-            if SCAN_RESUME_ENABLED:
-                _save_scan_resume(user_id, {
-                    "user_id": user_id,
-                    "folder_path": root_abs,
-                    "version": version,
-                    "total_candidates": total,
-                    "committed_scanned": scanned - len(chunk),
-                    "uploaded": uploaded,
-                    "replace_next": replace_next,
-                    "completed": False,
-                    "updated_at": int(time.time()),
-                })
-            print(f"⏸️ Final partial batch {start}-{end} failed; restart will resume.")
-            return {"scanned": scanned, "uploaded": uploaded, "failed": True}
-        else:
-            replace_next = False
-            uploaded += len(chunk)
+    _scan_index_done(root_abs, set(candidates))
+
+    # Queued batches already count as committed for resume; wait until the server has applied them.
+    if not _await_scan_batches(user_id):
+        failed = True
+    if replace and not failed:
+        _complete_scan(user_id, version)
 
     if SCAN_RESUME_ENABLED:
         _save_scan_resume(user_id, {
             "user_id": user_id,
             "folder_path": root_abs,
             "version": version,
+            "session_id": session_id,
             "total_candidates": total,
             "committed_scanned": scanned,
             "uploaded": uploaded,
@@ -531,6 +854,208 @@ def scan_and_send_incremental(user_id, folder_path, batch_size=SCAN_BATCH_SIZE,
     return {"scanned": scanned, "uploaded": uploaded, "failed": failed}
 
 
+def _disk_manifest(root_abs: str):
+    """Audio files per directory plus Merkle digests, computed exactly as streamer_api/scan_manifest.py."""
+    files = {}
+    children = {"": set()}
+    for full_path in _iter_audio_files(root_abs):
+        try:
+            size, mtime = _file_fingerprint(full_path)
+        except OSError:
+            continue
+        rel = os.path.relpath(full_path, root_abs).replace("\\", "/")
+        parent, _, name = rel.rpartition("/")
+        files.setdefault(parent, []).append((name, size, mtime, full_path))
+        while parent not in children:
+            children[parent] = set()
+            grand = parent.rpartition("/")[0]
+            children.setdefault(grand, set()).add(parent)
+            parent = grand
+    digests = {}
+    for d in sorted(children, key=lambda p: -p.count("/") - (1 if p else 0)):
+        lines = [f"f\t{name}\t{size}\t{mtime}" for name, size, mtime, _ in files.get(d, [])]
+        lines += [f"d\t{c.rpartition('/')[2]}\t{digests[c]}" for c in children[d]]
+        digests[d] = hashlib.sha1("\n".join(sorted(lines)).encode("utf-8")).hexdigest()
+    return files, children, digests
+
+
+def scan_and_send_delta(user_id, folder_path, batch_size=SCAN_BATCH_SIZE):
+    """
+    Rescan by manifest: walk the server down only the directories whose digests
+    differ, then read and upload just the files it asks for. Returns None when
+    the server has no /scan-delta (caller falls back to a full scan).
+    """
+    root_abs = os.path.abspath(folder_path)
+    files, children, digests = _disk_manifest(root_abs)
+    total = sum(len(entries) for entries in files.values())
+    print(f"Delta scan: {root_abs} ({total} files in {len(digests)} folders)")
+    need = []
+    replaced = set()
+    removed = 0
+    rounds = 0
+    sent_bytes = 0
+    dirs = {"": digests[""]}
+    expand = []
+    while dirs or expand:
+        rounds += 1
+        payload = {
+            "user_id": user_id,
+            "dirs": dirs,
+            "files": {d: [[name, size, mtime] for name, size, mtime, _ in files.get(d, [])] for d in expand},
+        }
+        body = json.dumps(payload, separators=(",", ":"))
+        sent_bytes += len(body)
+        try:
+            response = _post_body(SCAN_DELTA_URL, body.encode("utf-8"), "application/json", SCAN_SUBMIT_TIMEOUT_SEC)
+        except Exception as e:
+            print(f"❌ Delta negotiation failed: {e}")
+            return {"scanned": 0, "uploaded": 0, "failed": True}
+        if response.status_code in {404, 405}:
+            print("ℹ️ Server has no delta sync; running a full scan.")
+            return None
+        if response.status_code >= 400:
+            print(f"❌ Delta negotiation failed: HTTP {response.status_code}: {response.text[:240]}")
+            return {"scanned": 0, "uploaded": 0, "failed": True}
+        data = response.json()
+        removed += int(data.get("removed") or 0)
+        need.extend(data.get("need") or [])
+        replaced.update(data.get("replaced") or [])
+        for d in data.get("missing") or []:
+            # Nothing on the server under d: upload the whole subtree without expanding it.
+            stack = [d]
+            while stack:
+                cur = stack.pop()
+                need.extend(f"{cur}/{name}" if cur else name for name, _, _, _ in files.get(cur, []))
+                stack.extend(children.get(cur, ()))
+        expand = [d for d in data.get("changed") or [] if d in digests]
+        dirs = {c: digests[c] for d in expand for c in children.get(d, ())}
+    print(f"🔁 Delta: rounds={rounds} manifest_bytes={sent_bytes} upload={len(need)} removed={removed}")
+
+    paths = {
+        (f"{d}/{name}" if d else name): full_path
+        for d, entries in files.items()
+        for name, _, _, full_path in entries
+    }
+    if _scan_async_available or _scan_stream_available:
+        batch_size = max(batch_size, SCAN_STREAM_BATCH_SIZE)
+    version = int(time.time())
+    session_id = _new_stream_session(version)
+    uploaded = 0
+    chunk = []
+    retire = []
+    for pos, rel in enumerate(need):
+        full_path = paths.get(rel)
+        if full_path:
+            try:
+                chunk.append(_scan_track(full_path, root_abs))
+            except Exception as e:
+                print(f"Error reading {full_path}: {e}")
+        if chunk and (len(chunk) >= batch_size or pos == len(need) - 1):
+            if not _post_scan_chunk(user_id, chunk, version, False, uploaded + 1, uploaded + len(chunk), len(need), session_id):
+                print("⏸️ Delta upload failed; the next scan picks up the remaining files.")
+                return {"scanned": total, "uploaded": uploaded, "failed": True, "removed": removed}
+            uploaded += len(chunk)
+            retire.extend(t for t in chunk if t["rel_path"] in replaced)
+            chunk = []
+    _scan_index_done(root_abs, set(paths.values()))
+    failed = not _await_scan_batches(user_id)
+    # Changed files' old entries go only once their new versions have landed.
+    if retire and not failed:
+        retired = _retire_replaced(user_id, retire)
+        if retired is None:
+            failed = True
+        else:
+            removed += retired
+    return {"scanned": total, "uploaded": uploaded, "failed": failed, "removed": removed}
+
+
+def _retire_replaced(user_id, tracks):
+    """Drop the previous entries of re-uploaded changed files; None on failure (the next delta scan retries)."""
+    payload = {
+        "user_id": user_id,
+        "paths": [t["rel_path"] for t in tracks],
+        "keep": [t["track_id"] for t in tracks],
+    }
+    try:
+        r = _post_json(SCAN_REMOVE_URL, payload, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
+    except Exception as e:
+        print(f"⚠️ Retiring changed tracks failed: {e}")
+        return None
+    if r.status_code >= 400:
+        print(f"⚠️ Retiring changed tracks failed: HTTP {r.status_code}: {r.text[:240]}")
+        return None
+    return int(r.json().get("removed") or 0)
+
+
+_scan_remove_available = True
+
+
+def sync_watch_batch(user_id, folder_path, batch):
+    """
+    Watch mode: upload the files of a coalesced batch that still exist
+    (replace=false), then have the server drop the tracks of files and folders
+    that are gone and the old entries of changed files. Returns None when the
+    server has no /scan-remove (caller falls back to a rescan), False to retry.
+    """
+    global _scan_remove_available
+    if not _scan_remove_available:
+        return None
+    root_abs = os.path.abspath(folder_path)
+    gone = sorted(p for p in batch.files if not os.path.isfile(p))
+    chunk = []
+    for full_path in sorted(batch.files - set(gone)):
+        try:
+            chunk.append(_scan_track(full_path, root_abs))
+        except Exception as e:
+            # Probably still being written; its close event brings it back.
+            print(f"Error reading {full_path}: {e}")
+    version = int(time.time())
+    session_id = _new_stream_session(version)
+    for i in range(0, len(chunk), SCAN_STREAM_BATCH_SIZE):
+        part = chunk[i:i + SCAN_STREAM_BATCH_SIZE]
+        if not _post_scan_chunk(user_id, part, version, False, i + 1, i + len(part), len(chunk), session_id):
+            return False
+    # New entries land before old ones go, so a changed track never disappears in between.
+    if not _await_scan_batches(user_id):
+        return False
+
+    rel = lambda p: os.path.relpath(p, root_abs).replace("\\", "/")
+    removed = 0
+    payload = {
+        "user_id": user_id,
+        "paths": [t["rel_path"] for t in chunk] + [rel(p) for p in gone],
+        "dirs": sorted(rel(d) for d in batch.dirs),
+        "keep": [t["track_id"] for t in chunk],
+    }
+    if payload["paths"] or payload["dirs"]:
+        try:
+            r = _post_json(SCAN_REMOVE_URL, payload, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
+        except Exception as e:
+            print(f"⚠️ Watch removal failed: {e}")
+            return False
+        if r.status_code in {404, 405}:
+            _scan_remove_available = False
+            print("ℹ️ Server has no /scan-remove; watch changes are synced by rescans instead.")
+            return None
+        if r.status_code >= 400:
+            print(f"⚠️ Watch removal failed: HTTP {r.status_code}: {r.text[:240]}")
+            return False
+        removed = int(r.json().get("removed") or 0)
+
+    if _scan_index:
+        try:
+            if gone:
+                _scan_index.forget(gone)
+            for d in batch.dirs:
+                _scan_index.prune(d, ())
+            _scan_index.flush()
+        except Exception as e:
+            print(f"⚠️ Scan index update failed: {e}")
+        _scan_index.take_stats()
+    print(f"👀 Watch sync: uploaded={len(chunk)} removed={removed} folders_gone={len(batch.dirs)}")
+    return True
+
+
 def send_in_batches(user_id, tracks, batch_size=SCAN_BATCH_SIZE, replace=True):
     if not tracks:
         print("No tracks found.")
@@ -549,7 +1074,7 @@ def send_in_batches(user_id, tracks, batch_size=SCAN_BATCH_SIZE, replace=True):
         last_err = None
         for attempt in range(1, SCAN_SUBMIT_RETRIES + 1):
             try:
-                response = requests.post(SERVER_URL, json=payload, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
+                response = _post_json(SERVER_URL, payload, timeout=SCAN_SUBMIT_TIMEOUT_SEC)
                 if response.status_code >= 400:
                     raise RuntimeError(f"HTTP {response.status_code}: {response.text[:240]}")
                 print(f"✅ Batch {i+1}-{i+len(chunk)}/{total}:", response.status_code, response.text[:200])
@@ -567,8 +1092,11 @@ def send_in_batches(user_id, tracks, batch_size=SCAN_BATCH_SIZE, replace=True):
         if not ok:
             print(f"❌ Batch {i+1}-{i+len(chunk)} failed after {SCAN_SUBMIT_RETRIES} attempts:", last_err)
             break
+    if ok and replace:
+        _complete_scan(user_id, version)
 
 if __name__ == "__main__":
+    _open_agent_state()
     library_root = os.path.abspath(os.path.expanduser(LIBRARY_PATH))
     print(f"🎵 Serving & scanning: {library_root}")
     tunnel, tunnel_base = start_tunnel_from_env(AGENT_PORT, log_fn=print)
@@ -583,7 +1111,9 @@ if __name__ == "__main__":
 
     def run_full_scan_cycle(reason: str = "scheduled"):
         print(f"🔎 Full scan ({reason}) started")
-        result = scan_and_send_incremental(USER_ID, library_root, batch_size=SCAN_BATCH_SIZE, replace=True)
+        result = scan_and_send_delta(USER_ID, library_root, batch_size=SCAN_BATCH_SIZE) if SCAN_DELTA_ENABLED else None
+        if result is None:
+            result = scan_and_send_incremental(USER_ID, library_root, batch_size=SCAN_BATCH_SIZE, replace=True)
         print(
             f"📁 Scan complete ({reason}): valid={result['scanned']} uploaded={result['uploaded']} "
             f"failed={'yes' if result['failed'] else 'no'}."
@@ -592,19 +1122,46 @@ if __name__ == "__main__":
             run_post_scan_enrichment(USER_ID)
         print(f"✅ Full scan ({reason}) completed")
 
+    watcher = None
+    if WATCH_ENABLED:
+        # Started before the startup scan so nothing copied in meanwhile is missed.
+        try:
+            watcher = LibraryWatcher(
+                library_root, VALID_EXTENSIONS, mode=WATCH_MODE, debounce=WATCH_DEBOUNCE_SEC,
+                poll_interval=WATCH_POLL_SEC, max_delay=WATCH_MAX_DELAY_SEC, log_fn=print,
+            )
+            print(f"👀 Watching {library_root} ({watcher.mode}).")
+        except Exception as e:
+            print(f"⚠️ Watch mode unavailable: {e}")
+
     run_full_scan_cycle("startup")
 
     # Keep the tunnel alive for long-running sessions.
     try:
         last_scan_ts = time.time()
         while True:
-            time.sleep(5)
+            batch = None
+            if watcher:
+                batch = watcher.next_batch(5)
+            else:
+                time.sleep(5)
+            if batch:
+                synced = None if batch.rescan else sync_watch_batch(USER_ID, library_root, batch)
+                if synced is None:
+                    run_full_scan_cycle("watch")
+                    last_scan_ts = time.time()
+                elif not synced:
+                    print("⏸️ Watch sync failed; retrying shortly.")
+                    watcher.requeue(batch)
+                    time.sleep(WATCH_MAX_DELAY_SEC)
             if FULL_RESCAN_INTERVAL_MIN > 0:
                 now = time.time()
                 if (now - last_scan_ts) >= (FULL_RESCAN_INTERVAL_MIN * 60):
                     run_full_scan_cycle("interval")
                     last_scan_ts = now
     except KeyboardInterrupt:
+        if watcher:
+            watcher.close()
         if heartbeat_stop:
             heartbeat_stop.set()
         if tunnel: